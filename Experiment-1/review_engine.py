@@ -0,0 +1,224 @@
+"""
+Parallel, streaming review analysis for the Customer_reviews shards.
+
+Every shard is read exactly once, line by line, by a worker process. The
+worker returns a small partial aggregate (valid/invalid counts and a
+product -> [total, count] map) which the parent merges into the global
+ratings and uses to write that shard's summary file.
+
+The partials are checkpointed in a JSON store keyed by shard name, size,
+mtime and content hash, so a rerun only reads new or changed shards.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BASE_DIR))
+from common.ranking import rank_averages
+
+REVIEWS_DIR = os.path.join(BASE_DIR, 'Customer_reviews')
+SUMMARY_DIR = os.path.join(BASE_DIR, 'Customer_reviews_Summary')
+STORE_NAME = 'review_store.json'
+STORE_VERSION = 1
+
+
+def list_shards(folder_path):
+    """Returns the sorted list of review shard (.txt) paths in a folder."""
+    return sorted(os.path.join(folder_path, name)
+                  for name in os.listdir(folder_path) if name.endswith('.txt'))
+
+
+def parse_shard(file_path):
+    """
+    Reads one review shard a line at a time and returns its partial aggregate.
+    Memory use depends on the number of products in the shard, not its size.
+    The content hash is computed in the same pass.
+    """
+    ratings = {}
+    valid = 0
+    invalid = 0
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for line in f:
+            digest.update(line)
+            # Review line: <review id> <product id> <date> <rating> <text>
+            data = line.split(maxsplit=4)
+            if len(data) != 5:
+                invalid += 1
+                continue
+            valid += 1
+            try:
+                rating = int(data[3])
+            except ValueError:
+                continue
+            product_id = data[1].decode()
+            entry = ratings.get(product_id)
+            if entry is None:
+                ratings[product_id] = [rating, 1]
+            else:
+                entry[0] += rating
+                entry[1] += 1
+    return {'file': file_path, 'sha256': digest.hexdigest(),
+            'valid': valid, 'invalid': invalid, 'ratings': ratings}
+
+
+def merge_ratings(total, partial, sign=1):
+    """
+    Adds a partial product -> [total, count] map into the running totals.
+    With sign=-1 the partial is subtracted instead (used when a shard changes).
+    """
+    for product_id, (rating_sum, count) in partial.items():
+        entry = total.get(product_id)
+        if entry is None:
+            # A product missing from the totals has nothing left to subtract
+            if sign > 0:
+                total[product_id] = [rating_sum, count]
+        else:
+            entry[0] += sign * rating_sum
+            entry[1] += sign * count
+            if entry[1] <= 0:
+                del total[product_id]
+    return total
+
+
+def new_store():
+    """Returns an empty aggregate store."""
+    return {'version': STORE_VERSION, 'next_summary': 1, 'valid': 0, 'invalid': 0,
+            'ratings': {}, 'shards': {}}
+
+
+def load_store(store_path):
+    """Loads the aggregate store, or returns an empty one if it is missing or outdated."""
+    try:
+        with open(store_path, 'r') as f:
+            store = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return new_store()
+    if store.get('version') != STORE_VERSION:
+        return new_store()
+    return store
+
+
+def save_store(store, store_path):
+    """Writes the store atomically so an interrupted run never leaves it half written."""
+    tmp_path = store_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(store, f)
+    os.replace(tmp_path, store_path)
+
+
+def add_shard(store, key, entry):
+    """Records a shard's partial aggregate in the store and the global totals."""
+    store['shards'][key] = entry
+    store['valid'] += entry['valid']
+    store['invalid'] += entry['invalid']
+    merge_ratings(store['ratings'], entry['ratings'])
+
+
+def remove_shard(store, key):
+    """Removes a shard's contribution from the store and returns its old entry."""
+    entry = store['shards'].pop(key)
+    store['valid'] -= entry['valid']
+    store['invalid'] -= entry['invalid']
+    merge_ratings(store['ratings'], entry['ratings'], sign=-1)
+    return entry
+
+
+def top_products(ratings, n=3, min_reviews=1):
+    """Returns the n products with the highest average rating as (id, avg, count)."""
+    return rank_averages(ratings, n, min_count=min_reviews)
+
+
+def write_summary(summary_path, valid, invalid, ratings, top_n=3, min_reviews=1):
+    """Writes a summary report in the same layout as the notebook's summary files."""
+    with open(summary_path, 'w') as f_out:
+        f_out.write("Report of Products\n")
+        f_out.write(f"Successfully extracted {valid} valid lines and {invalid} invalid lines.\n")
+        f_out.write(f"Total numbers of reviews are {valid + invalid}\n")
+        f_out.write(f"Top {top_n} products with highest average rating:\n")
+        for product_id, avg, _ in top_products(ratings, top_n, min_reviews):
+            f_out.write(f"{product_id}: Average Rating = {avg:.2f}\n")
+
+
+def analyze_reviews(folder_path=REVIEWS_DIR, output_dir=SUMMARY_DIR, top_n=3, workers=None, incremental=True,
+                    min_reviews=1):
+    """
+    Parses the shards in folder_path with a process pool (one worker per core
+    by default), writes 'summary N.txt' for each shard and 'summary overall.txt'
+    for the merged ratings. Returns the merged ratings and global counts.
+
+    When incremental is True, shards whose size and mtime match the store are
+    skipped, and shards that were touched but whose content hash is unchanged
+    are not summarised again. Pass incremental=False to rebuild from scratch.
+    Products with fewer than min_reviews ratings are left out of the overall top-N.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    store_path = os.path.join(output_dir, STORE_NAME)
+    store = load_store(store_path) if incremental else new_store()
+    workers = workers or os.cpu_count() or 1
+
+    files = list_shards(folder_path)
+    pending = []
+    stats = {}
+    for file_path in files:
+        key = os.path.relpath(file_path, folder_path)
+        st = os.stat(file_path)
+        stats[key] = (st.st_size, st.st_mtime_ns)
+        entry = store['shards'].get(key)
+        if entry is None or (entry['size'], entry['mtime']) != stats[key]:
+            pending.append(file_path)
+
+    # Shards that disappeared from the folder no longer count towards the totals
+    for key in [key for key in store['shards'] if key not in stats]:
+        remove_shard(store, key)
+
+    processed = 0
+    # Ship shards to the workers in chunks so tiny files don't pay one IPC round trip each
+    chunksize = max(1, len(pending) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial in executor.map(parse_shard, pending, chunksize=chunksize):
+            key = os.path.relpath(partial['file'], folder_path)
+            size, mtime = stats[key]
+            old = store['shards'].get(key)
+            if old is not None and old['sha256'] == partial['sha256']:
+                old['size'], old['mtime'] = size, mtime
+                continue
+            if old is not None:
+                summary_index = remove_shard(store, key)['summary']
+            else:
+                summary_index = store['next_summary']
+                store['next_summary'] += 1
+            add_shard(store, key, {'size': size, 'mtime': mtime, 'sha256': partial['sha256'],
+                                   'summary': summary_index, 'valid': partial['valid'],
+                                   'invalid': partial['invalid'], 'ratings': partial['ratings']})
+            summary_path = os.path.join(output_dir, f"summary {summary_index}.txt")
+            write_summary(summary_path, partial['valid'], partial['invalid'], partial['ratings'], top_n)
+            processed += 1
+
+    save_store(store, store_path)
+    write_summary(os.path.join(output_dir, "summary overall.txt"),
+                  store['valid'], store['invalid'], store['ratings'], top_n, min_reviews)
+    return {'files': len(files), 'processed': processed, 'valid': store['valid'],
+            'invalid': store['invalid'], 'ratings': store['ratings']}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise customer review shards in parallel.")
+    parser.add_argument('folder', nargs='?', default=REVIEWS_DIR, help="folder containing review .txt shards")
+    parser.add_argument('-o', '--output', default=SUMMARY_DIR, help="folder for the summary files")
+    parser.add_argument('-n', '--top', type=int, default=3, help="number of top products to report")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--min-reviews', type=int, default=1, help="minimum reviews for the overall top-N")
+    parser.add_argument('--full', action='store_true', help="ignore the checkpoint store and reprocess every shard")
+    args = parser.parse_args()
+
+    result = analyze_reviews(args.folder, args.output, args.top, args.workers, incremental=not args.full,
+                             min_reviews=args.min_reviews)
+    print(f"Processed {result['processed']} new or changed of {result['files']} files.")
+    print(f"Totals: {result['valid']} valid and {result['invalid']} invalid lines.")
+    for product_id, avg, count in top_products(result['ratings'], args.top, args.min_reviews):
+        print(f"{product_id}: Average Rating = {avg:.2f} ({count} reviews)")
@@ -1,8 +1,12 @@
 import csv
+import io
 import os
-from datetime import datetime
+import sys
 from fpdf import FPDF
-from PyPDF2 import PdfMerger
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.instrumentation import stage
+from invoice_merge import merge_invoices
 
 import csv
 
@@ -11,22 +15,32 @@ filename = "orders.csv"
 
 # Sample order data
 orders = [
-    ["ORD001", "Amit Sharma", "Wireless Mouse", 2, 450.00],
-    ["ORD002", "Priya Patel", "USB Keyboard", 1, 700.00],
-    ["ORD003", "Rohit Verma", "Bluetooth Speaker", 3, 1200.00],
-    ["ORD004", "Sneha Iyer", "Laptop Stand", 1, 1500.00],
-    ["ORD005", "Karan Mehta", "External Hard Drive", 2, 3500.00]
+    ["ORD001", "Amit Sharma", "Wireless Mouse", 2, 450.00, "2025-09-30"],
+    ["ORD002", "Priya Patel", "USB Keyboard", 1, 700.00, "2025-09-30"],
+    ["ORD003", "Rohit Verma", "Bluetooth Speaker", 3, 1200.00, "2025-09-30"],
+    ["ORD004", "Sneha Iyer", "Laptop Stand", 1, 1500.00, "2025-09-30"],
+    ["ORD005", "Karan Mehta", "External Hard Drive", 2, 3500.00, "2025-09-30"]
 ]
 
-# Write CSV file
-with open(filename, mode="w", newline="", encoding="utf-8") as file:
-    writer = csv.writer(file)
-    # Write header
-    writer.writerow(["Order ID", "Customer Name", "Product Name", "Quantity", "Unit Price"])
-    # Write rows
-    writer.writerows(orders)
-
-print(f"{filename} has been created with 5 sample orders.")
+# Build the CSV text
+buffer = io.StringIO()
+writer = csv.writer(buffer)
+# Write header
+writer.writerow(["Order ID", "Customer Name", "Product Name", "Quantity", "Unit Price", "Order Date"])
+# Write rows
+writer.writerows(orders)
+
+# Write CSV file, only if it would change, so unchanged orders are not touched
+existing = None
+if os.path.exists(filename):
+    with open(filename, newline="", encoding="utf-8") as file:
+        existing = file.read()
+if existing != buffer.getvalue():
+    with open(filename, mode="w", newline="", encoding="utf-8") as file:
+        file.write(buffer.getvalue())
+    print(f"{filename} has been created with 5 sample orders.")
+else:
+    print(f"{filename} already has the 5 sample orders.")
 
 # Step 1: Load Order Data
 csv_file = "orders.csv"
@@ -37,53 +51,55 @@ if not os.path.exists("invoices"):
 
 invoices = []
 
-with open(csv_file, newline='') as file:
-    reader = csv.DictReader(file)
-
-    for row in reader:
-        order_id = row['Order ID']
-        customer_name = row['Customer Name']
-        product_name = row['Product Name']
-        quantity = int(row['Quantity'])
-        unit_price = float(row['Unit Price'])
-
-        # Step 2: Calculate total amount
-        total_amount = quantity * unit_price
+# Rendering is timed as one stage when EXPERIMENT_METRICS is set (common/instrumentation.py)
+with stage('render') as render:
+    with open(csv_file, newline='') as file:
+        reader = csv.DictReader(file)
 
-        # Step 3: Generate individual PDF invoice using fpdf
-        invoice_filename = f"invoices/{order_id}.pdf"
-        invoices.append(invoice_filename)
+        for row in reader:
+            order_id = row['Order ID']
+            customer_name = row['Customer Name']
+            product_name = row['Product Name']
+            quantity = int(row['Quantity'])
+            unit_price = float(row['Unit Price'])
+            # The purchase date comes from the data, not from the day the script runs
+            order_date = row['Order Date']
 
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
+            # Step 2: Calculate total amount
+            total_amount = quantity * unit_price
 
-        # Invoice Header
-        pdf.cell(200, 10, txt=f"Invoice Number: {order_id}", ln=True, align="L")
-        pdf.cell(200, 10, txt=f"Date of Purchase: {datetime.now().strftime('%Y-%m-%d')}", ln=True, align="L")
-        pdf.cell(200, 10, txt=f"Customer Name: {customer_name}", ln=True, align="L")
+            # Step 3: Generate individual PDF invoice using fpdf
+            invoice_filename = f"invoices/{order_id}.pdf"
+            invoices.append(invoice_filename)
 
-        pdf.ln(5)  # line break
+            pdf = FPDF()
+            pdf.add_page()
+            pdf.set_font("Arial", size=12)
 
-        # Order Details
-        pdf.cell(200, 10, txt=f"Product Name: {product_name}", ln=True, align="L")
-        pdf.cell(200, 10, txt=f"Quantity: {quantity}", ln=True, align="L")
-        pdf.cell(200, 10, txt=f"Unit Price: ${unit_price:.2f}", ln=True, align="L")
-        pdf.cell(200, 10, txt=f"Total Amount: ${total_amount:.2f}", ln=True, align="L")
+            # Invoice Header
+            pdf.cell(200, 10, txt=f"Invoice Number: {order_id}", ln=True, align="L")
+            pdf.cell(200, 10, txt=f"Date of Purchase: {order_date}", ln=True, align="L")
+            pdf.cell(200, 10, txt=f"Customer Name: {customer_name}", ln=True, align="L")
 
-        pdf.ln(10)
-        pdf.cell(200, 10, txt="Thank you for shopping with us!", ln=True, align="L")
+            pdf.ln(5)  # line break
 
-        pdf.output(invoice_filename)
+            # Order Details
+            pdf.cell(200, 10, txt=f"Product Name: {product_name}", ln=True, align="L")
+            pdf.cell(200, 10, txt=f"Quantity: {quantity}", ln=True, align="L")
+            pdf.cell(200, 10, txt=f"Unit Price: ${unit_price:.2f}", ln=True, align="L")
+            pdf.cell(200, 10, txt=f"Total Amount: ${total_amount:.2f}", ln=True, align="L")
 
-# Step 4: Merge all invoices into one PDF using PyPDF2
-merger = PdfMerger()
+            pdf.ln(10)
+            pdf.cell(200, 10, txt="Thank you for shopping with us!", ln=True, align="L")
 
-for pdf_file in invoices:
-    merger.append(pdf_file)
+            pdf.output(invoice_filename)
+    render.set(invoices=len(invoices))
 
+# Step 4: Merge all invoices into one PDF, streaming one invoice at a time
+# (invoice_merge.py) instead of holding every document in a PdfMerger
 merged_file = "All_Invoices.pdf"
-merger.write(merged_file)
-merger.close()
+merge_invoices(invoices, merged_file)
 
-print(f"All invoices generated and merged into '{merged_file}'")
\ No newline at end of file
+print(f"All invoices generated and merged into '{merged_file}'")
+# invoice_incremental.py does the same for large order files, re-rendering
+# only new and changed orders
\ No newline at end of file
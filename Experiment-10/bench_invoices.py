@@ -0,0 +1,84 @@
+"""
+Benchmark of invoice_engine.py against the way Experiment-10.py renders
+invoices: a new FPDF per order, one PDF file per invoice, then PdfMerger.
+Prints invoices/sec for each on the same synthetic orders.csv.
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+from fpdf import FPDF
+from PyPDF2 import PdfMerger, PdfReader
+
+import invoice_engine
+
+PRODUCTS = [("Wireless Mouse", 450.00), ("USB Keyboard", 700.00), ("Bluetooth Speaker", 1200.00),
+            ("Laptop Stand", 1500.00), ("External Hard Drive", 3500.00)]
+
+
+def write_orders(path, n_orders):
+    with open(path, mode="w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Order ID", "Customer Name", "Product Name", "Quantity", "Unit Price"])
+        for i in range(n_orders):
+            product, price = PRODUCTS[i % len(PRODUCTS)]
+            writer.writerow([f"ORD{i + 1:06d}", f"Customer {i % 977}", product, i % 4 + 1, price])
+
+
+def script_invoices(csv_file, folder, merged_file, date):
+    """Experiment-10.py's loop, with its output paths moved into folder."""
+    invoices = []
+    for row in invoice_engine.read_orders(csv_file):
+        fields = invoice_engine.invoice_fields(row, date)
+        invoice_filename = os.path.join(folder, f"{fields['order_id']}.pdf")
+        invoices.append(invoice_filename)
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.set_font("Arial", size=12)
+        for entry in invoice_engine.LAYOUT:
+            if isinstance(entry, int):
+                pdf.ln(entry)
+            else:
+                pdf.cell(200, 10, txt=entry.format(**fields), ln=True, align="L")
+        pdf.output(invoice_filename)
+
+    merger = PdfMerger()
+    for pdf_file in invoices:
+        merger.append(pdf_file)
+    merger.write(merged_file)
+    merger.close()
+    return len(invoices)
+
+
+def timed(func):
+    start = time.perf_counter()
+    count = func()
+    return count / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare invoice_engine with the Experiment-10 loop.")
+    parser.add_argument('-n', '--orders', type=int, default=2000)
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    date = '2025-09-30'
+    with tempfile.TemporaryDirectory() as tmp:
+        orders = os.path.join(tmp, 'orders.csv')
+        write_orders(orders, args.orders)
+        os.makedirs(os.path.join(tmp, 'invoices'))
+
+        results = [('Experiment-10 loop + PdfMerger', timed(lambda: script_invoices(
+            orders, os.path.join(tmp, 'invoices'), os.path.join(tmp, 'script.pdf'), date)))]
+        for workers in sorted({1, args.workers}):
+            merged = os.path.join(tmp, f'engine_{workers}.pdf')
+            rate = timed(lambda: invoice_engine.render_invoices(orders, merged, workers, date))
+            if len(PdfReader(merged).pages) != args.orders:
+                raise SystemExit(f"{merged} does not have {args.orders} pages")
+            results.append((f'invoice_engine, {workers} worker(s)', rate))
+
+    print(f"{args.orders} orders")
+    for name, rate in results:
+        print(f"{name:<34} {rate:>10,.0f} invoices/sec  {rate / results[0][1]:>6.1f}x")
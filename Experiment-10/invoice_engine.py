@@ -0,0 +1,376 @@
+"""
+Invoice engine for Experiment-10.
+
+Experiment-10 builds a new FPDF per order and lays out the same page every
+time, although only the order's values differ. Here FPDF lays the invoice
+out once with placeholder fields (InvoiceTemplate), and each invoice's page
+is that layout with the values of its order filled in. Pages are rendered
+in chunks across a process pool and streamed in order into one combined
+PDF by PdfStreamWriter, whose pages all share one font and resource
+dictionary, so no per-invoice file is written and read back. VolumeWriter
+optionally rolls the output over into numbered volumes.
+"""
+import argparse
+import csv
+import hashlib
+import os
+import sys
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from fpdf import FPDF
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.instrumentation import timed
+
+# Experiment-10's invoice: a line of text per entry, or the height of a line break
+LAYOUT = [
+    "Invoice Number: {order_id}",
+    "Date of Purchase: {date}",
+    "Customer Name: {customer_name}",
+    5,
+    "Product Name: {product_name}",
+    "Quantity: {quantity}",
+    "Unit Price: ${unit_price}",
+    "Total Amount: ${total_amount}",
+    10,
+    "Thank you for shopping with us!",
+]
+FIELD_MARK = '\x01'
+CHUNK_SIZE = 256
+
+
+def read_orders(csv_file):
+    """Yields the rows of orders.csv one at a time."""
+    with open(csv_file, newline='') as file:
+        yield from csv.DictReader(file)
+
+
+def invoice_fields(row, date):
+    """
+    The values an invoice shows for one orders.csv row, formatted as
+    Experiment-10 does. The row's Order Date, if it has one, is the date of
+    purchase; date is used for rows without one.
+    """
+    quantity = int(row['Quantity'])
+    unit_price = float(row['Unit Price'])
+    return {
+        'order_id': row['Order ID'],
+        'date': row.get('Order Date') or date,
+        'customer_name': row['Customer Name'],
+        'product_name': row['Product Name'],
+        'quantity': str(quantity),
+        'unit_price': f"{unit_price:.2f}",
+        'total_amount': f"{quantity * unit_price:.2f}",
+    }
+
+
+class InvoiceTemplate:
+    """
+    The invoice page as FPDF lays it out, split into the static content
+    stream text and the fields that go between it.
+    """
+
+    def __init__(self, layout=LAYOUT):
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.set_font("Arial", size=12)
+        for entry in layout:
+            if isinstance(entry, int):
+                pdf.ln(entry)
+            else:
+                marked = entry.replace('{', FIELD_MARK).replace('}', FIELD_MARK)
+                pdf.cell(200, 10, txt=marked, ln=True, align="L")
+
+        # Even parts are static content, odd parts are field names
+        parts = pdf.pages[1].split(FIELD_MARK)
+        self.static = parts[0::2]
+        self.fields = parts[1::2]
+        self.escape = pdf._escape
+        self.page_size = (pdf.fw_pt, pdf.fh_pt)
+        font = next(iter(pdf.fonts.values()))
+        self.font = (font['i'], font['name'])
+
+    def content(self, fields):
+        """Uncompressed page content for one invoice, byte for byte what FPDF would produce."""
+        pieces = [self.static[0]]
+        for name, static in zip(self.fields, self.static[1:]):
+            pieces.append(self.escape(fields[name]))
+            pieces.append(static)
+        return ''.join(pieces).encode('latin-1')
+
+    def render(self, fields):
+        """Compressed page content for one invoice."""
+        return zlib.compress(self.content(fields))
+
+
+class PdfStreamWriter:
+    """
+    Writes a PDF one page at a time. Only each object's offset is kept in
+    memory (8 bytes in an array), and the page tree and cross-reference
+    table are written by close(). Objects added with add_shared() are
+    written once per file, so a font or resource dictionary used by every
+    page is stored once.
+
+    Given the state() of a file it wrote earlier as resume, the writer
+    instead appends an incremental update to that file: only objects
+    written now (new pages, replace()d content, the page tree) are added,
+    followed by a cross-reference section that points back to the old one.
+    """
+
+    def __init__(self, path, page_size, created=None, resume=None):
+        self.path = path
+        width, height = page_size
+        self.media_box = f"/MediaBox [0 0 {width:.2f} {height:.2f}]"
+        self.created = created or datetime.now().strftime('%Y%m%d%H%M%S')
+        self.pages = array('q')
+        self.resume = resume
+        if resume is None:
+            self.file = open(path, 'wb')
+            self.position = 0
+            self.shared = {}
+            # Object 1 is the page tree, which is written last
+            self.next_id = 2
+            self._write(b'%PDF-1.3\n')
+        else:
+            self.file = open(path, 'r+b')
+            self.file.truncate(resume['size'])
+            self.position = self.file.seek(resume['size'])
+            self.shared = {bytes.fromhex(key): object_id for key, object_id in resume['shared'].items()}
+            self.next_id = resume['next_id']
+        # Indexed by object id, 0 for objects not written by this writer
+        self.offsets = array('q', [0]) * self.next_id
+
+    def _write(self, data):
+        self.file.write(data)
+        self.position += len(data)
+
+    def _object(self, object_id, body, stream=None):
+        if object_id < len(self.offsets):
+            self.offsets[object_id] = self.position
+        else:
+            self.offsets.append(self.position)
+        self._write(b'%d 0 obj\n' % object_id + body + b'\n')
+        if stream is not None:
+            self._write(b'stream\n' + stream + b'\nendstream\n')
+        self._write(b'endobj\n')
+
+    def add(self, body, stream=None):
+        """Writes an object (body as bytes or str, plus stream data for streams) and returns its id."""
+        if isinstance(body, str):
+            body = body.encode('latin-1')
+        object_id = self.next_id
+        self.next_id += 1
+        self._object(object_id, body, stream)
+        return object_id
+
+    def replace(self, object_id, body, stream=None):
+        """Writes a new version of an existing object, which supersedes the old one."""
+        if isinstance(body, str):
+            body = body.encode('latin-1')
+        self._object(object_id, body, stream)
+
+    def add_shared(self, body, stream=None):
+        """Like add(), but returns the existing id if the same object was already written."""
+        if isinstance(body, str):
+            body = body.encode('latin-1')
+        key = hashlib.sha1(body + b'\0' + (stream or b'')).digest()
+        object_id = self.shared.get(key)
+        if object_id is None:
+            object_id = self.shared[key] = self.add(body, stream)
+        return object_id
+
+    def add_page(self, contents_id, resources_id, media_box=None):
+        """Appends a page made of already written content and resource objects. Returns its id."""
+        extra = f" /MediaBox {media_box}" if media_box else ''
+        page_id = self.add(f"<</Type /Page /Parent 1 0 R /Resources {resources_id} 0 R /Contents {contents_id} 0 R{extra}>>")
+        self.pages.append(page_id)
+        return page_id
+
+    def close(self):
+        self.offsets[1] = self.position
+        self._write(b'1 0 obj\n<</Type /Pages /Kids [')
+        for start in range(0, len(self.pages), 4096):
+            self._write(''.join(f"{page_id} 0 R " for page_id in self.pages[start:start + 4096]).encode('latin-1'))
+        self._write(f"] /Count {len(self.pages)} {self.media_box}>>\nendobj\n".encode('latin-1'))
+        if self.resume is None:
+            self.info_id = self.add(f"<</Producer (Experiment-10 invoice engine) /CreationDate (D:{self.created})>>")
+            self.catalog_id = self.add("<</Type /Catalog /Pages 1 0 R>>")
+        else:
+            self.info_id, self.catalog_id = self.resume['info'], self.resume['catalog']
+
+        self.xref = self.position
+        if self.resume is None:
+            self._write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n".encode('latin-1'))
+            for start in range(1, self.next_id, 4096):
+                offsets = self.offsets[start:min(start + 4096, self.next_id)]
+                self._write(''.join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('latin-1'))
+            previous = ''
+        else:
+            # One subsection per object written in this update, after the
+            # usual free entry 0, which keeps readers from guessing at an offset
+            self._write(b'xref\n0 1\n0000000000 65535 f \n')
+            entries = [f"{object_id} 1\n{offset:010d} 00000 n \n"
+                       for object_id, offset in enumerate(self.offsets) if offset]
+            for start in range(0, len(entries), 4096):
+                self._write(''.join(entries[start:start + 4096]).encode('latin-1'))
+            previous = f" /Prev {self.resume['xref']}"
+        self._write(f"trailer\n<</Size {self.next_id} /Root {self.catalog_id} 0 R /Info {self.info_id} 0 R{previous}>>\n"
+                    f"startxref\n{self.xref}\n%%EOF\n".encode('latin-1'))
+        self.file.close()
+
+    def state(self):
+        """What a later writer needs to append an incremental update to the closed file."""
+        return {'size': self.position, 'xref': self.xref, 'next_id': self.next_id,
+                'info': self.info_id, 'catalog': self.catalog_id,
+                'shared': {key.hex(): object_id for key, object_id in self.shared.items()}}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def volume_path(merged_file, number):
+    """All_Invoices.pdf -> All_Invoices_0001.pdf"""
+    stem, ext = os.path.splitext(merged_file)
+    return f"{stem}_{number:04d}{ext}"
+
+
+class VolumeWriter:
+    """
+    Spreads pages over numbered volumes of at most max_pages pages and about
+    max_bytes bytes each, so no single file, and none of the per-file
+    bookkeeping, grows with the number of pages. Without limits everything
+    goes into merged_file itself.
+    """
+
+    def __init__(self, merged_file, page_size, max_pages=None, max_bytes=None):
+        self.merged_file = merged_file
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.paths = []
+        self.current = None
+
+    @property
+    def rolling(self):
+        return bool(self.max_pages or self.max_bytes)
+
+    def writer(self):
+        """The PdfStreamWriter the next page goes to, opening a new volume when the current one is full."""
+        current = self.current
+        if current is not None and self.rolling and (
+                (self.max_pages and len(current.pages) >= self.max_pages) or
+                (self.max_bytes and current.position >= self.max_bytes)):
+            current.close()
+            current = None
+        if current is None:
+            number = len(self.paths) + 1
+            path = volume_path(self.merged_file, number) if self.rolling else self.merged_file
+            current = self.current = PdfStreamWriter(path, self.page_size)
+            self.paths.append(path)
+        return current
+
+    def close(self):
+        if self.current is None:
+            # An empty run still leaves a (blank) document behind
+            self.writer()
+        self.current.close()
+        self.current = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def add_invoice_page(writer, template, content):
+    """
+    Adds one rendered invoice page, sharing the template's font and
+    resources within the file. Returns the ids of the page and its content.
+    """
+    font_index, font_name = template.font
+    font_id = writer.add_shared(f"<</Type /Font /BaseFont /{font_name} /Subtype /Type1 /Encoding /WinAnsiEncoding>>")
+    resources_id = writer.add_shared(f"<</ProcSet [/PDF /Text] /Font <</F{font_index} {font_id} 0 R>> >>")
+    contents_id = writer.add(f"<</Filter /FlateDecode /Length {len(content)}>>", content)
+    return writer.add_page(contents_id, resources_id), contents_id
+
+
+# Every worker process lays the template out once
+_template = None
+
+
+def _render_chunk(job):
+    global _template
+    rows, date = job
+    if _template is None:
+        _template = InvoiceTemplate()
+    return [_template.render(invoice_fields(row, date)) for row in rows]
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def render_pages(rows, date, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Yields the compressed page of every order in order. Only a few chunks
+    per worker are in flight at once, so memory does not grow with the
+    number of orders.
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = ((chunk, date) for chunk in chunked(rows, chunk_size))
+    if workers == 1:
+        for job in jobs:
+            yield from _render_chunk(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for job in jobs:
+            pending.append(executor.submit(_render_chunk, job))
+            if len(pending) >= workers * 4:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+@timed('render')
+def render_invoices(csv_file='orders.csv', merged_file='All_Invoices.pdf', workers=None,
+                    date=None, chunk_size=CHUNK_SIZE, max_pages=None):
+    """
+    Renders every order of csv_file straight into merged_file, or into
+    volumes of max_pages invoices if given. Returns the number of invoices.
+    """
+    date = date or datetime.now().strftime('%Y-%m-%d')
+    template = InvoiceTemplate()
+    count = 0
+    with VolumeWriter(merged_file, template.page_size, max_pages) as volumes:
+        for page in render_pages(read_orders(csv_file), date, workers, chunk_size):
+            add_invoice_page(volumes.writer(), template, page)
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the Experiment-10 invoices into one PDF.")
+    parser.add_argument('orders', nargs='?', default='orders.csv')
+    parser.add_argument('-o', '--output', default='All_Invoices.pdf')
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--date', help="date of purchase to print (default: today)")
+    parser.add_argument('--volume-pages', type=int, help="split the output into numbered volumes of this many invoices")
+    args = parser.parse_args()
+
+    count = render_invoices(args.orders, args.output, args.workers, args.date, max_pages=args.volume_pages)
+    print(f"{count} invoices rendered into '{args.output}'")
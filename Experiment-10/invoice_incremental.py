@@ -0,0 +1,198 @@
+"""
+Incremental, idempotent invoice regeneration for Experiment-10.
+
+Every order is keyed by a SHA-256 of the fields its invoice shows (and of
+the invoice layout), and a JSON manifest in the invoices folder records the
+key each invoice was last rendered with. A run re-renders only orders whose
+key is new or different, so unchanged orders keep their exact bytes. The
+date of purchase comes from the order's Order Date column; orders without
+one keep the date they were first rendered with.
+
+The merged PDF is not rewritten either: changed invoices are appended to it
+as a PDF incremental update that supersedes their old page content, along
+with new pages and a new page tree. --full (or a merged file that no longer
+matches the manifest) rebuilds everything, which also drops the superseded
+content from the file.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from array import array
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.instrumentation import timed
+
+import invoice_engine
+from invoice_engine import InvoiceTemplate, PdfStreamWriter, add_invoice_page, invoice_fields
+
+MANIFEST_VERSION = 1
+# Bytes before the end of the merged file that must still match for an update
+CHECK_BYTES = 4096
+
+
+def manifest_path(invoice_dir):
+    return os.path.join(invoice_dir, 'manifest.json')
+
+
+def load_manifest(invoice_dir):
+    try:
+        with open(manifest_path(invoice_dir), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'version': MANIFEST_VERSION, 'layout': None, 'orders': {}, 'merged': None}
+
+
+@timed('save')
+def save_manifest(invoice_dir, manifest):
+    path = manifest_path(invoice_dir)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        # dumps without indent uses the C encoder
+        f.write(json.dumps(manifest))
+    os.replace(tmp_path, path)
+
+
+def layout_key(layout=invoice_engine.LAYOUT):
+    """Changes whenever the invoice layout does, so that every invoice is re-rendered."""
+    return hashlib.sha256(json.dumps(layout).encode('utf-8')).hexdigest()
+
+
+def order_key(fields, layout):
+    values = [layout] + [fields[name] for name in sorted(fields)]
+    return hashlib.sha256('\x1f'.join(values).encode('utf-8')).hexdigest()
+
+
+def pdf_timestamp(date):
+    """'2025-09-30' -> '20250930000000', the CreationDate of an invoice bought that day."""
+    return date.replace('-', '')[:8].ljust(14, '0')
+
+
+def _tail_sha256(path, size):
+    with open(path, 'rb') as f:
+        f.seek(max(0, size - CHECK_BYTES))
+        return hashlib.sha256(f.read(min(size, CHECK_BYTES))).hexdigest()
+
+
+def merged_is_current(merged_file, merged):
+    """True if merged_file is still the file the manifest's merged state describes."""
+    if not merged or merged['file'] != os.path.basename(merged_file) or not os.path.exists(merged_file):
+        return False
+    if os.path.getsize(merged_file) < merged['size']:
+        return False
+    return _tail_sha256(merged_file, merged['size']) == merged['tail_sha256']
+
+
+def _order_rows(csv_file, orders):
+    """The rows of csv_file with the date of purchase recorded for each order filled in."""
+    for row in invoice_engine.read_orders(csv_file):
+        yield dict(row, **{'Order Date': orders[row['Order ID']]['date']})
+
+
+@timed('update')
+def update_invoices(csv_file='orders.csv', invoice_dir='invoices', merged_file='All_Invoices.pdf',
+                    full=False, date=None, workers=1):
+    """
+    Brings invoice_dir and merged_file up to date with csv_file, rendering
+    only new and changed orders. date is the date of purchase for new
+    orders without an Order Date (default: today). Returns the counts of
+    rendered, unchanged and removed invoices.
+    """
+    os.makedirs(invoice_dir, exist_ok=True)
+    manifest = load_manifest(invoice_dir)
+    layout = layout_key()
+    previous = manifest['orders']
+    # Re-render everything, still with the dates orders were first rendered with
+    rerender = full or manifest['layout'] != layout
+    if rerender:
+        manifest.update(layout=layout, merged=None)
+    date = date or datetime.now().strftime('%Y-%m-%d')
+
+    # Only the keys are computed for every order; nothing is rendered yet
+    orders = {}
+    changed = set()
+    for row in invoice_engine.read_orders(csv_file):
+        order_id = row['Order ID']
+        if order_id in orders:
+            raise ValueError(f"Order ID {order_id} appears more than once in {csv_file}")
+        known = previous.get(order_id)
+        fields = invoice_fields(row, known['date'] if known else date)
+        key = order_key(fields, layout)
+        entry = dict(known) if known else {}
+        entry.update(key=key, date=fields['date'], file=f"{order_id}.pdf")
+        orders[order_id] = entry
+        if (rerender or not known or known['key'] != key or
+                not os.path.exists(os.path.join(invoice_dir, entry['file']))):
+            changed.add(order_id)
+    removed = [order_id for order_id in previous if order_id not in orders]
+
+    template = InvoiceTemplate()
+    for order_id in removed:
+        try:
+            os.remove(os.path.join(invoice_dir, previous[order_id]['file']))
+        except FileNotFoundError:
+            pass
+
+    resume = manifest['merged'] if merged_is_current(merged_file, manifest['merged']) else None
+    if resume is None:
+        # A new merged file needs every page, so render all orders, streaming them in
+        rows = _order_rows(csv_file, orders)
+        pages = zip(orders, invoice_engine.render_pages(rows, date, workers))
+        _write_merged(merged_file, manifest, orders, pages, template, invoice_dir, changed, None)
+    elif changed or removed:
+        pages = []
+        for row in _order_rows(csv_file, orders):
+            if row['Order ID'] in changed:
+                pages.append((row['Order ID'], template.render(invoice_fields(row, date))))
+        _write_merged(merged_file, manifest, orders, pages, template, invoice_dir, changed, resume)
+    else:
+        # Nothing to do, and nothing is written
+        return {'rendered': 0, 'unchanged': len(orders), 'removed': 0}
+    manifest['orders'] = orders
+    save_manifest(invoice_dir, manifest)
+    return {'rendered': len(changed), 'unchanged': len(orders) - len(changed), 'removed': len(removed)}
+
+
+@timed('render')
+def _write_merged(merged_file, manifest, orders, pages, template, invoice_dir, changed, resume):
+    """
+    Writes the rendered (order id, page) pairs into merged_file (appending
+    an update to it when resume is given) and saves the changed ones as
+    individual invoices too.
+    """
+    created = pdf_timestamp(max((entry['date'] for entry in orders.values()), default='1970-01-01'))
+    with PdfStreamWriter(merged_file, template.page_size, created=created, resume=resume) as writer:
+        for order_id, content in pages:
+            entry = orders[order_id]
+            if resume is not None and 'page' in entry:
+                # Same page object, new content: the update supersedes the old stream
+                writer.replace(entry['contents'], f"<</Filter /FlateDecode /Length {len(content)}>>", content)
+            else:
+                entry['page'], entry['contents'] = add_invoice_page(writer, template, content)
+            if order_id in changed:
+                # Individual invoices: the same order always gives the same bytes
+                with PdfStreamWriter(os.path.join(invoice_dir, entry['file']), template.page_size,
+                                     created=pdf_timestamp(entry['date'])) as invoice:
+                    add_invoice_page(invoice, template, content)
+        # The page tree lists every order in orders.csv order
+        writer.pages = array('q', (entry['page'] for entry in orders.values()))
+    state = writer.state()
+    state.update(file=os.path.basename(merged_file), tail_sha256=_tail_sha256(merged_file, state['size']))
+    manifest['merged'] = state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render only the new and changed Experiment-10 invoices.")
+    parser.add_argument('orders', nargs='?', default='orders.csv')
+    parser.add_argument('-d', '--invoices', default='invoices', help="folder of the individual invoices")
+    parser.add_argument('-o', '--output', default='All_Invoices.pdf')
+    parser.add_argument('--full', action='store_true', help="re-render every invoice and rebuild the merged PDF")
+    parser.add_argument('--date', help="date of purchase for new orders without an Order Date (default: today)")
+    parser.add_argument('-w', '--workers', type=int, default=1, help="worker processes for a full rebuild")
+    args = parser.parse_args()
+
+    counts = update_invoices(args.orders, args.invoices, args.output, args.full, args.date, args.workers)
+    print(f"{counts['rendered']} invoices rendered, {counts['unchanged']} unchanged, "
+          f"{counts['removed']} removed; '{args.output}' is up to date")
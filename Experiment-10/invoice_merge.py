@@ -0,0 +1,158 @@
+"""
+Streaming merge of the Experiment-10 invoices.
+
+PdfMerger keeps every appended document parsed in memory until write().
+merge_invoices instead opens one invoice at a time, copies its pages into
+the output as they are read and lets the invoice go. Objects reachable from
+a page's resources (fonts, encodings, images) are written once per output
+file and shared by every page that uses an identical one, so a thousand
+FPDF invoices reference one Helvetica font object. Output can be rolled
+over into numbered volumes (All_Invoices_0001.pdf, ...), so neither file
+size nor the writer's bookkeeping grows with the number of invoices.
+
+Pages keep their content, resources, media box and rotation; links and
+other annotations are not copied.
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.instrumentation import timed
+
+from invoice_engine import VolumeWriter
+
+A4 = (595.28, 841.89)
+# Page attributes a page may inherit from its parents in the page tree
+INHERITED = ('/Resources', '/MediaBox', '/Rotate')
+
+
+class PageCopier:
+    """Copies the pages of one source document into a PdfStreamWriter."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        # Source object number -> output id, so objects used twice in one
+        # document are copied once even when they are not shareable
+        self.copied = {}
+
+    def serialize(self, obj):
+        """PDF syntax for obj, with references renumbered to the output file."""
+        if isinstance(obj, IndirectObject):
+            return b'%d 0 R' % self.copy(obj)
+        if isinstance(obj, DictionaryObject):
+            items = b' '.join(self.serialize(key) + b' ' + self.serialize(value)
+                              for key, value in obj.items() if key != '/Length')
+            return b'<<' + items + b'>>'
+        if isinstance(obj, ArrayObject):
+            return b'[' + b' '.join(self.serialize(item) for item in obj) + b']'
+        buffer = io.BytesIO()
+        obj.write_to_stream(buffer, None)
+        return buffer.getvalue()
+
+    def copy(self, reference, shared=True):
+        """Writes the object behind reference (once) and returns its id in the output."""
+        key = (reference.idnum, reference.generation)
+        object_id = self.copied.get(key)
+        if object_id is not None:
+            if object_id == 0:
+                raise ValueError(f"Object {reference.idnum} refers back to itself")
+            return object_id
+        self.copied[key] = 0
+
+        obj = reference.get_object()
+        body, stream = self.serialize_object(obj)
+        add = self.writer.add_shared if shared else self.writer.add
+        object_id = self.copied[key] = add(body, stream)
+        return object_id
+
+    def serialize_object(self, obj):
+        """Body and raw stream data of a direct object."""
+        if isinstance(obj, StreamObject):
+            # _data is the stream still encoded with its /Filter
+            data = obj._data
+            body = self.serialize(obj)[:-2] + b' /Length %d>>' % len(data)
+            return body, data
+        return self.serialize(obj), None
+
+    def copy_page(self, page):
+        """Adds one page to the output."""
+        attributes = {name: page.get(name) for name in INHERITED}
+        parent = page.get('/Parent')
+        while parent is not None and any(value is None for value in attributes.values()):
+            parent = parent.get_object()
+            for name in INHERITED:
+                if attributes[name] is None and name in parent:
+                    attributes[name] = parent[name]
+            parent = parent.get('/Parent')
+
+        writer = self.writer
+        contents = page.get('/Contents')
+        if contents is None:
+            contents_id = writer.add_shared(b'<</Length 0>>', b'')
+        elif isinstance(contents, IndirectObject):
+            # Page content is unique to the page, not worth remembering
+            contents_id = self.copy(contents, shared=False)
+        else:
+            # Direct arrays of streams are wrapped in an indirect array
+            contents_id = writer.add(self.serialize(contents))
+
+        resources = attributes['/Resources'] or DictionaryObject()
+        resources_id = self.shared_id(resources)
+        extra = []
+        if attributes['/MediaBox'] is not None:
+            extra.append(b'/MediaBox ' + self.serialize(attributes['/MediaBox']))
+        if attributes['/Rotate'] is not None:
+            extra.append(b'/Rotate ' + self.serialize(attributes['/Rotate']))
+        writer.add(b'<</Type /Page /Parent 1 0 R /Resources %d 0 R /Contents %d 0 R %s>>'
+                   % (resources_id, contents_id, b' '.join(extra)))
+        writer.pages.append(writer.next_id - 1)
+
+    def shared_id(self, obj):
+        """Output id of a resource object, which may be a direct dictionary."""
+        if isinstance(obj, IndirectObject):
+            return self.copy(obj)
+        return self.writer.add_shared(*self.serialize_object(obj))
+
+
+def find_invoices(source):
+    """Expands a directory or glob pattern into a sorted list of PDF paths."""
+    if os.path.isdir(source):
+        source = os.path.join(source, '*.pdf')
+    return sorted(path for path in glob.glob(source) if os.path.isfile(path))
+
+
+@timed('merge')
+def merge_invoices(pdf_files, merged_file='All_Invoices.pdf', max_pages=None, max_bytes=None):
+    """
+    Streams the pages of pdf_files into merged_file, or into numbered
+    volumes when max_pages or max_bytes is given. Returns the paths written.
+    """
+    with VolumeWriter(merged_file, A4, max_pages, max_bytes) as volumes:
+        for pdf_file in pdf_files:
+            copier = None
+            for page in PdfReader(pdf_file).pages:
+                writer = volumes.writer()
+                # Object ids belong to one output file, so a new volume needs a new copier
+                if copier is None or copier.writer is not writer:
+                    copier = PageCopier(writer)
+                copier.copy_page(page)
+    return volumes.paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the Experiment-10 invoices without holding them all in memory.")
+    parser.add_argument('source', nargs='?', default='invoices', help="folder or glob pattern of invoice PDFs")
+    parser.add_argument('-o', '--output', default='All_Invoices.pdf')
+    parser.add_argument('--volume-pages', type=int, help="start a new volume after this many pages")
+    parser.add_argument('--volume-mb', type=float, help="start a new volume once a volume reaches this size")
+    args = parser.parse_args()
+
+    max_bytes = int(args.volume_mb * 1024 * 1024) if args.volume_mb else None
+    paths = merge_invoices(find_invoices(args.source), args.output, args.volume_pages, max_bytes)
+    print(f"Invoices merged into {', '.join(repr(path) for path in paths)}")
@@ -1,41 +1,55 @@
-import hashlib
+from passwords import hash_password, needs_rehash, verify_password
+from user_store import check_username, open_store
 
 file="users.txt"
 
+_store = None
+
+def get_store():
+    """Opens the user store once; users.txt is indexed in memory, a .db file is used through SQLite."""
+    global _store
+    if _store is None:
+        _store = open_store(file)
+    return _store
+
 def password_hasher(password):
-    return hashlib.sha256(password.encode()).hexdigest()  
+    # Salted scrypt in a versioned format (see passwords.py); auth_service.py
+    # runs the same hashing off the event loop for concurrent logins
+    return hash_password(password)
 
 
 def register_user(username, password):
+    # Taken or invalid usernames are turned away before paying for the KDF
+    try:
+        check_username(username)
+    except ValueError as e:
+        print(e)
+        return
+    if username in get_store():
+        print("Username already exists. Please choose a different one.")
+        return
     hashed_password = password_hasher(password)
-    user_exists = False
+    # add() checks again and appends under a lock, so a username is only ever registered once
     try:
-        with open(file, 'r') as f:
-            for line in f:
-                if line.strip().split(',')[0] == username:
-                    user_exists = True
-                    break
-    except FileNotFoundError:
-        pass
-
-    if user_exists:
+        added = get_store().add(username, hashed_password)
+    except ValueError as e:
+        print(e)
+        return
+    if not added:
         print("Username already exists. Please choose a different one.")
         return
-    
-    with open(file, 'a') as f:
-        f.write(f"{username},{hashed_password}\n")
     print("User registered successfully.")
 
 
 def authenticate_user(username, password):
-    hashed_password = password_hasher(password)
-    with open(file, 'r') as f:
-        users = f.readlines()
-    for user in users:
-        stored_username, stored_hashed_password = user.strip().split(',')
-        if stored_username == username and stored_hashed_password == hashed_password:
-            print("Authentication successful.")
-            return True
+    stored = get_store().get(username)
+    if stored is not None and verify_password(password, stored):
+        # Old unsalted SHA-256 entries are upgraded on a successful login
+        if needs_rehash(stored):
+            # Skipped if a concurrent login already replaced the hash
+            get_store().replace(username, stored, password_hasher(password))
+        print("Authentication successful.")
+        return True
     print("Authentication failed.")
     return False
 
@@ -0,0 +1,173 @@
+"""
+asyncio authentication API for Experiment-11.
+
+Salted KDFs (passwords.py) take tens of milliseconds of CPU per login, which
+would stall an event loop. AuthService sends every hash and verification to
+a process pool instead, with:
+
+* back-pressure: at most max_pending KDF jobs are queued or running; further
+  requests wait for a slot instead of piling work onto the pool;
+* a timeout per request, covering both the wait for a slot and the KDF;
+* transparent upgrades: a successful login with a legacy SHA-256 entry (or
+  an outdated cost) stores a fresh hash in the background.
+
+Unknown usernames still cost one verification, so response times do not
+reveal which usernames exist. Run this file to load-test the service.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from passwords import DEFAULT_SCHEME, default_params, hash_password, needs_rehash, verify_password
+from user_store import check_username, open_store
+
+DEFAULT_TIMEOUT = 5.0
+
+
+class AuthService:
+    """Registration and login over a user store, with KDF work in a process pool."""
+
+    def __init__(self, store, workers=None, max_pending=None, timeout=DEFAULT_TIMEOUT,
+                 scheme=DEFAULT_SCHEME, params=None):
+        self.store = store
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.slots = asyncio.Semaphore(max_pending or self.workers * 2)
+        self.timeout = timeout
+        self.scheme = scheme
+        self.params = params or default_params(scheme)
+        # Verified against for unknown users
+        self.dummy_hash = hash_password('', scheme, self.params)
+        self.rehashes = set()
+
+    async def _kdf(self, func, *args):
+        """Runs func in the pool once a slot is free; the slot is held until the worker is done with it."""
+        await self.slots.acquire()
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        loop = asyncio.get_running_loop()
+        # A request that times out stops waiting, but the slot stays taken
+        # while its job still occupies a worker
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self.slots.release))
+        return await asyncio.wrap_future(future)
+
+    async def register(self, username, password):
+        """Registers a user. Returns False if the username is taken; raises TimeoutError."""
+        check_username(username)
+        if username in self.store:
+            return False
+        password_hash = await asyncio.wait_for(
+            self._kdf(hash_password, password, self.scheme, self.params), self.timeout)
+        return self.store.add(username, password_hash)
+
+    async def login(self, username, password):
+        """True if the credentials are valid; raises TimeoutError if the check took too long."""
+        return await asyncio.wait_for(self._login(username, password), self.timeout)
+
+    async def _login(self, username, password):
+        stored = self.store.get(username)
+        if stored is None:
+            await self._kdf(verify_password, password, self.dummy_hash)
+            return False
+        valid = await self._kdf(verify_password, password, stored)
+        if valid and needs_rehash(stored, self.scheme, self.params):
+            task = asyncio.create_task(self._rehash(username, password, stored))
+            self.rehashes.add(task)
+            task.add_done_callback(self.rehashes.discard)
+        return valid
+
+    async def _rehash(self, username, password, stored):
+        new_hash = await self._kdf(hash_password, password, self.scheme, self.params)
+        # Only if no other login (or process) has replaced the hash meanwhile
+        self.store.replace(username, stored, new_hash)
+
+    async def close(self):
+        """Waits for pending rehashes and shuts the pool down."""
+        if self.rehashes:
+            await asyncio.gather(*self.rehashes, return_exceptions=True)
+        self.executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def load_test(store, n_users, clients, logins, workers, timeout, params):
+    """
+    Runs clients concurrent clients doing logins logins each. Returns the
+    sorted latencies in seconds, the elapsed time and the number of timeouts.
+    """
+    latencies = []
+    timeouts = 0
+    async with AuthService(store, workers, timeout=timeout, params=params) as service:
+        async def client(number):
+            nonlocal timeouts
+            for i in range(logins):
+                user = (number * logins + i) % n_users
+                start = time.perf_counter()
+                try:
+                    if not await service.login(f"user{user}", f"password{user}"):
+                        raise RuntimeError(f"user{user} failed to log in")
+                except asyncio.TimeoutError:
+                    timeouts += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(number) for number in range(clients)))
+        elapsed = time.perf_counter() - start
+    return sorted(latencies), elapsed, timeouts
+
+
+async def create_users(store, n_users, workers, params, legacy):
+    """Registers user0..user{n-1} (password: password<i>); the first legacy of them get SHA-256 entries."""
+    async with AuthService(store, workers, timeout=None, params=params) as service:
+        tasks = []
+        for user in range(n_users):
+            if user < legacy:
+                store.add(f"user{user}", hashlib.sha256(f"password{user}".encode()).hexdigest())
+            else:
+                tasks.append(service.register(f"user{user}", f"password{user}"))
+        await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the asyncio authentication service.")
+    parser.add_argument('-u', '--users', type=int, default=200)
+    parser.add_argument('-c', '--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('-l', '--logins', type=int, default=20, help="logins per client")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="KDF worker processes")
+    parser.add_argument('--ln', type=int, default=default_params('scrypt')['ln'], help="scrypt cost, log2(N)")
+    parser.add_argument('--legacy', type=int, default=0, help="users stored with legacy SHA-256 hashes")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT)
+    args = parser.parse_args()
+
+    params = dict(default_params('scrypt'), ln=args.ln)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(os.path.join(tmp, 'users.txt'))
+        asyncio.run(create_users(store, args.users, args.workers, params, args.legacy))
+        print(f"{args.users} users, scrypt ln={args.ln}, {args.workers or os.cpu_count()} worker(s)")
+        print(f"{'clients':>7} {'logins':>7} {'p50 (ms)':>9} {'p99 (ms)':>9} {'logins/sec':>11} {'timeouts':>9}")
+        for clients in args.clients:
+            latencies, elapsed, timeouts = asyncio.run(
+                load_test(store, args.users, clients, args.logins, args.workers, args.timeout, params))
+            print(f"{clients:>7} {len(latencies):>7} {percentile(latencies, 0.50) * 1000:>9.1f} "
+                  f"{percentile(latencies, 0.99) * 1000:>9.1f} {len(latencies) / elapsed:>11.1f} {timeouts:>9}")
+        if args.legacy:
+            upgraded = sum(1 for user in range(args.legacy) if store.get(f"user{user}").startswith('$'))
+            print(f"{upgraded} of {args.legacy} legacy hashes upgraded on login")
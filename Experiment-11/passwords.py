@@ -0,0 +1,100 @@
+"""
+Salted, tunable password hashing for Experiment-11.
+
+Hashes are stored in a versioned, self-describing format (the PHC string
+format used by passlib and argon2):
+
+    $scrypt$ln=14,r=8,p=1$<salt>$<key>
+    $pbkdf2-sha256$i=600000$<salt>$<key>
+
+with a random 16-byte salt per user and salt and key in unpadded base64.
+The scheme and its cost parameters travel with each hash, so the defaults
+can be raised later: needs_rehash() tells which stored hashes are older.
+A bare 64-character hex digest is a legacy Experiment-11 hash (unsalted
+SHA-256); it still verifies, and always needs a rehash.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import os
+
+DEFAULT_SCHEME = 'scrypt'
+# Current cost parameters of each scheme
+SCRYPT_PARAMS = {'ln': 14, 'r': 8, 'p': 1}
+PBKDF2_PARAMS = {'i': 600_000}
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+logger = logging.getLogger(__name__)
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _derive(scheme, params, password, salt):
+    if scheme == 'scrypt':
+        n = 1 << params['ln']
+        # scrypt needs about 128 * n * r bytes; leave room above that
+        return hashlib.scrypt(password, salt=salt, n=n, r=params['r'], p=params['p'],
+                              maxmem=256 * n * params['r'], dklen=KEY_BYTES)
+    if scheme == 'pbkdf2-sha256':
+        return hashlib.pbkdf2_hmac('sha256', password, salt, params['i'], dklen=KEY_BYTES)
+    raise ValueError(f"Unknown password hash scheme: {scheme}")
+
+
+def default_params(scheme):
+    return dict(SCRYPT_PARAMS if scheme == 'scrypt' else PBKDF2_PARAMS)
+
+
+def hash_password(password, scheme=DEFAULT_SCHEME, params=None):
+    """Hashes password with a new random salt and returns the encoded hash."""
+    params = params or default_params(scheme)
+    salt = os.urandom(SALT_BYTES)
+    key = _derive(scheme, params, password.encode(), salt)
+    encoded_params = ','.join(f"{name}={value}" for name, value in params.items())
+    return f"${scheme}${encoded_params}${_b64encode(salt)}${_b64encode(key)}"
+
+
+def is_legacy(stored):
+    return not stored.startswith('$')
+
+
+def parse_hash(stored):
+    """Splits an encoded hash into (scheme, params, salt, key)."""
+    try:
+        _, scheme, encoded_params, salt, key = stored.split('$')
+        params = {name: int(value) for name, value in
+                  (item.split('=') for item in encoded_params.split(','))}
+        return scheme, params, _b64decode(salt), _b64decode(key)
+    except ValueError:
+        raise ValueError("Malformed password hash") from None
+
+
+def verify_password(password, stored):
+    """
+    True if password matches the stored hash, in constant time for a given
+    hash. A malformed hash or an unknown scheme is logged and never matches.
+    """
+    if is_legacy(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    try:
+        scheme, params, salt, key = parse_hash(stored)
+        derived = _derive(scheme, params, password.encode(), salt)
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning("Cannot verify against a stored password hash (%s: %s)", type(e).__name__, e)
+        return False
+    return hmac.compare_digest(derived, key)
+
+
+def needs_rehash(stored, scheme=DEFAULT_SCHEME, params=None):
+    """True for legacy hashes and for hashes made with another scheme or cost than the current one."""
+    if is_legacy(stored):
+        return True
+    stored_scheme, stored_params, _, _ = parse_hash(stored)
+    return stored_scheme != scheme or stored_params != (params or default_params(scheme))
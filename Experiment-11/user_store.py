@@ -0,0 +1,286 @@
+"""
+User stores for the Experiment-11 login system, with constant-time lookup.
+
+Experiment-11 scans users.txt line by line on every registration and login.
+Two backends replace that, behind the same small interface (get, add,
+set, replace, import_flat, export_flat):
+
+* FlatFileUserStore keeps users.txt as it is and loads it once into a dict
+  (username -> password hash). Later calls only read lines appended since,
+  which a stat tells it about, so other processes' registrations show up.
+* SqliteUserStore keeps users in an SQLite table whose primary key is the
+  username, and uses users.txt only as an import/export format.
+
+Registration is atomic in both: the flat file checks and appends while
+holding an exclusive lock on users.txt.lock, and SQLite inserts with the
+primary key as the guard, so concurrent registrations of one username
+create exactly one user. A later line for a username overrides an earlier
+one, which is how set() updates a hash in the flat file.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.locking import file_lock
+
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+def check_username(username):
+    if not username or ',' in username or '\n' in username or '\r' in username:
+        raise ValueError("Usernames cannot be empty or contain commas or line breaks.")
+
+
+def read_flat(path):
+    """Yields the (username, hash) entries of a users.txt file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                username, password_hash = line.split(',', 1)
+                yield username, password_hash
+
+
+def write_flat(path, entries):
+    """Writes (username, hash) entries to a users.txt file, replacing it atomically."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for username, password_hash in entries:
+            f.write(f"{username},{password_hash}\n")
+    os.replace(tmp_path, path)
+
+
+class FlatFileUserStore:
+    """users.txt with an in-memory index that is loaded once and then kept up to date."""
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}
+        self.offset = 0
+        self.refresh()
+
+    def refresh(self):
+        """Indexes the complete lines appended to the file since the last call."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size == self.offset:
+            return
+        if size < self.offset:
+            # The file was rewritten (e.g. compacted), start over
+            self.index = {}
+            self.offset = 0
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        # A line still being written is picked up by a later refresh
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].decode('utf-8').splitlines():
+            line = line.strip()
+            if line:
+                username, password_hash = line.split(',', 1)
+                self.index[username] = password_hash
+        self.offset += end
+
+    def get(self, username):
+        """The stored password hash of username, or None."""
+        self.refresh()
+        return self.index.get(username)
+
+    def __contains__(self, username):
+        return self.get(username) is not None
+
+    def __len__(self):
+        self.refresh()
+        return len(self.index)
+
+    def _append(self, username, password_hash):
+        # Called with the lock held and the index refreshed
+        with open(self.path, 'ab') as f:
+            prefix = b''
+            if f.tell():
+                with open(self.path, 'rb') as check:
+                    check.seek(-1, os.SEEK_END)
+                    if check.read(1) != b'\n':
+                        prefix = b'\n'
+            f.write(prefix + f"{username},{password_hash}\n".encode('utf-8'))
+        self.refresh()
+
+    def add(self, username, password_hash):
+        """Registers a new user. Returns False if the username is taken."""
+        check_username(username)
+        with file_lock(self.path):
+            self.refresh()
+            if username in self.index:
+                return False
+            self._append(username, password_hash)
+        return True
+
+    def set(self, username, password_hash):
+        """Stores a new hash for a user, e.g. after rehashing."""
+        check_username(username)
+        with file_lock(self.path):
+            self.refresh()
+            self._append(username, password_hash)
+
+    def replace(self, username, old_hash, new_hash):
+        """
+        Stores new_hash only if username still has old_hash, checked under
+        the lock. Returns whether it did; concurrent rehashes of one user
+        then append a single line.
+        """
+        check_username(username)
+        with file_lock(self.path):
+            self.refresh()
+            if self.index.get(username) != old_hash:
+                return False
+            self._append(username, new_hash)
+        return True
+
+    def items(self):
+        self.refresh()
+        return self.index.items()
+
+    def import_flat(self, path):
+        """Adds the users of another users.txt file. Returns the number added."""
+        added = 0
+        for username, password_hash in read_flat(path):
+            added += self.add(username, password_hash)
+        return added
+
+    def export_flat(self, path):
+        """Writes one line per user, which also compacts overridden lines away."""
+        with file_lock(self.path):
+            write_flat(path, list(self.items()))
+
+    def close(self):
+        pass
+
+
+class SqliteUserStore:
+    """Users in an SQLite table keyed by username."""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        # WAL lets logins read while a registration writes
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS users "
+                        "(username TEXT PRIMARY KEY, password_hash TEXT NOT NULL) WITHOUT ROWID")
+
+    def get(self, username):
+        row = self.db.execute("SELECT password_hash FROM users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, username):
+        return self.get(username) is not None
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def add(self, username, password_hash):
+        check_username(username)
+        cursor = self.db.execute("INSERT OR IGNORE INTO users VALUES (?, ?)", (username, password_hash))
+        return cursor.rowcount == 1
+
+    def set(self, username, password_hash):
+        check_username(username)
+        self.db.execute("INSERT INTO users VALUES (?, ?) "
+                        "ON CONFLICT(username) DO UPDATE SET password_hash = excluded.password_hash",
+                        (username, password_hash))
+
+    def replace(self, username, old_hash, new_hash):
+        """Stores new_hash only if username still has old_hash. Returns whether it did."""
+        check_username(username)
+        cursor = self.db.execute("UPDATE users SET password_hash = ? WHERE username = ? AND password_hash = ?",
+                                 (new_hash, username, old_hash))
+        return cursor.rowcount == 1
+
+    def items(self):
+        return self.db.execute("SELECT username, password_hash FROM users ORDER BY username")
+
+    def import_flat(self, path):
+        """Adds the users of a users.txt file in one transaction; later lines override earlier ones."""
+        before = len(self)
+        with self.db:
+            self.db.execute("BEGIN")
+            self.db.executemany("INSERT INTO users VALUES (?, ?) "
+                                "ON CONFLICT(username) DO UPDATE SET password_hash = excluded.password_hash",
+                                read_flat(path))
+        return len(self) - before
+
+    def export_flat(self, path):
+        write_flat(path, self.items())
+
+    def close(self):
+        self.db.close()
+
+
+def open_store(path):
+    """SqliteUserStore for .db/.sqlite files, FlatFileUserStore otherwise."""
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        return SqliteUserStore(path)
+    return FlatFileUserStore(path)
+
+
+def benchmark(n_users, backend, lookups=10000):
+    """
+    Times registrations and lookups in a store that already holds n_users.
+    Returns the mean microseconds per registration and per lookup.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        flat = os.path.join(tmp, 'users.txt')
+        write_flat(flat, ((f"user{i}", f"{i:064x}") for i in range(n_users)))
+        path = os.path.join(tmp, 'users.db') if backend == 'sqlite' else flat
+        store = open_store(path)
+        if backend == 'sqlite':
+            store.import_flat(flat)
+
+        start = time.perf_counter()
+        for i in range(lookups):
+            store.get(f"user{(i * 7919) % n_users}")
+        lookup = (time.perf_counter() - start) / lookups * 1e6
+
+        registrations = min(lookups, 1000)
+        start = time.perf_counter()
+        for i in range(registrations):
+            store.add(f"new{i}", f"{i:064x}")
+        register = (time.perf_counter() - start) / registrations * 1e6
+        store.close()
+    return register, lookup
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage or benchmark the Experiment-11 user store.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_cmd = commands.add_parser('import', help="load a users.txt file into a store")
+    import_cmd.add_argument('source')
+    import_cmd.add_argument('store')
+    export_cmd = commands.add_parser('export', help="write a store out as a users.txt file")
+    export_cmd.add_argument('store')
+    export_cmd.add_argument('destination')
+    bench_cmd = commands.add_parser('bench', help="registration and login lookup cost by user count")
+    bench_cmd.add_argument('-n', '--users', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        store = open_store(args.store)
+        print(f"Imported {store.import_flat(args.source)} users into {args.store}")
+        store.close()
+    elif args.command == 'export':
+        store = open_store(args.store)
+        store.export_flat(args.destination)
+        print(f"Exported {len(store)} users to {args.destination}")
+        store.close()
+    else:
+        print(f"{'backend':<8} {'users':>10} {'register (us)':>14} {'lookup (us)':>12}")
+        for n_users in args.users:
+            for backend in ('flat', 'sqlite'):
+                register, lookup = benchmark(n_users, backend)
+                print(f"{backend:<8} {n_users:>10,} {register:>14.1f} {lookup:>12.1f}")
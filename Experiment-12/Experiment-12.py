@@ -1,13 +1,42 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
 import shutil
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.csv_cache import read_csv_cached
+from common.instrumentation import stage, timed
+from expense_writer import create_expenses_file
+from ledger import ExpenseLedger
+import incremental_backup
+
 EXPENSES_FILE = os.path.join('Experiment-12', 'expenses.csv')
 BUDGET_FILE = os.path.join('Experiment-12', 'budget.csv')
 BACKUP_DIR = os.path.join('Experiment-12', 'backup')
 
+@timed('load')
+def load_expenses():
+    """Reads expenses.csv with Date parsed, from the columnar cache when it is fresh."""
+    return read_csv_cached(EXPENSES_FILE, parse_dates=['Date'])
+
+_ledger = None
+
+def get_ledger(create=False):
+    """
+    Opens the expense ledger once and afterwards only catches up on new rows.
+    With create, a missing expenses.csv is created with its header first.
+    """
+    global _ledger
+    if create:
+        create_expenses_file(EXPENSES_FILE)
+    if _ledger is None:
+        _ledger = ExpenseLedger(EXPENSES_FILE)
+    else:
+        _ledger.refresh()
+    return _ledger
+
 def log_expense():
     name = input("Enter your name: ")
     date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -19,50 +48,46 @@ def log_expense():
         return
     category = input("Enter category (e.g., groceries, utilities): ")
 
-    new_expense = pd.DataFrame([[name, date, description, amount, category]],
-                               columns=['Name', 'Date', 'Description', 'Amount', 'Category'])
-    
-    new_expense.to_csv(EXPENSES_FILE, mode='a', header=False, index=False)
+    with stage('append'):
+        # The first expense on a fresh checkout creates expenses.csv
+        get_ledger(create=True).append(name, date, description, amount, category)
     print("Expense logged successfully.")
 
+@timed('analyze')
 def analyze_expenses():
     try:
-        expenses_df = pd.read_csv(EXPENSES_FILE)
+        ledger = get_ledger()
     except FileNotFoundError:
         print(f"{EXPENSES_FILE} not found.")
         return
 
-    if expenses_df.empty:
+    if not ledger.count:
         print("No expenses logged yet.")
         return
 
-    # Total expenses per family member
-    expenses_by_member = expenses_df.groupby('Name')['Amount'].sum()
+    # Total expenses per family member, kept up to date by the ledger
+    expenses_by_member = pd.Series(ledger.member_totals, name='Amount').rename_axis('Name').sort_index()
     print("\nTotal Expenses per Family Member:")
     print(expenses_by_member)
 
     # Average daily expense for the household
-    expenses_df['Date'] = pd.to_datetime(expenses_df['Date'])
-    total_days = (expenses_df['Date'].max() - expenses_df['Date'].min()).days + 1
-    total_household_expense = expenses_df['Amount'].sum()
-    average_daily_expense = total_household_expense / total_days
+    average_daily_expense = ledger.average_daily_expense()
     print(f"\nAverage Daily Household Expense: {average_daily_expense:.2f}")
 
+@timed('plot')
 def plot_expense_trends():
     try:
-        expenses_df = pd.read_csv(EXPENSES_FILE)
+        ledger = get_ledger()
     except FileNotFoundError:
         print(f"{EXPENSES_FILE} not found.")
         return
 
-    if expenses_df.empty:
+    if not ledger.count:
         print("No expenses to plot.")
         return
 
-    expenses_df['Date'] = pd.to_datetime(expenses_df['Date'])
-    
-    daily_expenses = expenses_df.groupby('Date')['Amount'].sum().reset_index()
-    daily_expenses = daily_expenses.sort_values('Date')
+    daily_expenses = pd.Series(ledger.daily_totals, name='Amount').rename_axis('Date').sort_index().reset_index()
+    daily_expenses['Date'] = pd.to_datetime(daily_expenses['Date'])
     daily_expenses['Cumulative Amount'] = daily_expenses['Amount'].cumsum()
 
     plt.figure(figsize=(10, 5))
@@ -75,9 +100,10 @@ def plot_expense_trends():
     plt.tight_layout()
     plt.show()
 
+@timed('report')
 def generate_monthly_report():
     try:
-        expenses_df = pd.read_csv(EXPENSES_FILE)
+        expenses_df = load_expenses()
     except FileNotFoundError:
         print(f"{EXPENSES_FILE} not found.")
         return
@@ -86,7 +112,6 @@ def generate_monthly_report():
         print("No expenses to report.")
         return
 
-    expenses_df['Date'] = pd.to_datetime(expenses_df['Date'])
     expenses_df['Month'] = expenses_df['Date'].dt.to_period('M')
 
     latest_month = expenses_df['Month'].max()
@@ -121,10 +146,11 @@ def generate_monthly_report():
     plt.tight_layout()
     plt.show()
 
+@timed('budget')
 def manage_budget():
     try:
         budget_df = pd.read_csv(BUDGET_FILE)
-        expenses_df = pd.read_csv(EXPENSES_FILE)
+        ledger = get_ledger()
     except FileNotFoundError as e:
         print(f"Error: {e.filename} not found.")
         return
@@ -132,16 +158,14 @@ def manage_budget():
     if budget_df.empty:
         print("No budget set. Please add categories and budgets to budget.csv.")
         return
-    if expenses_df.empty:
+    if not ledger.count:
         print("No expenses logged yet.")
         return
 
-    expenses_df['Date'] = pd.to_datetime(expenses_df['Date'])
-    expenses_df['Month'] = expenses_df['Date'].dt.to_period('M')
-    latest_month = expenses_df['Month'].max()
-    monthly_expenses = expenses_df[expenses_df['Month'] == latest_month]
-
-    monthly_expenses_by_category = monthly_expenses.groupby('Category')['Amount'].sum().reset_index()
+    # Category totals of the latest month come straight from the ledger
+    latest_month = ledger.latest_month()
+    monthly_expenses_by_category = pd.DataFrame(list(ledger.category_totals(latest_month).items()),
+                                                columns=['Category', 'Amount'])
 
     budget_analysis = pd.merge(budget_df, monthly_expenses_by_category, on='Category', how='left')
     budget_analysis['Amount'] = budget_analysis['Amount'].fillna(0)
@@ -155,12 +179,23 @@ def manage_budget():
         print("\n--- WARNING: Budget Exceeded ---")
         print(exceeded_budget)
 
-def backup_data():
-
+@timed('save')
+def backup_data(incremental=True, compress=False):
+    """
+    Backs up expenses.csv. The incremental mode only stores what was appended
+    since the last backup; restore snapshots with incremental_backup.py restore.
+    """
     if not os.path.exists(BACKUP_DIR):
         os.makedirs(BACKUP_DIR)
     
-    if os.path.exists(EXPENSES_FILE):
+    if os.path.exists(EXPENSES_FILE) and incremental:
+        entry = incremental_backup.backup(EXPENSES_FILE, BACKUP_DIR, compress)
+        if entry is None:
+            print("No new expenses since the last backup.")
+        else:
+            backup_file_path = os.path.join(BACKUP_DIR, entry['file'])
+            print(f"Backup successful: {backup_file_path} (snapshot {entry['id']}, {entry['end'] - entry['start']} bytes)")
+    elif os.path.exists(EXPENSES_FILE):
         backup_file_path = os.path.join(BACKUP_DIR, f"expenses_backup_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv")
         shutil.copy(EXPENSES_FILE, backup_file_path)
         print(f"Backup successful: {backup_file_path}")
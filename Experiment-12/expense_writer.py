@@ -0,0 +1,189 @@
+"""
+Batched, lock-protected writer for expenses.csv.
+
+Rows are formatted with the csv module (no pandas), joined into one buffer
+and written with a single write + fsync while an exclusive lock on
+expenses.csv.lock is held, so several processes can log at once without
+interleaving rows. BatchedExpenseWriter adds a queue in front of this: a
+background thread drains everything waiting in the queue and commits it as
+one group.
+"""
+import argparse
+import csv
+import io
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.locking import file_lock
+
+FIELDS = ['Name', 'Date', 'Description', 'Amount', 'Category']
+
+
+def normalize(expenses):
+    """Checks (name, date, description, amount, category) rows and converts the amounts to float."""
+    return [(name, date, description, float(amount), category)
+            for name, date, description, amount, category in expenses]
+
+
+def encode_rows(rows, header=False):
+    """Formats rows as CSV text in one buffer and returns the UTF-8 bytes."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if header:
+        writer.writerow(FIELDS)
+    writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def append_locked(f, rows, fsync=True):
+    """
+    Appends rows to an open binary file whose lock is already held, adding the
+    header to an empty file and a newline to an unterminated last line.
+    Returns the file offset after the write.
+    """
+    end = f.seek(0, os.SEEK_END)
+    prefix = b''
+    if end:
+        f.seek(end - 1)
+        if f.read(1) != b'\n':
+            prefix = b'\n'
+    f.write(prefix + encode_rows(rows, header=end == 0))
+    f.flush()
+    if fsync:
+        os.fsync(f.fileno())
+    return f.tell()
+
+
+def create_expenses_file(expenses_file):
+    """Creates expenses_file with just the header row, unless it already exists."""
+    with file_lock(expenses_file):
+        with open(expenses_file, 'a+b') as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                f.write(encode_rows([], header=True))
+
+
+def write_batch(expenses_file, expenses, fsync=True):
+    """Group-commits a batch of expenses with one write and one fsync. Returns the row count."""
+    rows = normalize(expenses)
+    if not rows:
+        return 0
+    with file_lock(expenses_file):
+        with open(expenses_file, 'a+b') as f:
+            append_locked(f, rows, fsync)
+    return len(rows)
+
+
+_STOP = object()
+# Seconds a blocked submit() waits between checks that the writer is still working
+PUT_TIMEOUT = 0.5
+
+
+class BatchedExpenseWriter:
+    """
+    Queue-fed writer. submit() only enqueues; a background thread commits
+    whatever has queued up since its last write as one batch, so the commit
+    rate adapts to the load. The queue is bounded to push back on producers.
+
+    If a write fails, the thread keeps draining the queue without writing,
+    counting the dropped rows in failed, so producers never block on a full
+    queue; submit() and close() raise the error.
+    """
+
+    def __init__(self, expenses_file, max_batch=10000, fsync=True):
+        self.expenses_file = expenses_file
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.written = 0
+        self.failed = 0
+        self.error = None
+        self.queue = queue.Queue(maxsize=max_batch * 4)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, name, date, description, amount, category):
+        item = (name, date, description, float(amount), category)
+        while True:
+            if self.error is not None:
+                raise self.error
+            if not self.thread.is_alive():
+                raise RuntimeError("the expense writer thread has stopped")
+            try:
+                self.queue.put(item, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+    def submit_many(self, expenses):
+        for expense in expenses:
+            self.submit(*expense)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            # Drain whatever else is already waiting, up to one batch
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if self.error is not None:
+                # An earlier batch failed; the rest are dropped, not written out of order
+                self.failed += len(batch)
+                continue
+            try:
+                self.written += write_batch(self.expenses_file, batch, self.fsync)
+            except Exception as e:
+                self.failed += len(batch)
+                self.error = e
+
+    def close(self):
+        """Commits everything still queued and stops the writer thread; raises the error of a failed write."""
+        if self.thread.is_alive():
+            # The thread keeps draining even after a failure, so this put cannot block for good
+            self.queue.put(_STOP)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def benchmark(n_rows, batch_size, fsync=True):
+    """Times write_batch on a scratch file and returns expenses written per second."""
+    expenses = [("Member_%d" % (i % 4), "2025-10-%02d 12:00:00" % (i % 28 + 1),
+                 "Item %d" % i, i % 500 + 0.5, "Category_%d" % (i % 12)) for i in range(n_rows)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'expenses.csv')
+        start = time.perf_counter()
+        for i in range(0, n_rows, batch_size):
+            write_batch(path, expenses[i:i + batch_size], fsync)
+        elapsed = time.perf_counter() - start
+    return n_rows / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the batched expense writer.")
+    parser.add_argument('-n', '--rows', type=int, default=500_000)
+    parser.add_argument('-b', '--batch', type=int, default=10_000)
+    parser.add_argument('--no-fsync', action='store_true')
+    args = parser.parse_args()
+
+    rate = benchmark(args.rows, args.batch, fsync=not args.no_fsync)
+    print(f"Wrote {args.rows} expenses in batches of {args.batch}: {rate:,.0f} expenses/sec")
@@ -0,0 +1,204 @@
+"""
+Incremental, deduplicating backups for the append-only expenses.csv.
+
+Each backup stores only the bytes appended since the previous one as a
+segment file, optionally gzip-compressed, and records it in a JSON manifest
+with its byte range, a SHA-256 of the segment and a chained hash of the
+whole snapshot. Any snapshot is restored by concatenating the segments from
+its base up to it. If the ledger was rewritten rather than appended to, the
+next backup starts a new base segment with the full file.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from expense_writer import file_lock
+
+MANIFEST_VERSION = 1
+READ_BLOCK = 1 << 20
+# Bytes before the end of the last backup that must still match for a delta
+CHECK_BYTES = 4096
+
+
+def manifest_path(backup_dir, source):
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(backup_dir, f"{name}_manifest.json")
+
+
+def load_manifest(backup_dir, source):
+    try:
+        with open(manifest_path(backup_dir, source), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'version': MANIFEST_VERSION, 'source': os.path.basename(source), 'segments': []}
+
+
+def save_manifest(backup_dir, source, manifest):
+    path = manifest_path(backup_dir, source)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _hash_range(f, start, end):
+    digest = hashlib.sha256()
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        block = f.read(min(READ_BLOCK, remaining))
+        if not block:
+            break
+        digest.update(block)
+        remaining -= len(block)
+    return digest.hexdigest()
+
+
+def _copy_range(f, start, end, out):
+    """Copies bytes start..end of f to out and returns their SHA-256."""
+    digest = hashlib.sha256()
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        block = f.read(min(READ_BLOCK, remaining))
+        if not block:
+            break
+        digest.update(block)
+        out.write(block)
+        remaining -= len(block)
+    return digest.hexdigest()
+
+
+def backup(source, backup_dir, compress=False):
+    """
+    Stores the bytes of source appended since the last backup. Returns the new
+    manifest entry, or None when nothing was appended.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    manifest = load_manifest(backup_dir, source)
+    segments = manifest['segments']
+    last = segments[-1] if segments else None
+
+    # Hold the writers' lock so the segment never ends in the middle of a batch
+    with file_lock(source):
+        with open(source, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            start = last['end'] if last else 0
+            # The ledger must not have been rewritten for a delta to be valid
+            if last and (size < last['end'] or
+                         _hash_range(f, max(0, last['end'] - CHECK_BYTES), last['end']) != last['tail_sha256']):
+                start = 0
+            # No new bytes (or an empty source): no segment, no manifest entry
+            if start == size:
+                return None
+
+            segment_id = len(segments) + 1
+            name = os.path.splitext(os.path.basename(source))[0]
+            segment_file = f"{name}_segment_{segment_id:06d}.csv" + ('.gz' if compress else '')
+            opener = gzip.open if compress else open
+            with opener(os.path.join(backup_dir, segment_file), 'wb') as out:
+                segment_sha = _copy_range(f, start, size, out)
+            tail_sha = _hash_range(f, max(0, size - CHECK_BYTES), size)
+
+    previous_chain = last['chain'] if last and start else ''
+    entry = {
+        'id': segment_id,
+        'file': segment_file,
+        'start': start,
+        'end': size,
+        'base': start == 0,
+        'compressed': compress,
+        'sha256': segment_sha,
+        'tail_sha256': tail_sha,
+        'chain': hashlib.sha256((previous_chain + segment_sha).encode()).hexdigest(),
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    segments.append(entry)
+    save_manifest(backup_dir, source, manifest)
+    return entry
+
+
+def snapshot_segments(manifest, snapshot_id):
+    """Returns the segments that make up a snapshot, from its base segment up to it."""
+    segments = manifest['segments']
+    if not 1 <= snapshot_id <= len(segments):
+        raise ValueError(f"No snapshot {snapshot_id}, the manifest has {len(segments)}.")
+    first = snapshot_id - 1
+    while not segments[first]['base']:
+        first -= 1
+    return segments[first:snapshot_id]
+
+
+def find_snapshot(manifest, at):
+    """Returns the id of the last snapshot taken at or before the 'YYYY-MM-DD HH:MM:SS' time at."""
+    matching = [entry['id'] for entry in manifest['segments'] if entry['created'] <= at]
+    if not matching:
+        raise ValueError(f"No snapshot was taken at or before {at}.")
+    return matching[-1]
+
+
+def restore(source, backup_dir, destination, snapshot_id=None):
+    """
+    Rebuilds a snapshot (the latest by default) into destination, checking
+    every segment's checksum and the chained hash on the way.
+    """
+    manifest = load_manifest(backup_dir, source)
+    snapshot_id = snapshot_id or len(manifest['segments'])
+    segments = snapshot_segments(manifest, snapshot_id)
+    tmp_path = destination + '.tmp'
+    chain = ''
+    try:
+        with open(tmp_path, 'wb') as out:
+            for entry in segments:
+                opener = gzip.open if entry['compressed'] else open
+                digest = hashlib.sha256()
+                with opener(os.path.join(backup_dir, entry['file']), 'rb') as segment:
+                    for block in iter(lambda: segment.read(READ_BLOCK), b''):
+                        digest.update(block)
+                        out.write(block)
+                if digest.hexdigest() != entry['sha256']:
+                    raise ValueError(f"Segment {entry['file']} is corrupt.")
+                chain = hashlib.sha256((chain + entry['sha256']).encode()).hexdigest()
+                if chain != entry['chain']:
+                    raise ValueError(f"Segment {entry['file']} does not belong to this snapshot chain.")
+        os.replace(tmp_path, destination)
+    finally:
+        # A failed restore leaves no partial file behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return snapshot_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental backups of expenses.csv.")
+    parser.add_argument('--source', default=os.path.join('Experiment-12', 'expenses.csv'))
+    parser.add_argument('--backup-dir', default=os.path.join('Experiment-12', 'backup'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    backup_cmd = commands.add_parser('backup', help="store the bytes appended since the last backup")
+    backup_cmd.add_argument('--compress', action='store_true', help="gzip the new segment")
+    commands.add_parser('list', help="list the snapshots in the manifest")
+    restore_cmd = commands.add_parser('restore', help="rebuild a snapshot")
+    restore_cmd.add_argument('destination')
+    restore_cmd.add_argument('--id', type=int, help="snapshot id (default: latest)")
+    restore_cmd.add_argument('--at', help="latest snapshot at or before 'YYYY-MM-DD HH:MM:SS'")
+    args = parser.parse_args()
+
+    if args.command == 'backup':
+        entry = backup(args.source, args.backup_dir, args.compress)
+        if entry is None:
+            print("No new expenses since the last backup.")
+        else:
+            print(f"Snapshot {entry['id']}: stored bytes {entry['start']}-{entry['end']} in {entry['file']}")
+    elif args.command == 'list':
+        for entry in load_manifest(args.backup_dir, args.source)['segments']:
+            kind = 'base' if entry['base'] else 'delta'
+            print(f"{entry['id']:>4}  {entry['created']}  {kind:<5}  {entry['end']} bytes  {entry['file']}")
+    else:
+        snapshot_id = args.id
+        if args.at:
+            snapshot_id = find_snapshot(load_manifest(args.backup_dir, args.source), args.at)
+        snapshot_id = restore(args.source, args.backup_dir, args.destination, snapshot_id)
+        print(f"Restored snapshot {snapshot_id} to {args.destination}")
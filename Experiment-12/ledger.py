@@ -0,0 +1,235 @@
+"""
+Append-only expense ledger with incrementally maintained aggregates.
+
+expenses.csv stays the source of truth. Next to it the ledger keeps a small
+JSON state file with per-member totals, per-month category totals, daily
+totals, the date range and the byte offset of the CSV it has seen so far.
+Appends and rows added by other writers are folded in by reading only the
+bytes past that offset, so reports never re-read or re-group the whole file.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import zlib
+from datetime import date
+
+from expense_writer import append_locked, file_lock, normalize
+
+STATE_VERSION = 1
+# Bytes before the saved offset that are checksummed to detect a rewritten CSV
+CHECK_BYTES = 4096
+
+
+class ExpenseLedger:
+    """Aggregates over expenses.csv, kept up to date on every append."""
+
+    def __init__(self, expenses_file, state_file=None, use_state=True):
+        self.expenses_file = expenses_file
+        self.state_file = state_file or expenses_file + '.ledger.json'
+        self.use_state = use_state
+        self._reset()
+        self.load()
+
+    def _reset(self):
+        self.header = None
+        self.member_totals = {}
+        self.category_month = {}  # 'YYYY-MM' -> {category: amount}
+        self.daily_totals = {}  # 'YYYY-MM-DD' -> amount
+        self.min_date = None
+        self.max_date = None
+        self.total = 0.0
+        self.count = 0
+        self.skipped = 0
+        self.offset = 0
+        # CRC of the CHECK_BYTES before offset, to tell an append from a rewrite
+        self.checksum = zlib.crc32(b'')
+
+    # --- Persistence ---
+
+    def _tail_checksum(self, offset):
+        start = max(0, offset - CHECK_BYTES)
+        with open(self.expenses_file, 'rb') as f:
+            f.seek(start)
+            return zlib.crc32(f.read(offset - start))
+
+    def load(self):
+        """
+        Restores the saved aggregates and catches up on rows appended since.
+        Only the CHECK_BYTES before the saved offset are compared with the CSV,
+        so an edit of the same length further back goes unnoticed; verify()
+        is the full check.
+        """
+        size = os.path.getsize(self.expenses_file)
+        state = None
+        if self.use_state:
+            try:
+                with open(self.state_file, 'r') as f:
+                    state = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                state = None
+        # The tail of the bytes the state was built from must be unchanged
+        if (state is None or state.get('version') != STATE_VERSION or state['offset'] > size
+                or state['checksum'] != self._tail_checksum(state['offset'])):
+            self.rebuild()
+            return
+        self.__dict__.update(state['aggregates'])
+        self.checksum = state['checksum']
+        self.refresh()
+
+    def save(self):
+        if not self.use_state:
+            return
+        state = {'version': STATE_VERSION, 'offset': self.offset,
+                 'checksum': self._tail_checksum(self.offset), 'aggregates': self.snapshot()}
+        # Every writer saves the state, so each process needs its own tmp file
+        tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_file)
+
+    def snapshot(self):
+        return {
+            'header': self.header, 'member_totals': self.member_totals,
+            'category_month': self.category_month, 'daily_totals': self.daily_totals,
+            'min_date': self.min_date, 'max_date': self.max_date, 'total': self.total,
+            'count': self.count, 'skipped': self.skipped, 'offset': self.offset,
+        }
+
+    # --- Reading the CSV ---
+
+    def _apply(self, name, date_str, amount, category):
+        day = date_str[:10]
+        month = date_str[:7]
+        self.member_totals[name] = self.member_totals.get(name, 0.0) + amount
+        categories = self.category_month.setdefault(month, {})
+        categories[category] = categories.get(category, 0.0) + amount
+        self.daily_totals[day] = self.daily_totals.get(day, 0.0) + amount
+        if self.min_date is None or day < self.min_date:
+            self.min_date = day
+        if self.max_date is None or day > self.max_date:
+            self.max_date = day
+        self.total += amount
+        self.count += 1
+
+    def _apply_row(self, row):
+        index = self._index
+        try:
+            amount = float(row[index['Amount']])
+            self._apply(row[index['Name']], row[index['Date']], amount, row[index['Category']])
+        except (IndexError, ValueError):
+            self.skipped += 1
+
+    def refresh(self):
+        """Folds in rows appended to the CSV since the last read. Costs O(new bytes)."""
+        if (os.path.getsize(self.expenses_file) < self.offset
+                or self._tail_checksum(self.offset) != self.checksum):
+            # The CSV was replaced (e.g. restored from a backup), start over;
+            # the checksum catches a replacement that is not shorter
+            self.rebuild()
+            return
+        with open(self.expenses_file, 'rb') as f:
+            f.seek(self.offset)
+            consumed = [self.offset]
+
+            def lines():
+                for raw in f:
+                    if not raw.endswith(b'\n'):
+                        # A row that is still being written, it is read next time
+                        break
+                    consumed[0] += len(raw)
+                    yield raw.decode('utf-8')
+
+            reader = csv.reader(lines())
+            if self.header is None:
+                self.header = next(reader, None)
+                if self.header is None:
+                    return
+            self._index = {column: i for i, column in enumerate(self.header)}
+            for row in reader:
+                if row:
+                    self._apply_row(row)
+        if consumed[0] != self.offset:
+            self.offset = consumed[0]
+            self.checksum = self._tail_checksum(self.offset)
+
+    def rebuild(self):
+        """Recomputes every aggregate from the CSV and saves the state."""
+        self._reset()
+        self.refresh()
+        self.save()
+
+    def verify(self, rel_tol=1e-9):
+        """
+        Rebuilds the aggregates from the CSV in a scratch ledger and returns the
+        names of any aggregates that differ from the incrementally kept ones.
+        """
+        self.refresh()
+        fresh = ExpenseLedger(self.expenses_file, use_state=False)
+        mismatched = []
+        for key, value in fresh.snapshot().items():
+            if not _same(value, getattr(self, key), rel_tol):
+                mismatched.append(key)
+        return mismatched
+
+    # --- Appending ---
+
+    def extend(self, expenses):
+        """Appends (name, date, description, amount, category) rows and updates the aggregates."""
+        # Convert every amount first so a bad row cannot leave a half-written batch
+        rows = normalize(expenses)
+        with file_lock(self.expenses_file):
+            with open(self.expenses_file, 'a+b') as f:
+                append_locked(f, rows)
+            # Reading the new bytes back also folds in rows other writers
+            # committed before us, so the offset never skips anything
+            self.refresh()
+            self.save()
+
+    def append(self, name, date_str, description, amount, category):
+        self.extend([(name, date_str, description, amount, category)])
+
+    # --- Queries ---
+
+    def latest_month(self):
+        return self.max_date[:7] if self.max_date else None
+
+    def average_daily_expense(self):
+        """Household spend divided by the number of days from the first to the last expense."""
+        if not self.count:
+            return 0.0
+        days = (date.fromisoformat(self.max_date) - date.fromisoformat(self.min_date)).days + 1
+        return self.total / days
+
+    def category_totals(self, month=None):
+        month = month or self.latest_month()
+        return dict(self.category_month.get(month, {}))
+
+    def monthly_totals(self):
+        return {month: sum(categories.values()) for month, categories in sorted(self.category_month.items())}
+
+
+def _same(a, b, rel_tol):
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=rel_tol, abs_tol=1e-6)
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k], rel_tol) for k in a)
+    return a == b
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild or verify the expense ledger aggregates.")
+    parser.add_argument('file', nargs='?', default=os.path.join('Experiment-12', 'expenses.csv'))
+    parser.add_argument('--rebuild', action='store_true', help="recompute the aggregates from the CSV")
+    args = parser.parse_args()
+
+    ledger = ExpenseLedger(args.file)
+    if args.rebuild:
+        ledger.rebuild()
+        print(f"Rebuilt aggregates from {ledger.count} expenses ({ledger.skipped} rows skipped).")
+    mismatched = ledger.verify()
+    if mismatched:
+        print(f"Aggregates out of date: {', '.join(mismatched)}. Run with --rebuild.")
+    else:
+        print(f"Aggregates verified against {args.file}.")
@@ -0,0 +1,41 @@
+"""Several processes appending through ExpenseLedger to the same expenses.csv at once."""
+import csv
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from expense_writer import create_expenses_file
+from ledger import ExpenseLedger
+
+PROCESSES = 4
+APPENDS = 100
+
+
+def append_many(expenses_file, member):
+    ledger = ExpenseLedger(expenses_file)
+    for i in range(APPENDS):
+        ledger.append(member, f"2025-01-{i % 28 + 1:02d}", "Groceries", 1.0, 'Food')
+
+
+def test_concurrent_appends(tmp_path):
+    expenses_file = str(tmp_path / 'expenses.csv')
+    create_expenses_file(expenses_file)
+    workers = [multiprocessing.Process(target=append_many, args=(expenses_file, f"Member {n}"))
+               for n in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # Every append returned, none raised after its row was written
+    assert [worker.exitcode for worker in workers] == [0] * PROCESSES
+
+    with open(expenses_file, newline='') as f:
+        rows = list(csv.reader(f))[1:]
+    assert len(rows) == PROCESSES * APPENDS
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+    ledger = ExpenseLedger(expenses_file)
+    assert ledger.count == PROCESSES * APPENDS
+    assert ledger.member_totals == {f"Member {n}": float(APPENDS) for n in range(PROCESSES)}
+    assert ledger.verify() == []
@@ -0,0 +1,137 @@
+"""
+Stress test for reservation_engine.py.
+
+Client threads book random batches (1-3 trains, 1-6 tickets each) against a
+set of synthetic trains. With --hot most bookings go to a few trains, which
+then sell out under heavy contention. After each run it checks that:
+
+* no train has fewer than zero seats, and the seats taken from every train
+  equal the tickets the clients were told were confirmed (nothing lost,
+  nothing overbooked) and its revenue equals those tickets times the fare;
+* reopening the engine from its write-ahead log restores the same seats and
+  revenue, also after a torn record is appended (a crash mid-write) and
+  after compact();
+* report snapshots, written every --report-interval seconds while booking,
+  are ready right after the last booking.
+
+It prints batches processed and confirmed per second for each durability mode.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from reservation_engine import DURABILITY, FARE, BookingError, ReservationEngine
+from reservation_reports import ReportWriter
+
+
+def make_trains(n_trains, rng):
+    return {f"T{i:05d}": {"Train Name": f"Train {i}", "Source Station": "A", "Destination Station": "B",
+                          "Total Seats": rng.randint(50, 1200)}
+            for i in range(n_trains)}
+
+
+def client(engine, ids, hot, n_batches, seed, confirmed, counts):
+    """Books n_batches random batches; records the tickets confirmed per train."""
+    rng = random.Random(seed)
+    tickets = {}
+    ok = refused = 0
+    for _ in range(n_batches):
+        # With hot, 90% of the trains picked come from the first few
+        batch = [(rng.choice(hot) if hot and rng.random() < 0.9 else rng.choice(ids), rng.randint(1, 6))
+                 for _ in range(rng.randint(1, 3))]
+        try:
+            engine.book_batch(batch, f"client-{seed}")
+        except BookingError:
+            refused += 1
+            continue
+        ok += 1
+        for train_id, n in batch:
+            tickets[train_id] = tickets.get(train_id, 0) + n
+    with counts['lock']:
+        for train_id, n in tickets.items():
+            confirmed[train_id] = confirmed.get(train_id, 0) + n
+        counts['ok'] += ok
+        counts['refused'] += refused
+
+
+def check(engine, trains, confirmed, fare):
+    """Raises AssertionError unless every train's seats and revenue match the confirmed tickets."""
+    seats = engine.availability()
+    revenue = engine.revenue_by_train()
+    for train_id, details in trains.items():
+        booked = confirmed.get(train_id, 0)
+        assert seats[train_id] >= 0, f"{train_id} overbooked: {seats[train_id]} seats"
+        assert details["Total Seats"] - seats[train_id] == booked, \
+            f"{train_id}: {details['Total Seats'] - seats[train_id]} seats taken, {booked} confirmed"
+        assert revenue.get(train_id, 0) == booked * fare, f"{train_id}: revenue does not match"
+    return seats, revenue
+
+
+def run(n_trains, n_threads, n_batches, durability, hot_trains, directory, report_interval=0, seed=0):
+    rng = random.Random(seed)
+    trains = make_trains(n_trains, rng)
+    ids = list(trains)
+    hot = ids[:hot_trains]
+    wal_file = os.path.join(directory, f"{durability}.wal")
+    confirmed = {}
+    counts = {'lock': threading.Lock(), 'ok': 0, 'refused': 0}
+
+    engine = ReservationEngine(trains, wal_file, FARE, durability)
+    reports = ReportWriter(engine, os.path.join(directory, 'report1.csv'), os.path.join(directory, 'report2.csv'))
+    if report_interval > 0:
+        reports.start(report_interval)
+    threads = [threading.Thread(target=client, args=(engine, ids, hot, n_batches, seed + t, confirmed, counts))
+               for t in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.wal.sync()
+    elapsed = time.perf_counter() - start
+    # The final reports come straight from the live counters
+    start = time.perf_counter()
+    reports.stop()
+    report_time = time.perf_counter() - start
+    state = check(engine, trains, confirmed, FARE)
+    engine.close()
+
+    # Restart from the log, then again after a torn write and a compaction
+    with ReservationEngine(trains, wal_file, FARE, durability) as engine:
+        assert check(engine, trains, confirmed, FARE) == state, "replay differs"
+    with open(wal_file, 'ab') as f:
+        f.write(b"B\tcrashed\tT00000:3:885")
+    with ReservationEngine(trains, wal_file, FARE, durability) as engine:
+        assert check(engine, trains, confirmed, FARE) == state, "torn record was replayed"
+        log_size = os.path.getsize(wal_file)
+        engine.compact()
+    with ReservationEngine(trains, wal_file, FARE, durability) as engine:
+        assert check(engine, trains, confirmed, FARE) == state, "compacted log differs"
+        compacted_size = os.path.getsize(wal_file)
+
+    sold_out = sum(1 for seats in state[0].values() if seats < 6)
+    print(f"{durability:>8}: {counts['ok']} batches confirmed, {counts['refused']} refused, "
+          f"{(counts['ok'] + counts['refused']) / elapsed:,.0f} batches/s "
+          f"({counts['ok'] / elapsed:,.0f} confirmed/s), {sold_out} trains (nearly) sold out; "
+          f"log {log_size / 1e6:.1f} MB -> {compacted_size / 1e3:.1f} kB compacted; "
+          f"{reports.snapshots} report snapshots, the last ready {report_time * 1000:.0f} ms after booking. "
+          f"Checks passed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stress-test the reservation engine with concurrent clients.")
+    parser.add_argument('--trains', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--batches', type=int, default=10000, help="booking batches per thread")
+    parser.add_argument('--hot', type=int, default=10, help="trains that get 90%% of the bookings (0: uniform)")
+    parser.add_argument('--durability', choices=DURABILITY, nargs='+', default=list(DURABILITY))
+    parser.add_argument('--report-interval', type=float, default=0.5,
+                        help="seconds between report snapshots while booking (0: only at the end)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for durability in args.durability:
+            run(args.trains, args.threads, args.batches, durability, args.hot, directory, args.report_interval)
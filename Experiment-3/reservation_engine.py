@@ -0,0 +1,361 @@
+"""
+Concurrent, durable seat reservations for the Experiment-3 railway system.
+
+The notebook keeps train.csv in a dict of dicts and books passenger.csv one
+row at a time, decrementing 'Total Seats' in place; nothing guards against
+two bookings racing for the last seats and everything is lost on restart.
+ReservationEngine replaces that state with:
+
+* compact per-train counters (seats left and revenue in two arrays indexed
+  by train position) and one lock per train. A booking batch takes the locks
+  of the trains it touches in a fixed order, checks every train has enough
+  seats, and then takes all of them or none, so batches are atomic and
+  seats can never go below zero;
+* a write-ahead log. Every accepted batch is one checksummed line in the
+  log, queued while its trains are still locked (so the log order matches
+  the order seats were taken in) and written before the booking returns.
+  Concurrent bookings share writes and fsyncs (group commit). On start the
+  log is replayed; a torn last line from a crash is dropped.
+
+The log starts with a snapshot line (seats and revenue of every train), and
+compact() rewrites it as a single snapshot, so it does not grow forever.
+
+Run this file to book passenger.csv against train.csv like the notebook;
+reservation_reports.py writes the report CSVs from the live counters.
+bench_reservations.py stress-tests it with concurrent clients.
+"""
+import argparse
+import csv
+import os
+import threading
+import zlib
+from array import array
+from contextlib import contextmanager
+
+from reservation_reports import ReportWriter
+
+FARE = 295
+DURABILITY = ('buffered', 'flush', 'fsync')
+# Records queued before a 'buffered' log writes them out
+BUFFERED_RECORDS = 4096
+
+
+class BookingError(Exception):
+    """A booking that was refused; no seats were taken."""
+
+
+def load_trains(train_file):
+    """Train ID -> details and 'Total Seats', as the notebook reads train.csv. Invalid rows are skipped."""
+    data = {}
+    with open(train_file, 'r', newline='') as train:
+        for row in csv.DictReader(train):
+            try:
+                data[row["Train ID"]] = {
+                    "Train Name": row["Train Name"],
+                    "Source Station": row["Source Station"],
+                    "Destination Station": row["Destination Station"],
+                    "Total Seats": int(row["Total Seats"]),
+                }
+            except (KeyError, ValueError) as e:
+                print(f"Skipping train record due to invalid data: {row} ({e})")
+    return data
+
+
+def _record(kind, ref, items):
+    payload = f"{kind}\t{ref}\t{','.join(items)}"
+    return f"{payload}\t{zlib.crc32(payload.encode()):08x}\n".encode()
+
+
+def _parse_record(line):
+    """(kind, ref, items) of a log line, or None if it is torn or corrupt."""
+    if not line.endswith(b'\n'):
+        return None
+    try:
+        payload, crc = line[:-1].decode().rsplit('\t', 1)
+        if int(crc, 16) != zlib.crc32(payload.encode()):
+            return None
+        kind, ref, items = payload.split('\t')
+    except ValueError:
+        return None
+    return kind, ref, [item.split(':') for item in items.split(',') if item]
+
+
+class WriteAheadLog:
+    """
+    Append-only log of booking records with group commit: append() queues a
+    record and returns its sequence number, sync(seq) returns once that
+    record is written (and fsynced, for 'fsync'), writing everything queued
+    so far in one go.
+    """
+
+    def __init__(self, path, durability='flush'):
+        if durability not in DURABILITY:
+            raise ValueError(f"durability must be one of {DURABILITY}")
+        self.path = path
+        self.durability = durability
+        self.file = open(path, 'ab')
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.pending = []
+        self.appended = 0
+        self.synced = 0
+
+    def append(self, record):
+        with self.lock:
+            self.pending.append(record)
+            self.appended += 1
+            return self.appended
+
+    def sync(self, seq=None):
+        """Writes out the records queued up to seq (default: all of them)."""
+        if seq is None:
+            seq = self.appended
+        if self.synced >= seq:
+            return
+        with self.sync_lock:
+            # Another thread may have written this record while we waited
+            if self.synced >= seq:
+                return
+            with self.lock:
+                records, self.pending = self.pending, []
+                last = self.appended
+            self.file.write(b''.join(records))
+            self.file.flush()
+            if self.durability == 'fsync':
+                os.fsync(self.file.fileno())
+            self.synced = last
+
+    def commit(self, seq):
+        """Makes the record seq as durable as the log's durability asks for."""
+        if self.durability != 'buffered':
+            self.sync(seq)
+        elif seq - self.synced >= BUFFERED_RECORDS:
+            self.sync(seq)
+
+    def replace(self, records):
+        """Atomically replaces the log with records (a compaction). Callers stop appends first."""
+        self.sync()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(records))
+            f.flush()
+            os.fsync(f.fileno())
+        self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'ab')
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+
+def read_log(path):
+    """
+    Yields (kind, ref, items) for each record of the log at path and truncates
+    a torn or corrupt tail (a crash mid-write) so appends resume after the
+    last good record.
+    """
+    if not os.path.exists(path):
+        return
+    good = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            record = _parse_record(line)
+            if record is None:
+                break
+            good += len(line)
+            yield record
+    if good != os.path.getsize(path):
+        with open(path, 'r+b') as f:
+            f.truncate(good)
+
+
+class ReservationEngine:
+    """Seat counters for a set of trains, safe for concurrent bookings and persisted in a write-ahead log."""
+
+    def __init__(self, trains, wal_file, fare=FARE, durability='flush'):
+        self.trains = trains
+        self.fare = fare
+        self.ids = list(trains)
+        self.index = {train_id: i for i, train_id in enumerate(self.ids)}
+        self.seats = array('q', (trains[train_id]["Total Seats"] for train_id in self.ids))
+        self.revenue = array('q', bytes(8 * len(self.ids)))
+        self.locks = [threading.Lock() for _ in self.ids]
+        # Bookings replayed from the log
+        self.restored = 0
+        fresh = not os.path.exists(wal_file) or os.path.getsize(wal_file) == 0
+        if not fresh:
+            self._replay(wal_file)
+        self.wal = WriteAheadLog(wal_file, durability)
+        if fresh:
+            # The starting seats go into the log, so it alone restores the state
+            self.wal.append(self._snapshot())
+            self.wal.sync()
+
+    # --- Persistence ---
+
+    def _snapshot(self):
+        return _record('S', '', [f"{train_id}:{self.seats[i]}:{self.revenue[i]}"
+                                 for i, train_id in enumerate(self.ids)])
+
+    def _replay(self, wal_file):
+        for kind, ref, items in read_log(wal_file):
+            for item in items:
+                i = self.index.get(item[0])
+                if i is None:
+                    # A train no longer in train.csv
+                    continue
+                if kind == 'S':
+                    self.seats[i] = int(item[1])
+                    self.revenue[i] = int(item[2])
+                else:
+                    self.seats[i] -= int(item[1])
+                    self.revenue[i] += int(item[2])
+                    if self.seats[i] < 0:
+                        raise ValueError(f"{wal_file} overbooks train {item[0]}")
+            if kind == 'B':
+                self.restored += 1
+
+    @contextmanager
+    def _all_trains_locked(self):
+        """Holds every train lock, so no booking is half applied meanwhile."""
+        for lock in self.locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in self.locks:
+                lock.release()
+
+    def compact(self):
+        """Rewrites the log as one snapshot of the current seats and revenue."""
+        with self._all_trains_locked():
+            self.wal.replace([self._snapshot()])
+
+    def counters(self):
+        """
+        A consistent copy of (version, seats, revenue): the arrays as of one
+        moment between bookings. version is the number of records logged so
+        far, so an unchanged version means nothing was booked since.
+        """
+        with self._all_trains_locked():
+            return self.wal.appended, array('q', self.seats), array('q', self.revenue)
+
+    def close(self):
+        self.wal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Booking ---
+
+    def book_batch(self, requests, ref=''):
+        """
+        Books every (train_id, tickets) of requests or none of them; returns
+        the fare charged. Raises BookingError, taking no seats, if a train ID
+        is unknown, a ticket count is not positive or a train is short of seats.
+        """
+        wanted = {}
+        for train_id, tickets in requests:
+            i = self.index.get(train_id)
+            if i is None:
+                raise BookingError(f"Invalid Train ID {train_id}")
+            if tickets <= 0:
+                raise BookingError(f"Invalid ticket count {tickets}")
+            wanted[i] = wanted.get(i, 0) + tickets
+        if not wanted:
+            raise BookingError("Empty booking")
+        # Locks are always taken in train order, so two batches cannot deadlock
+        order = sorted(wanted)
+        seats = self.seats
+        for i in order:
+            self.locks[i].acquire()
+        try:
+            for i in order:
+                if seats[i] < wanted[i]:
+                    raise BookingError(f"Not enough seats on {self.ids[i]}")
+            amounts = {i: wanted[i] * self.fare for i in order}
+            seq = self.wal.append(_record('B', _clean_ref(ref), [
+                f"{self.ids[i]}:{wanted[i]}:{amounts[i]}" for i in order]))
+            for i in order:
+                seats[i] -= wanted[i]
+                self.revenue[i] += amounts[i]
+        finally:
+            for i in order:
+                self.locks[i].release()
+        # Written (and fsynced) outside the train locks, together with
+        # whatever other threads queued meanwhile
+        self.wal.commit(seq)
+        return sum(amounts.values())
+
+    def book(self, train_id, tickets, ref=''):
+        return self.book_batch([(train_id, tickets)], ref)
+
+    # --- Reports ---
+
+    def seats_left(self, train_id):
+        return self.seats[self.index[train_id]]
+
+    def availability(self):
+        """Train ID -> seats remaining."""
+        return dict(zip(self.ids, self.seats))
+
+    def revenue_by_train(self):
+        """Train ID -> revenue, for trains with at least one booking."""
+        return {train_id: amount for train_id, amount in zip(self.ids, self.revenue) if amount}
+
+
+def _clean_ref(ref):
+    """Passenger references go into the log as one tab-free field."""
+    return str(ref).replace('\t', ' ').replace('\n', ' ').replace('\r', ' ')
+
+
+def book_passengers(engine, passenger_file):
+    """Books each row of passenger.csv in turn, printing the outcome like the notebook."""
+    with open(passenger_file, 'r', newline='') as passenger:
+        for row in csv.DictReader(passenger):
+            passenger_name = row["Passenger Name"]
+            try:
+                tickets = int(row["Number of Tickets"])
+                engine.book(row["Train ID"], tickets, passenger_name)
+            except (BookingError, ValueError) as e:
+                print(f"Booking failed for {passenger_name}: {e}")
+                continue
+            print(f"Booking confirmed for {passenger_name} on {row['Train ID']} ({tickets} seats)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Book passengers on trains, keeping seat state in a write-ahead log.")
+    parser.add_argument('--trains', default='train.csv')
+    parser.add_argument('--passengers', default='passenger.csv')
+    parser.add_argument('--wal', default='bookings.wal', help="log that keeps the seat state across runs")
+    parser.add_argument('--fare', type=int, default=FARE, help="fare per ticket")
+    parser.add_argument('--durability', choices=DURABILITY, default='flush',
+                        help="flush: bookings survive a crash of this process; fsync: also of the machine")
+    parser.add_argument('--compact', action='store_true', help="rewrite the log as a snapshot afterwards")
+    parser.add_argument('--report-interval', type=float, default=0,
+                        help="also write report1.csv/report2.csv every this many seconds while booking")
+    args = parser.parse_args()
+
+    with ReservationEngine(load_trains(args.trains), args.wal, args.fare, args.durability) as engine:
+        if engine.restored:
+            print(f"Restored {engine.restored} earlier bookings from {args.wal}")
+        reports = ReportWriter(engine)
+        if args.report_interval > 0:
+            reports.start(args.report_interval)
+        book_passengers(engine, args.passengers)
+        # The counters are already up to date, so the reports are written right away
+        reports.stop()
+        print(f"Reports saved as {reports.availability_file} and {reports.revenue_file}")
+
+        print("\n--- Report 1: Seat Availability ---")
+        for train_id, seats in engine.availability().items():
+            print(f"{train_id}: {seats} seats remaining")
+        print("\n--- Report 2: Revenue ---")
+        for train_id, amount in engine.revenue_by_train().items():
+            print(f"{train_id}: ₹{amount}")
+        if args.compact:
+            engine.compact()
@@ -0,0 +1,91 @@
+"""
+Seat-availability and revenue reports for the reservation engine, written
+as snapshots while bookings go on.
+
+The notebook builds report1.csv and report2.csv after all bookings, with a
+csv.writer call per train. ReservationEngine already keeps seats and
+revenue up to date on every booking, so a report is just a copy of its
+counters: ReportWriter takes a consistent copy (engine.counters()) and
+writes both files in one buffered write each. The train columns never
+change, so each row's CSV prefix is formatted once; a snapshot only formats
+the numbers. Files are replaced atomically, so readers never see a half
+written report.
+
+Snapshots are written on demand (write()) or every few seconds by a
+background thread (start()/stop()), and skipped when nothing was booked
+since the last one.
+"""
+import csv
+import io
+import os
+import threading
+
+AVAILABILITY_HEADER = ["Train ID", "Train Name", "Source Station", "Destination Station", "Seats Remaining"]
+REVENUE_HEADER = ["Train ID", "Revenue (₹)"]
+
+
+def _csv_line(fields):
+    """fields as one CSV row, quoted like csv.writer does, without the line terminator."""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='').writerow(fields)
+    return buffer.getvalue()
+
+
+def _replace_file(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class ReportWriter:
+    """Writes report1.csv (seat availability) and report2.csv (revenue) snapshots of an engine."""
+
+    def __init__(self, engine, availability_file='report1.csv', revenue_file='report2.csv'):
+        self.engine = engine
+        self.availability_file = availability_file
+        self.revenue_file = revenue_file
+        self.availability_prefixes = [
+            _csv_line([train_id, details["Train Name"], details["Source Station"],
+                       details["Destination Station"]]) + ','
+            for train_id, details in engine.trains.items()]
+        self.revenue_prefixes = [_csv_line([train_id]) + ',' for train_id in engine.ids]
+        self.written_version = None
+        self.snapshots = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        """Writes both reports if anything was booked since the last snapshot. Returns whether it did."""
+        version, seats, revenue = self.engine.counters()
+        if version == self.written_version:
+            return False
+        # csv.writer ends rows with \r\n, so the reports match the notebook's
+        _replace_file(self.availability_file, '\r\n'.join([
+            _csv_line(AVAILABILITY_HEADER),
+            *[prefix + str(n) for prefix, n in zip(self.availability_prefixes, seats)], '']))
+        # Like the notebook's revenue dict, only trains with a booking are listed
+        _replace_file(self.revenue_file, '\r\n'.join([
+            _csv_line(REVENUE_HEADER),
+            *[prefix + str(amount) for prefix, amount in zip(self.revenue_prefixes, revenue) if amount], '']))
+        self.written_version = version
+        self.snapshots += 1
+        return True
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.write()
+
+    def start(self, interval=5.0):
+        """Writes a snapshot every interval seconds in a background thread, until stop()."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the background thread and writes a last snapshot."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.write()
@@ -0,0 +1,72 @@
+"""
+Chunked, out-of-core version of the Experiment-4 monthly sales summary.
+
+The monthly sales CSVs are read in chunks with compact dtypes and each chunk
+is reduced to a per-product partial sum straight away, so peak memory depends
+on the number of distinct products, not on the number of sales rows.
+"""
+import argparse
+import os
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SALES_FILES = [os.path.join(BASE_DIR, name)
+               for name in ('sales_april.csv', 'sales_may.csv', 'sales_june.csv')]
+PRODUCTS_FILE = os.path.join(BASE_DIR, 'product_names.csv')
+
+SALES_COLUMNS = ['Date', 'Store ID', 'Product ID', 'Quantity sold']
+SALES_DTYPES = {'Store ID': 'category', 'Product ID': 'category', 'Quantity sold': 'int32'}
+DATE_FORMAT = '%d/%m/%Y'
+CHUNK_SIZE = 1_000_000
+
+
+def read_sales_chunks(file, chunksize=CHUNK_SIZE):
+    """Yields typed chunks of one sales CSV with the Date column parsed."""
+    for chunk in pd.read_csv(file, usecols=SALES_COLUMNS, dtype=SALES_DTYPES, chunksize=chunksize):
+        chunk['Date'] = pd.to_datetime(chunk['Date'], format=DATE_FORMAT)
+        yield chunk
+
+
+def aggregate_sales(files, chunksize=CHUNK_SIZE):
+    """
+    Returns (totals, months): the total quantity sold per product as a Series
+    and the set of months that actually appear in the data.
+    """
+    totals = pd.Series(dtype='int64')
+    months = set()
+    for file in files:
+        for chunk in read_sales_chunks(file, chunksize):
+            months.update(chunk['Date'].dt.to_period('M').unique())
+            partial = chunk.groupby('Product ID', observed=True)['Quantity sold'].sum()
+            # Categories differ between chunks, so align on plain product IDs
+            partial.index = partial.index.astype(str)
+            totals = totals.add(partial, fill_value=0)
+    return totals.astype('int64'), months
+
+
+def summarize_sales(files=SALES_FILES, products_file=PRODUCTS_FILE, chunksize=CHUNK_SIZE):
+    """Builds the summary table: total and average quantity per month, with product names."""
+    totals, months = aggregate_sales(files, chunksize)
+    n_months = max(len(months), 1)
+
+    df_total_avg = totals.rename_axis('Product ID').reset_index(name='Total Quantity sold')
+    df_total_avg['Average Quantity Sold per Month'] = (df_total_avg['Total Quantity sold'] / n_months).round(2)
+
+    df_products = pd.read_csv(products_file, dtype={'Product ID': str, 'Product Name': str})
+    summary_df = pd.merge(df_total_avg, df_products, on='Product ID', how='left')
+    return summary_df.sort_values('Product ID', ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise monthly sales CSVs in bounded memory.")
+    parser.add_argument('files', nargs='*', default=SALES_FILES, help="monthly sales CSV files")
+    parser.add_argument('-p', '--products', default=PRODUCTS_FILE, help="product names CSV")
+    parser.add_argument('-o', '--output', default='sales_summary.csv', help="summary CSV to write")
+    parser.add_argument('-c', '--chunksize', type=int, default=CHUNK_SIZE, help="rows per chunk")
+    args = parser.parse_args()
+
+    summary_df = summarize_sales(args.files, args.products, args.chunksize)
+    summary_df.to_csv(args.output, index=False)
+    print(summary_df.sort_values('Total Quantity sold', ascending=False)[:5])
+    print(f"Summary of {len(summary_df)} products saved as {args.output}")
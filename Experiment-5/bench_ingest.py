@@ -0,0 +1,102 @@
+"""
+Files/sec of covid_ingest.py against the notebook's serial loop.
+
+Writes --files synthetic per-region, per-day JSON files (about 1% of them
+malformed: truncated, wrong types or missing fields) into a temporary
+folder. The baseline is the notebook's loop (json.load each file into
+data_covid, then sum in Python) over the valid files only, since it stops
+at the first bad one. Each ingest() configuration must reproduce its
+totals and reject exactly the malformed files.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from covid_ingest import ingest, orjson, summary
+
+MALFORMED = [
+    b'{"country": "Nowhere", "date": "2025-08-18", "confirmed_cases": {"total": 1',
+    b'{"country": "Nowhere", "date": "2025-08-18", "confirmed_cases": {"total": "12", "new": 1},'
+    b' "deaths": {"total": 0, "new": 0}, "recovered": {"total": 0, "new": 0}}',
+    b'{"country": "Nowhere", "date": "2025-08-18", "deaths": {"total": 0, "new": 0}}',
+    b'[1, 2, 3]',
+]
+
+
+def make_files(folder, n_files, bad_ratio=0.01, seed=0):
+    """Writes n_files country files; returns the paths of the valid ones."""
+    rng = random.Random(seed)
+    valid = []
+    for i in range(n_files):
+        path = os.path.join(folder, f"region_{i:07d}.json")
+        if rng.random() < bad_ratio:
+            data = rng.choice(MALFORMED)
+        else:
+            confirmed = rng.randint(1000, 900000)
+            deaths = rng.randint(0, confirmed // 50)
+            doc = {
+                "country": f"Region {i % 5000}",
+                "date": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}",
+                "confirmed_cases": {"total": confirmed, "new": rng.randint(0, 500)},
+                "deaths": {"total": deaths, "new": rng.randint(0, 10)},
+                "recovered": {"total": rng.randint(0, confirmed - deaths), "new": rng.randint(0, 400)},
+            }
+            data = json.dumps(doc, indent=4).encode()
+            valid.append(path)
+        with open(path, 'wb') as f:
+            f.write(data)
+    return valid
+
+
+def notebook_loop(paths):
+    data_covid = []
+    for filepath in paths:
+        with open(filepath, 'r') as f:
+            data_covid.append(json.load(f))
+    total_confirmed_cases = total_deaths = total_recovered_cases = 0
+    for i in data_covid:
+        total_confirmed_cases = i['confirmed_cases']['total'] + total_confirmed_cases
+        total_deaths = i['deaths']['total'] + total_deaths
+        total_recovered_cases = i['recovered']['total'] + total_recovered_cases
+    return {"total_confirmed_cases": total_confirmed_cases, "total_deaths": total_deaths,
+            "total_recovered_cases": total_recovered_cases,
+            "total_active": total_confirmed_cases - total_deaths - total_recovered_cases}
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parallel JSON ingestion.")
+    parser.add_argument('--files', type=int, default=50000)
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help="pool sizes to try (default: 1, 2, 4, ... up to the CPU count)")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    workers = args.workers or sorted({1, cpus} | {2 ** i for i in range(1, 8) if 2 ** i < cpus})
+    backends = ['json'] + (['orjson'] if orjson is not None else [])
+
+    with tempfile.TemporaryDirectory() as folder:
+        valid = make_files(folder, args.files)
+        n_bad = args.files - len(valid)
+        print(f"{args.files} files ({n_bad} malformed), {cpus} CPUs")
+        expected, elapsed = timed(notebook_loop, valid)
+        print(f"{'notebook loop (valid files only)':>36}: {len(valid) / elapsed:>9,.0f} files/s")
+        for backend in backends:
+            for mode in ('process', 'thread'):
+                for n in workers:
+                    if n == 1 and mode == 'thread':
+                        continue
+                    result, elapsed = timed(ingest, folder, n, mode, backend)
+                    assert summary(result) == expected, f"{backend}/{mode}/{n}: totals differ"
+                    assert result['rejected'] == n_bad, f"{backend}/{mode}/{n}: rejected {result['rejected']}"
+                    label = f"{backend}, {'in process' if n == 1 else f'{n} {mode}es' if mode == 'process' else f'{n} threads'}"
+                    print(f"{label:>36}: {args.files / elapsed:>9,.0f} files/s")
+        print("Totals and rejected counts match.")
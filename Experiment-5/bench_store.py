@@ -0,0 +1,124 @@
+"""
+Benchmark and self-check for covid_store.py.
+
+Feeds --days days of synthetic snapshots for --countries countries (each
+country skips about 5% of days, and countries join over time so the store
+has to grow) into a fresh store, reopening it halfway. Then:
+
+* times adding one more day, which should not depend on the history;
+* times "top 5 countries by active cases" on random dates;
+* checks the carried-over totals, 7-day averages, global totals, top 5 and
+  per-country latest against a recomputation from the raw snapshots;
+* checks that rows written after the last meta.json (a crash mid-append)
+  are dropped on open.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from covid_ingest import METRICS
+from covid_store import CovidStore
+
+START = date(2020, 1, 1)
+
+
+def make_days(n_days, n_countries, seed=0):
+    """Yields (date, docs) with running totals; country c joins on day c * n_days // (2 * n_countries)."""
+    rng = random.Random(seed)
+    totals = [dict.fromkeys(METRICS, 0) for _ in range(n_countries)]
+    for d in range(n_days):
+        day = START + timedelta(days=d)
+        docs = []
+        for c in range(n_countries):
+            if d < c * n_days // (2 * n_countries) or rng.random() < 0.05:
+                continue
+            doc = {'country': f"Country {c}", 'date': day.isoformat()}
+            for metric in METRICS:
+                new = rng.randint(0, 1000)
+                totals[c][metric] += new
+                doc[metric] = {'total': totals[c][metric], 'new': new}
+            docs.append(doc)
+        yield day, docs
+
+
+def expected_arrays(days, countries):
+    """Recomputes totals (carried over), new and 7-day averages per metric from the raw snapshots."""
+    index = {country: i for i, country in enumerate(countries)}
+    shape = (len(days), len(countries))
+    arrays = {f'{metric}_{field}': np.zeros(shape, np.int64) for metric in METRICS for field in ('total', 'new')}
+    for d, (_, docs) in enumerate(days):
+        for metric in METRICS:
+            if d:
+                arrays[f'{metric}_total'][d] = arrays[f'{metric}_total'][d - 1]
+            for doc in docs:
+                arrays[f'{metric}_total'][d, index[doc['country']]] = doc[metric]['total']
+                arrays[f'{metric}_new'][d, index[doc['country']]] = doc[metric]['new']
+    for metric in METRICS:
+        new = arrays[f'{metric}_new']
+        arrays[f'{metric}_ma7'] = np.array([new[max(0, d - 6):d + 1].mean(axis=0) for d in range(len(days))])
+    return arrays
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark and check the COVID time-series store.")
+    parser.add_argument('--days', type=int, default=3 * 365)
+    parser.add_argument('--countries', type=int, default=250)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    days = list(make_days(args.days + 1, args.countries))
+    with tempfile.TemporaryDirectory() as directory:
+        store = CovidStore(directory)
+        start = time.perf_counter()
+        for n, (day, docs) in enumerate(days[:-1]):
+            if n == len(days) // 2:
+                # The incremental state must survive a restart
+                store = CovidStore(directory)
+            store.add_day(day, docs)
+        elapsed = time.perf_counter() - start
+        print(f"Added {args.days} days x {args.countries} countries in {elapsed:.2f} s "
+              f"({elapsed / args.days * 1000:.2f} ms/day)")
+
+        start = time.perf_counter()
+        store.add_day(*days[-1])
+        print(f"Adding day {len(days)} took {(time.perf_counter() - start) * 1000:.2f} ms")
+
+        rng = random.Random(1)
+        dates = [START + timedelta(days=rng.randrange(len(days))) for _ in range(args.queries)]
+        store = CovidStore(directory)
+        start = time.perf_counter()
+        answers = [store.top_active(day, 5) for day in dates]
+        elapsed = time.perf_counter() - start
+        print(f"Top 5 by active cases on a date: {elapsed / args.queries * 1000:.3f} ms per query")
+
+        expected = expected_arrays(days, store.countries)
+        n = len(store.countries)
+        for name, values in expected.items():
+            assert np.allclose(store.column(name)[:, :n], values), f"{name} differs"
+        active = (expected['confirmed_cases_total'] - expected['deaths_total'] - expected['recovered_total'])
+        for day, answer in zip(dates, answers):
+            row = active[(day - START).days]
+            assert [a for _, a in answer] == sorted(row, reverse=True)[:5], f"top 5 on {day} differs"
+            assert all(row[store.index[country]] == a for country, a in answer)
+        summary = store.global_totals(days[-1][0])
+        assert summary['total_confirmed_cases'] == expected['confirmed_cases_total'][-1].sum()
+        assert summary['total_active'] == active[-1].sum()
+        latest = store.latest()
+        last_seen = {doc['country']: day.isoformat() for day, docs in days for doc in docs}
+        for c, country in enumerate(store.countries):
+            assert latest[country]['date'] == last_seen[country], f"latest date of {country} differs"
+            assert latest[country]['deaths'] == expected['deaths_total'][-1, c]
+
+        # A crash after the columns were appended but before meta.json was replaced
+        path = store._path('deaths_total')
+        with open(path, 'ab') as f:
+            f.write(b'\x01' * 100)
+        store = CovidStore(directory)
+        assert os.path.getsize(path) == store.days * store.capacity * 8, "partial rows kept"
+        assert store.global_totals() == summary
+        print(f"{store.days} days, {len(store.countries)} countries (capacity {store.capacity}): checks passed.")
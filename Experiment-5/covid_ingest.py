@@ -0,0 +1,211 @@
+"""
+Parallel ingestion of the Experiment-5 COVID JSON files.
+
+The notebook json.loads every file in the folder one after the other,
+prints each document and keeps all of them in data_covid before summing the
+totals in a loop. For hundreds of thousands of per-region, per-day files
+this module instead:
+
+* splits the file list into chunks and hands them to a pool: processes by
+  default, so parsing uses every core, or threads (mode='thread'), which is
+  enough when reading the files is the slow part, e.g. on network storage;
+* parses with orjson when it is installed (backend='auto'), else json;
+* checks each document against the expected shape with a few type checks
+  and counts (and samples) the files it rejects instead of crashing;
+* folds every chunk into one small partial result (file counts, the three
+  totals and the top/bottom k documents by confirmed cases) and combines the
+  partials pairwise in a tree, so no document outlives its chunk.
+
+Run this file to write summary_covid.json for a folder;
+bench_ingest.py measures files/sec.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.ranking import top_k
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+METRICS = ('confirmed_cases', 'deaths', 'recovered')
+BACKENDS = ('auto', 'json', 'orjson')
+MODES = ('process', 'thread')
+CHUNK_SIZE = 1000
+READ_SIZE = 1 << 16
+TOP_K = 5
+# Rejected files listed in a result, besides the count
+MAX_ERRORS = 20
+
+
+def get_loads(backend='auto'):
+    """The JSON parser of backend; 'auto' is orjson when installed, else json."""
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}")
+    if backend == 'orjson' or (backend == 'auto' and orjson is not None):
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+        return orjson.loads
+    return json.loads
+
+
+def schema_error(doc):
+    """Why doc is not a valid country file, or None if it is."""
+    if type(doc) is not dict:
+        return "not a JSON object"
+    if type(doc.get('country')) is not str or type(doc.get('date')) is not str:
+        return "country and date must be strings"
+    for metric in METRICS:
+        counts = doc.get(metric)
+        if type(counts) is not dict:
+            return f"{metric} missing"
+        # type() rather than isinstance(), so true/false are not counts
+        if type(counts.get('total')) is not int or counts['total'] < 0:
+            return f"{metric}.total must be a non-negative integer"
+        if type(counts.get('new')) is not int:
+            return f"{metric}.new must be an integer"
+    return None
+
+
+def read_file(path):
+    """
+    The bytes of path, read with plain os calls: for files of a few hundred
+    bytes, the buffered file object of open() costs more than the read.
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        chunks = [os.read(fd, READ_SIZE)]
+        while len(chunks[-1]) == READ_SIZE:
+            chunks.append(os.read(fd, READ_SIZE))
+    finally:
+        os.close(fd)
+    return b''.join(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def confirmed_total(doc):
+    return doc['confirmed_cases']['total']
+
+
+def empty_result():
+    return {'files': 0, 'rejected': 0, 'errors': [],
+            'confirmed_cases': 0, 'deaths': 0, 'recovered': 0,
+            'highest': [], 'lowest': []}
+
+
+def ingest_files(paths, backend='auto', k=TOP_K):
+    """Parses, validates and folds the files at paths into one partial result."""
+    loads = get_loads(backend)
+    result = empty_result()
+    errors = result['errors']
+    confirmed = deaths = recovered = 0
+    valid = []
+    for path in paths:
+        try:
+            doc = loads(read_file(path))
+        except (OSError, ValueError) as e:
+            # JSON errors of both backends (and bad UTF-8) are ValueErrors
+            error = f"{type(e).__name__}: {e}"
+        else:
+            error = schema_error(doc)
+        if error is not None:
+            result['rejected'] += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append((path, error))
+            continue
+        confirmed += doc['confirmed_cases']['total']
+        deaths += doc['deaths']['total']
+        recovered += doc['recovered']['total']
+        valid.append(doc)
+    result['files'] = len(paths)
+    result['confirmed_cases'] = confirmed
+    result['deaths'] = deaths
+    result['recovered'] = recovered
+    result['highest'] = top_k(valid, k, key=confirmed_total)
+    result['lowest'] = top_k(valid, k, key=confirmed_total, largest=False)
+    return result
+
+
+def combine(a, b, k=TOP_K):
+    """One partial result from two; a's files count as coming first."""
+    result = {key: a[key] + b[key] for key in ('files', 'rejected', 'confirmed_cases', 'deaths', 'recovered')}
+    result['errors'] = (a['errors'] + b['errors'])[:MAX_ERRORS]
+    result['highest'] = top_k(a['highest'] + b['highest'], k, key=confirmed_total)
+    result['lowest'] = top_k(a['lowest'] + b['lowest'], k, key=confirmed_total, largest=False)
+    return result
+
+
+def tree_reduce(results, k=TOP_K):
+    """Combines partial results pairwise, level by level, keeping their order."""
+    results = list(results) or [empty_result()]
+    while len(results) > 1:
+        paired = [combine(results[i], results[i + 1], k) for i in range(0, len(results) - 1, 2)]
+        if len(results) % 2:
+            paired.append(results[-1])
+        results = paired
+    return results[0]
+
+
+def list_files(folder):
+    """Paths of the .json files in folder, in name order."""
+    with os.scandir(folder) as entries:
+        return sorted(entry.path for entry in entries if entry.name.endswith('.json') and entry.is_file())
+
+
+def ingest(folder, workers=None, mode='process', backend='auto', chunk_size=CHUNK_SIZE, k=TOP_K):
+    """
+    The totals, top/bottom k documents and rejected-file count of every
+    .json file in folder (or of a list of paths). workers=1 runs in this
+    process without a pool.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    paths = list_files(folder) if isinstance(folder, str) else list(folder)
+    get_loads(backend)
+    workers = workers or os.cpu_count() or 1
+    # Small inputs are split so every worker gets a share
+    chunk_size = max(1, min(chunk_size, -(-len(paths) // workers)))
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    if workers == 1 or len(chunks) <= 1:
+        return tree_reduce([ingest_files(chunk, backend, k) for chunk in chunks], k)
+    pool = ProcessPoolExecutor if mode == 'process' else ThreadPoolExecutor
+    with pool(max_workers=workers) as executor:
+        results = executor.map(ingest_files, chunks, [backend] * len(chunks), [k] * len(chunks))
+        return tree_reduce(results, k)
+
+
+def summary(result):
+    """The notebook's summary_covid dictionary."""
+    return {
+        "total_confirmed_cases": result['confirmed_cases'],
+        "total_deaths": result['deaths'],
+        "total_recovered_cases": result['recovered'],
+        "total_active": result['confirmed_cases'] - result['deaths'] - result['recovered'],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sum the COVID country JSON files of a folder in parallel.")
+    parser.add_argument('folder', nargs='?', default='JSON_Files')
+    parser.add_argument('-o', '--output', default='summary_covid.json')
+    parser.add_argument('-w', '--workers', type=int, default=None, help="pool size (default: one per CPU)")
+    parser.add_argument('--mode', choices=MODES, default='process')
+    parser.add_argument('--backend', choices=BACKENDS, default='auto')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="files per task")
+    args = parser.parse_args()
+
+    result = ingest(args.folder, args.workers, args.mode, args.backend, args.chunk_size)
+    print(f"Read {result['files']} files, rejected {result['rejected']}")
+    for path, error in result['errors']:
+        print(f"  {path}: {error}")
+    print("Highest confirmed cases:", [(doc['country'], confirmed_total(doc)) for doc in result['highest']])
+    print("Lowest confirmed cases:", [(doc['country'], confirmed_total(doc)) for doc in result['lowest']])
+    summary_covid = summary(result)
+    print(summary_covid)
+    with open(args.output, "w") as f:
+        json.dump(summary_covid, f)
+    print(f"Summary saved as {args.output}")
@@ -0,0 +1,344 @@
+"""
+Append-only columnar time-series store for the Experiment-5 COVID snapshots.
+
+Each country file holds the total and new counts of one date. The store
+keeps them as country x date x metric in NumPy arrays, one binary file per
+column in the store folder, with one row per day and one slot per country:
+
+    present                           1 where a country reported that day
+    <metric>_total, <metric>_new      as reported; a country that did not
+                                      report keeps its last total, new is 0
+    <metric>_ma7                      7-day moving average of new
+    global_total                      sum of the three totals over countries
+
+Rollups are kept up to date as days are added, so adding a day costs
+O(countries), never O(history): totals carry over from the previous row,
+the 7-day averages come from a running sum of the last seven rows of new,
+and the global totals are one sum per metric. Days must be added in date
+order; a gap is filled with carried-over rows.
+
+Reads memory-map the columns, so a query touches only the rows it needs:
+"top 5 countries by active cases on date D" reads three rows.
+
+meta.json (countries, the last day each reported, first date, days stored,
+row width) is replaced after the columns are written; rows past its day
+count, left by a crash, are cut off when the store is opened.
+"""
+import argparse
+import json
+import os
+from collections import deque
+from datetime import date
+
+import numpy as np
+
+from covid_ingest import METRICS, get_loads, list_files, read_file, schema_error
+
+WINDOW = 7
+# Country slots of a new store; doubled whenever a new country needs more
+INITIAL_CAPACITY = 64
+META_VERSION = 1
+
+
+def _columns():
+    columns = {'present': np.uint8}
+    for metric in METRICS:
+        columns[f'{metric}_total'] = np.int64
+        columns[f'{metric}_new'] = np.int64
+        columns[f'{metric}_ma7'] = np.float64
+    return columns
+
+
+COLUMNS = _columns()
+
+
+class CovidStore:
+    """Country x date x metric arrays in a folder, with rollups updated per added day."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.meta_file = os.path.join(directory, 'meta.json')
+        try:
+            with open(self.meta_file, 'r') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = {'version': META_VERSION, 'start': None, 'days': 0,
+                    'capacity': INITIAL_CAPACITY, 'countries': [], 'last_seen': []}
+        if meta.get('version') != META_VERSION:
+            raise ValueError(f"{self.meta_file} has an unsupported version")
+        self.start = date.fromisoformat(meta['start']) if meta['start'] else None
+        self.days = meta['days']
+        self.capacity = meta['capacity']
+        self.countries = meta['countries']
+        self.index = {country: i for i, country in enumerate(self.countries)}
+        # Per country, the last day it reported
+        self.last_seen = meta['last_seen']
+        self._maps = {}
+        self._discard_partial_rows()
+        self._load_state()
+
+    # --- Files ---
+
+    def _path(self, name, capacity=None):
+        # The row width is part of the name, so growing never overwrites the columns in use
+        return os.path.join(self.directory, f"{name}.{capacity or self.capacity}.bin")
+
+    def _width(self, name):
+        return len(METRICS) if name == 'global_total' else self.capacity
+
+    def _row_bytes(self, name):
+        dtype = np.int64 if name == 'global_total' else COLUMNS[name]
+        return np.dtype(dtype).itemsize * self._width(name)
+
+    def _names(self):
+        return [*COLUMNS, 'global_total']
+
+    def _discard_partial_rows(self):
+        for name in self._names():
+            path = self._path(name)
+            size = self.days * self._row_bytes(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+
+    def column(self, name):
+        """The days x slots array of a column (days x metrics for 'global_total'), memory-mapped read-only."""
+        if name not in self._maps:
+            dtype = np.int64 if name == 'global_total' else COLUMNS[name]
+            if self.days == 0:
+                self._maps[name] = np.zeros((0, self._width(name)), dtype)
+            else:
+                self._maps[name] = np.memmap(self._path(name), dtype, 'r', shape=(self.days, self._width(name)))
+        return self._maps[name]
+
+    def _save_meta(self):
+        meta = {'version': META_VERSION, 'start': self.start.isoformat() if self.start else None,
+                'days': self.days, 'capacity': self.capacity, 'countries': self.countries,
+                'last_seen': self.last_seen}
+        tmp_path = self.meta_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_file)
+
+    # --- Incremental state ---
+
+    def _load_state(self):
+        """The last row of every column and the running 7-day sums, from the last rows on disk."""
+        self.last = {name: np.zeros(self.capacity, dtype) for name, dtype in COLUMNS.items()}
+        self.window = {metric: deque(maxlen=WINDOW) for metric in METRICS}
+        self.sums = {metric: np.zeros(self.capacity, np.int64) for metric in METRICS}
+        if self.days == 0:
+            return
+        for name in COLUMNS:
+            self.last[name] = np.array(self.column(name)[-1])
+        for metric in METRICS:
+            for row in self.column(f'{metric}_new')[-WINDOW:]:
+                self.window[metric].append(np.array(row))
+                self.sums[metric] += row
+
+    def _grow(self, needed):
+        """Doubles the country slots until needed fit, rewriting each column once."""
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        for name, dtype in COLUMNS.items():
+            old = np.array(self.column(name))
+            grown = np.zeros((self.days, capacity), dtype)
+            grown[:, :self.capacity] = old
+            grown.tofile(self._path(name, capacity))
+            self.last[name] = np.concatenate([self.last[name], np.zeros(capacity - self.capacity, dtype)])
+        for metric in METRICS:
+            self.sums[metric] = np.concatenate([self.sums[metric], np.zeros(capacity - self.capacity, np.int64)])
+            self.window[metric] = deque(
+                (np.concatenate([row, np.zeros(capacity - self.capacity, np.int64)]) for row in self.window[metric]),
+                maxlen=WINDOW)
+        global_total = np.array(self.column('global_total'))
+        global_total.tofile(self._path('global_total', capacity))
+        old_capacity = self.capacity
+        self.capacity = capacity
+        self._maps.clear()
+        self._save_meta()
+        for name in self._names():
+            if os.path.exists(self._path(name, old_capacity)):
+                os.remove(self._path(name, old_capacity))
+
+    # --- Adding days ---
+
+    def day_index(self, day):
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        return (day - self.start).days
+
+    def date_of(self, day_index):
+        return date.fromordinal(self.start.toordinal() + day_index)
+
+    def add_day(self, day, docs):
+        """
+        Appends the snapshots (country documents) of day, which must be later
+        than every stored day. Costs O(countries + len(docs)).
+        """
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        if self.start is None:
+            self.start = day
+        i = self.day_index(day)
+        if i < self.days:
+            raise ValueError(f"{day} is already stored; days must be added in date order")
+        new_countries = [doc['country'] for doc in docs if doc['country'] not in self.index]
+        for country in dict.fromkeys(new_countries):
+            self.index[country] = len(self.countries)
+            self.countries.append(country)
+            self.last_seen.append(None)
+        if len(self.countries) > self.capacity:
+            self._grow(len(self.countries))
+        # Days without files repeat the last totals
+        while self.days < i:
+            self._append_row([])
+        self._append_row(docs)
+        for doc in docs:
+            self.last_seen[self.index[doc['country']]] = i
+        self._maps.clear()
+        self._save_meta()
+
+    def _append_row(self, docs):
+        rows = {'present': np.zeros(self.capacity, np.uint8)}
+        for metric in METRICS:
+            rows[f'{metric}_total'] = self.last[f'{metric}_total'].copy()
+            rows[f'{metric}_new'] = np.zeros(self.capacity, np.int64)
+        if docs:
+            slots = np.fromiter((self.index[doc['country']] for doc in docs), np.int64, len(docs))
+            rows['present'][slots] = 1
+            for metric in METRICS:
+                rows[f'{metric}_total'][slots] = [doc[metric]['total'] for doc in docs]
+                rows[f'{metric}_new'][slots] = [doc[metric]['new'] for doc in docs]
+        for metric in METRICS:
+            new = rows[f'{metric}_new']
+            window = self.window[metric]
+            if len(window) == WINDOW:
+                self.sums[metric] -= window[0]
+            window.append(new)
+            self.sums[metric] += new
+            # The first days average over the days there are
+            rows[f'{metric}_ma7'] = self.sums[metric] / len(window)
+        global_row = np.array([rows[f'{metric}_total'].sum() for metric in METRICS], np.int64)
+        for name, row in rows.items():
+            with open(self._path(name), 'ab') as f:
+                f.write(row.tobytes())
+        with open(self._path('global_total'), 'ab') as f:
+            f.write(global_row.tobytes())
+        self.last = rows
+        self.days += 1
+
+    def add_folder(self, folder, backend='auto'):
+        """
+        Adds the country files of folder, grouped by date. Returns (added,
+        rejected, skipped): files of already stored days are skipped, since
+        the store is append-only.
+        """
+        loads = get_loads(backend)
+        by_day = {}
+        rejected = skipped = 0
+        for path in list_files(folder):
+            try:
+                doc = loads(read_file(path))
+                date.fromisoformat(doc['date'])
+            except (OSError, ValueError, KeyError, TypeError):
+                rejected += 1
+                continue
+            if schema_error(doc) is not None:
+                rejected += 1
+                continue
+            by_day.setdefault(doc['date'], []).append(doc)
+        added = 0
+        for day in sorted(by_day):
+            if self.start is not None and self.day_index(day) < self.days:
+                skipped += len(by_day[day])
+                continue
+            self.add_day(day, by_day[day])
+            added += len(by_day[day])
+        return added, rejected, skipped
+
+    # --- Queries ---
+
+    def _row_index(self, day=None):
+        if self.days == 0:
+            raise ValueError("the store is empty")
+        i = self.days - 1 if day is None else self.day_index(day)
+        if not 0 <= i < self.days:
+            raise ValueError(f"{day} is outside {self.date_of(0)}..{self.date_of(self.days - 1)}")
+        return i
+
+    def active(self, day=None):
+        """Active cases (confirmed - deaths - recovered) of every country on day (default: the latest)."""
+        i = self._row_index(day)
+        n = len(self.countries)
+        return (self.column('confirmed_cases_total')[i, :n] - self.column('deaths_total')[i, :n]
+                - self.column('recovered_total')[i, :n])
+
+    def top_active(self, day=None, k=5):
+        """The k countries with the most active cases on day, as (country, active), most first."""
+        active = self.active(day)
+        k = min(k, len(active))
+        best = np.argpartition(-active, k - 1)[:k] if k else np.array([], np.int64)
+        best = best[np.argsort(-active[best], kind='stable')]
+        return [(self.countries[j], int(active[j])) for j in best]
+
+    def global_totals(self, day=None):
+        """Totals over all countries on day, as the notebook's summary_covid dictionary."""
+        confirmed, deaths, recovered = (int(n) for n in self.column('global_total')[self._row_index(day)])
+        return {"total_confirmed_cases": confirmed, "total_deaths": deaths,
+                "total_recovered_cases": recovered, "total_active": confirmed - deaths - recovered}
+
+    def latest(self):
+        """Country -> the date it last reported and its latest totals."""
+        return {country: {'date': self.date_of(self.last_seen[j]).isoformat(),
+                          **{metric: int(self.last[f'{metric}_total'][j]) for metric in METRICS}}
+                for j, country in enumerate(self.countries) if self.last_seen[j] is not None}
+
+    def series(self, country, name, start=None, end=None):
+        """(dates, values) of column name (e.g. 'deaths_ma7') for country from start to end, inclusive."""
+        j = self.index[country]
+        first = self._row_index(start) if start else 0
+        last = self._row_index(end) if end else self.days - 1
+        dates = np.datetime64(self.start.isoformat()) + np.arange(first, last + 1)
+        return dates, np.array(self.column(name)[first:last + 1, j])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar time-series store for the COVID country files.")
+    parser.add_argument('--store', default='covid_store', help="store folder")
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help="append the files of a folder and write the latest summary")
+    add.add_argument('folder', nargs='?', default='JSON_Files')
+    add.add_argument('-o', '--output', default='summary_covid.json')
+    top = commands.add_parser('top', help="countries with the most active cases on a date")
+    top.add_argument('--date', default=None, help="YYYY-MM-DD (default: the latest day)")
+    top.add_argument('-k', type=int, default=5)
+    commands.add_parser('latest', help="latest totals per country")
+    average = commands.add_parser('ma', help="7-day moving average of new counts for a country")
+    average.add_argument('country')
+    average.add_argument('--metric', choices=METRICS, default='confirmed_cases')
+    average.add_argument('--start', default=None)
+    average.add_argument('--end', default=None)
+    args = parser.parse_args()
+
+    store = CovidStore(args.store)
+    if args.command == 'add':
+        added, rejected, skipped = store.add_folder(args.folder)
+        print(f"Added {added} snapshots ({rejected} rejected, {skipped} for days already stored); "
+              f"{len(store.countries)} countries, {store.days} days")
+        summary_covid = store.global_totals()
+        print(summary_covid)
+        with open(args.output, "w") as f:
+            json.dump(summary_covid, f)
+    elif args.command == 'top':
+        for country, active in store.top_active(args.date, args.k):
+            print(f"{country}: {active}")
+    elif args.command == 'latest':
+        for country, latest in store.latest().items():
+            print(country, latest)
+    else:
+        dates, values = store.series(args.country, f'{args.metric}_ma7', args.start, args.end)
+        for day, value in zip(dates, values):
+            print(day, round(float(value), 1))
@@ -21,17 +21,44 @@
 
 import logging 
 
+from async_logging import setup_logging
+
+# users.txt is read once into memory and kept open for appending, instead of
+# being opened on every call; username -> set of passwords stored for it
+_users=None
+_users_file=None
+
+def load_users():
+    """The users.txt entries, loaded on first use. Raises FileNotFoundError if there is no users.txt yet."""
+    global _users
+    if _users is None:
+        users={}
+        with open("users.txt","r") as f:
+            for user in f:
+                stored_username,stored_password=user.strip().split(",")
+                users.setdefault(stored_username,set()).add(stored_password)
+        _users=users
+    return _users
+
 def new_user(username,password):
+    global _users, _users_file
     try:
         if len(password)<6:
             logging.warning(f"Password for user {username} is too short.")
         else:
             logging.info(f"User {username} created successfully.")
 
-        with open("users.txt","a") as f:
-            #hashed_password=hashlib.sha256(password.encode()).hexdigest()
-            f.write(f"{username},{password}\n")
-            logging.info(f"User {username} and password {password} added to users.txt file.")
+        try:
+            users=load_users()
+        except FileNotFoundError:
+            users=_users={}
+        if _users_file is None:
+            _users_file=open("users.txt","a")
+        #hashed_password=hashlib.sha256(password.encode()).hexdigest()
+        _users_file.write(f"{username},{password}\n")
+        _users_file.flush()
+        users.setdefault(username,set()).add(password)
+        logging.info(f"User {username} and password {password} added to users.txt file.")
     except Exception as e:
         logging.exception(f"An error occurred while creating user {username}: {e}")
 
@@ -39,15 +66,12 @@ def new_user(username,password):
 
 def login(username,password):
     try:
-        with open("users.txt","r") as f:
-            users=f.readlines()
-            for user in users:
-                stored_username,stored_password=user.strip().split(",")
-                if stored_username==username and stored_password==password:
-                    logging.info(f"User {username} logged in successfully.")
-                    return True
-            logging.warning(f"Login failed for user {username}. Incorrect username or password.")
-            return False
+        users=load_users()
+        if password in users.get(username,()):
+            logging.info(f"User {username} logged in successfully.")
+            return True
+        logging.warning(f"Login failed for user {username}. Incorrect username or password.")
+        return False
     except FileNotFoundError:
         logging.error("users.txt file not found. No users exist.")
         return False
@@ -56,12 +80,13 @@ def login(username,password):
         return False
     
 if __name__=="__main__":
-    logging.basicConfig(filename="app.log",level=logging.DEBUG,
-                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # Records go through a queue to a background thread that writes them in
+    # batches and rotates app.log; json_lines=True writes JSON lines instead
+    setup_logging(filename="app.log",level=logging.DEBUG)
 
     new_user("alice","password123")
     new_user("bob","pass")
     login("alice","password123")
     login("bob","wrongpass")
     login("charlie","nopass")
-    print("Sucessfully executed. Check app.log for details.")
\ No newline at end of file
+    print("Sucessfully executed. Check app.log for details.")
@@ -0,0 +1,230 @@
+"""
+Non-blocking logging for the Experiment-7 user service.
+
+setup_logging() puts a QueueHandler on the root logger, so logging.info()
+and friends only append the record to an in-memory queue. A background
+BatchQueueListener drains everything that has queued up since its last
+write and hands it to RotatingBatchFileHandler, which formats the batch and
+writes it with one write() call. The file rotates by size (max_bytes) and
+by age (rotate_seconds), keeping backup_count old files as app.log.1,
+app.log.2, ...; json_lines=True writes one JSON object per record instead
+of the Experiment-7 text format.
+
+The queue is unbounded on purpose: a slow disk makes the queue grow rather
+than make a request wait.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record: time, logger, level, message (and exception)."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class LightQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that does as little as possible in the logging thread. The
+    stock one copies and fully formats every record before queueing it; this
+    one only merges the message arguments (so later changes to them do not
+    alter the log) and leaves formatting to the listener thread. The queue
+    is thread-safe, so the handler lock is skipped too.
+    """
+
+    def prepare(self, record):
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def handle(self, record):
+        if not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+
+class RotatingBatchFileHandler(logging.Handler):
+    """
+    File handler that writes whole batches of records at once and rotates
+    when the file would exceed max_bytes or is older than rotate_seconds.
+    With fsync=True every batch is forced to disk before the next one.
+    """
+
+    def __init__(self, filename, max_bytes=0, rotate_seconds=0, backup_count=5, encoding='utf-8', fsync=False):
+        super().__init__()
+        self.filename = os.path.abspath(filename)
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = backup_count
+        self.encoding = encoding
+        self.fsync = fsync
+        self.stream = None
+        self._open()
+
+    def _open(self):
+        self.stream = open(self.filename, 'ab')
+        self.size = self.stream.tell()
+        self.rollover_at = time.time() + self.rotate_seconds if self.rotate_seconds else None
+
+    def rollover(self):
+        """app.log -> app.log.1 -> app.log.2 ..., dropping the oldest beyond backup_count."""
+        self.stream.close()
+        if self.backup_count > 0:
+            for number in range(self.backup_count - 1, 0, -1):
+                source = f"{self.filename}.{number}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.filename}.{number + 1}")
+            os.replace(self.filename, f"{self.filename}.1")
+        else:
+            open(self.filename, 'wb').close()
+        self._open()
+
+    def _write(self, chunks):
+        if chunks:
+            data = b''.join(chunks)
+            self.stream.write(data)
+            self.stream.flush()
+            if self.fsync:
+                os.fsync(self.stream.fileno())
+            self.size += len(data)
+
+    def emit_batch(self, records):
+        """Formats records and writes them with one write() per file they end up in."""
+        lines = []
+        for record in records:
+            try:
+                lines.append((self.format(record) + '\n').encode(self.encoding))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        with self.lock:
+            try:
+                if self.rollover_at is not None and time.time() >= self.rollover_at:
+                    self.rollover()
+                pending = []
+                pending_size = 0
+                for line in lines:
+                    # A batch that would cross max_bytes is split at the record boundary
+                    if (self.max_bytes and self.size + pending_size
+                            and self.size + pending_size + len(line) > self.max_bytes):
+                        self._write(pending)
+                        self.rollover()
+                        pending = []
+                        pending_size = 0
+                    pending.append(line)
+                    pending_size += len(line)
+                self._write(pending)
+            except Exception:
+                self.handleError(records[-1])
+
+    def emit(self, record):
+        self.emit_batch([record])
+
+    def close(self):
+        with self.lock:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+        super().close()
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener that takes every record already waiting (up to
+    batch_size) and passes them on together to handlers that have
+    emit_batch(), and one by one to other handlers.
+    """
+
+    def __init__(self, log_queue, *handlers, batch_size=1024, respect_handler_level=True):
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.batch_size = batch_size
+
+    def handle_batch(self, records):
+        for handler in self.handlers:
+            if self.respect_handler_level:
+                selected = [record for record in records if record.levelno >= handler.level]
+            else:
+                selected = records
+            if not selected:
+                continue
+            if hasattr(handler, 'emit_batch'):
+                handler.emit_batch(selected)
+            else:
+                for record in selected:
+                    handler.handle(record)
+
+    def _monitor(self):
+        log_queue = self.queue
+        has_task_done = hasattr(log_queue, 'task_done')
+        stopping = False
+        while not stopping:
+            record = self.dequeue(True)
+            if record is self._sentinel:
+                if has_task_done:
+                    log_queue.task_done()
+                break
+            batch = [record]
+            # Drain whatever else is already waiting, up to one batch
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.dequeue(False)
+                except queue.Empty:
+                    break
+                if record is self._sentinel:
+                    stopping = True
+                    break
+                batch.append(record)
+            self.handle_batch(batch)
+            if has_task_done:
+                for _ in range(len(batch) + stopping):
+                    log_queue.task_done()
+
+    def stop(self):
+        """Writes out everything still queued, then closes the handlers. Safe to call twice."""
+        if self._thread is None:
+            return
+        super().stop()
+        for handler in self.handlers:
+            handler.close()
+
+
+def setup_logging(filename='app.log', level=logging.DEBUG, json_lines=False, max_bytes=10 * 1024 * 1024,
+                  rotate_seconds=24 * 60 * 60, backup_count=5, batch_size=1024, fsync=False):
+    """
+    Routes the root logger through a queue to a batching, rotating file
+    handler and starts the listener thread. Returns the listener; it is
+    stopped (and the queue flushed) at interpreter exit.
+    """
+    handler = RotatingBatchFileHandler(filename, max_bytes, rotate_seconds, backup_count, fsync=fsync)
+    handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(LOG_FORMAT))
+    log_queue = queue.SimpleQueue()
+    listener = BatchQueueListener(log_queue, handler, batch_size=batch_size)
+
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+        old_handler.close()
+    root.addHandler(LightQueueHandler(log_queue))
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
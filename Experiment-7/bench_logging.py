@@ -0,0 +1,122 @@
+"""
+Compares the original synchronous logging of Experiment-7 (basicConfig with
+a FileHandler) with the async_logging queue pipeline:
+
+* throughput: how fast a thread can log N records, and how long until they
+  are all on disk;
+* added latency: mean and p99 time of one login() call with each setup,
+  minus the same call with logging disabled.
+
+--fsync forces every write to disk (per record for the FileHandler, per
+batch for the queue), which is where a blocking handler hurts most.
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import tempfile
+import time
+
+from async_logging import LOG_FORMAT, setup_logging
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(HERE, 'Experiment-7 Implementing Logging Mechanism in Python.py')
+
+
+def load_experiment():
+    spec = importlib.util.spec_from_file_location('experiment7', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FsyncFileHandler(logging.FileHandler):
+    def flush(self):
+        super().flush()
+        if self.stream is not None:
+            os.fsync(self.stream.fileno())
+
+
+def reset_logging():
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    logging.disable(logging.NOTSET)
+
+
+def configure(mode, path, fsync=False):
+    """Sets up logging to path; returns the async listener or None."""
+    reset_logging()
+    if mode == 'sync':
+        handler = FsyncFileHandler(path) if fsync else logging.FileHandler(path)
+        logging.basicConfig(handlers=[handler], level=logging.DEBUG, format=LOG_FORMAT)
+    elif mode == 'async':
+        return setup_logging(filename=path, level=logging.DEBUG, max_bytes=0, rotate_seconds=0, fsync=fsync)
+    else:
+        logging.disable(logging.CRITICAL)
+    return None
+
+
+def throughput(mode, records, tmp, fsync=False):
+    """Returns (records/sec as seen by the caller, records/sec until everything is written)."""
+    listener = configure(mode, os.path.join(tmp, f'{mode}.log'), fsync)
+    start = time.perf_counter()
+    for i in range(records):
+        logging.info(f"User user{i} logged in successfully.")
+    emitted = time.perf_counter() - start
+    if listener is not None:
+        listener.stop()
+    written = time.perf_counter() - start
+    reset_logging()
+    return records / emitted, records / written
+
+
+def login_latency(experiment, mode, logins, tmp, fsync=False):
+    """Sorted per-call login() times in microseconds."""
+    listener = configure(mode, os.path.join(tmp, f'{mode}-login.log'), fsync)
+    times = []
+    for i in range(logins):
+        user = f"user{i % 100}"
+        password = f"password{i % 100}" if i % 4 else "wrong"
+        start = time.perf_counter()
+        experiment.login(user, password)
+        times.append((time.perf_counter() - start) * 1e6)
+    if listener is not None:
+        listener.stop()
+    reset_logging()
+    return sorted(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark synchronous vs queued logging for Experiment-7.")
+    parser.add_argument('-n', '--records', type=int, default=200_000)
+    parser.add_argument('-l', '--logins', type=int, default=50_000)
+    parser.add_argument('--fsync', action='store_true', help="force every write to disk")
+    args = parser.parse_args()
+
+    experiment = load_experiment()
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            with open('users.txt', 'w') as f:
+                for i in range(100):
+                    f.write(f"user{i},password{i}\n")
+
+            print(f"{'mode':<6} {'emit (rec/s)':>13} {'on disk (rec/s)':>16}")
+            for mode in ('sync', 'async'):
+                emitted, written = throughput(mode, args.records, tmp, args.fsync)
+                print(f"{mode:<6} {emitted:>13,.0f} {written:>16,.0f}")
+
+            baseline = login_latency(experiment, 'off', args.logins, tmp)
+            base_mean = sum(baseline) / len(baseline)
+            print(f"\nlogin() without logging: mean {base_mean:.2f} us")
+            print(f"{'mode':<6} {'added mean (us)':>16} {'p99 (us)':>9}")
+            for mode in ('sync', 'async'):
+                times = login_latency(experiment, mode, args.logins, tmp, args.fsync)
+                mean = sum(times) / len(times)
+                p99 = times[int(0.99 * len(times))]
+                print(f"{mode:<6} {mean - base_mean:>16.2f} {p99:>9.2f}")
+        finally:
+            os.chdir(cwd)
@@ -0,0 +1,344 @@
+"""
+Queries over large logs in the Experiment-7 format
+
+    2025-09-07 20:00:04,641 - root - WARNING - Login failed for user bob. ...
+
+(the logger name is optional, as in the top-level app.log).
+
+The first query on a log builds a sidecar index, <log>.index.json. The
+index splits the file into blocks of about 1 MB at line boundaries and
+records, for each block, its byte range, its earliest and latest timestamp,
+how many records of each level it holds and where its ERROR and CRITICAL
+records start (unless there are very many). The file is memory-mapped, and
+large files are indexed in parallel chunks. Later queries only index what
+was appended since; a rotated or rewritten log is indexed from scratch.
+
+A query only reads the blocks that can contain matching records: blocks
+outside the time range or without records of the requested level are
+skipped. Within a block, mmap.find() locates the lines holding the searched
+text or level, and only those are parsed; ERROR and CRITICAL
+queries go straight to the lines the index lists. Level counts for blocks
+wholly inside the time range come from the index alone. Only the first
+line of a record is matched; traceback lines are skipped.
+
+Examples:
+
+    python log_query.py levels app.log --since "2025-09-02 17:00"
+    python log_query.py search app.log --level ERROR --user alice --since "2025-09-07" --until "2025-09-08"
+    python log_query.py per-minute app.log --contains "Login failed"
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import time
+from collections import Counter
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+INDEX_VERSION = 1
+BLOCK_SIZE = 1 << 20
+# Bytes of the log indexed per parallel task
+CHUNK_SIZE = 64 << 20
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+TIMESTAMP = rb'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}'
+# Timestamp, level and the whole line; the logger name is optional
+RECORD = rb'^(' + TIMESTAMP + rb') - (?:[\w.\-<>]+ - )?(%s) - [^\n]*'
+INDEX_PATTERN = re.compile(RECORD % b'|'.join(level.encode() for level in LEVELS), re.M)
+# Levels whose records' line offsets are kept in the index, as long as a
+# block has at most MAX_LISTED of them; queries for them skip the scan
+LISTED_LEVELS = ('ERROR', 'CRITICAL')
+MAX_LISTED = 1024
+# Beginning of the file, to notice a log replaced by a new one
+HEAD_BYTES = 4096
+
+
+def index_path(log_path):
+    return log_path + '.index.json'
+
+
+def parse_time(text):
+    """'2025-09-07', '2025-09-07 20:00' etc. in the log's timestamp format."""
+    if text is None:
+        return None
+    moment = datetime.fromisoformat(text.replace(',', '.'))
+    return moment.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
+
+
+def _line_start(mm, pos):
+    """The first line boundary at or after pos."""
+    if pos <= 0:
+        return 0
+    newline = mm.find(b'\n', pos - 1)
+    return len(mm) if newline < 0 else newline + 1
+
+
+def _open_map(path):
+    """A read-only map of path; an empty file (e.g. a log just rotated) reads as b''."""
+    with open(path, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return nullcontext(b'')
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _index_range(task):
+    """Indexes [start, end) of a log, both on line boundaries, into blocks."""
+    path, start, end, block_size = task
+    blocks = []
+    with _open_map(path) as mm:
+        offset = start
+        while offset < end:
+            block_end = min(end, _line_start(mm, offset + block_size))
+            stamps = INDEX_PATTERN.findall(mm[offset:block_end])
+            levels = Counter(level.decode() for _, level in stamps)
+            listed = None
+            if sum(levels[level] for level in LISTED_LEVELS) <= MAX_LISTED:
+                listed = sorted(line_start for level in LISTED_LEVELS if levels[level]
+                                for line_start, line in _anchored_lines(mm, offset, block_end, f' - {level} - '.encode())
+                                if (match := INDEX_PATTERN.match(line)) and match.group(2).decode() == level)
+            blocks.append({
+                'offset': offset,
+                'end': block_end,
+                # Timestamps in this format sort correctly as text
+                'min': min(stamp for stamp, _ in stamps).decode() if stamps else None,
+                'max': max(stamp for stamp, _ in stamps).decode() if stamps else None,
+                'levels': dict(levels),
+                'listed': listed,
+            })
+            offset = block_end
+    return blocks
+
+
+def _map(func, tasks, workers):
+    if workers == 1 or len(tasks) < 2:
+        return map(func, tasks)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # Consumed before shutdown so the caller gets plain results
+        return list(executor.map(func, tasks))
+    finally:
+        executor.shutdown()
+
+
+def _head_hash(mm):
+    return hashlib.sha1(mm[:HEAD_BYTES]).hexdigest()
+
+
+def load_index(log_path, block_size=BLOCK_SIZE, workers=None, chunk_size=CHUNK_SIZE):
+    """The index of log_path, brought up to date with the file and saved."""
+    workers = workers or os.cpu_count() or 1
+    try:
+        with open(index_path(log_path)) as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        index = None
+
+    with _open_map(log_path) as mm:
+        # A line still being written is left for the next update
+        size = mm.rfind(b'\n') + 1
+        head = _head_hash(mm)
+        if (index is None or index.get('version') != INDEX_VERSION or index['block_size'] != block_size
+                or index['head'] != head or index['size'] > size):
+            index = {'version': INDEX_VERSION, 'block_size': block_size, 'head': head, 'size': 0, 'blocks': []}
+        elif index['size'] == size:
+            return index
+        if index['blocks'] and index['blocks'][-1]['end'] - index['blocks'][-1]['offset'] < block_size:
+            # The last block was short; index it again together with what follows
+            index['blocks'].pop()
+        start = index['blocks'][-1]['end'] if index['blocks'] else 0
+        bounds = [start]
+        while bounds[-1] < size:
+            bounds.append(min(size, _line_start(mm, bounds[-1] + chunk_size)))
+
+    tasks = [(log_path, a, b, block_size) for a, b in zip(bounds, bounds[1:])]
+    for blocks in _map(_index_range, tasks, workers):
+        index['blocks'].extend(blocks)
+    index['size'] = size
+
+    tmp_path = index_path(log_path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps(index))
+    os.replace(tmp_path, index_path(log_path))
+    return index
+
+
+def _overlaps(block, since, until):
+    if block['min'] is None:
+        return False
+    return (since is None or block['max'] >= since) and (until is None or block['min'] < until)
+
+
+def _inside(block, since, until):
+    return (since is None or block['min'] >= since) and (until is None or block['max'] < until)
+
+
+def select_blocks(index, since=None, until=None, level=None):
+    """The blocks that can hold records of level (any level if None) in [since, until)."""
+    return [block for block in index['blocks']
+            if _overlaps(block, since, until) and (level is None or block['levels'].get(level))]
+
+
+def _anchored_lines(mm, start, end, anchor):
+    """
+    (offset, line) for the lines of mm[start:end] that contain anchor,
+    found with mmap.find instead of a regex per line.
+    """
+    pos = mm.find(anchor, start, end)
+    while pos >= 0:
+        line_start = mm.rfind(b'\n', start, pos) + 1 or start
+        line_end = mm.find(b'\n', pos, end)
+        if line_end < 0:
+            line_end = end
+        yield line_start, mm[line_start:line_end]
+        pos = mm.find(anchor, line_end, end)
+
+
+def _scan_block(task):
+    """
+    Matching records of one block: their lines, or in 'minutes' and
+    'levels' mode a Counter of matching records per minute or per level.
+    """
+    path, offset, end, listed, level, since, until, contains, user, mode = task
+    levels = level.encode() if level else b'|'.join(name.encode() for name in LEVELS)
+    user_pattern = re.compile(rb'(?i)\buser ' + re.escape(user) + rb'\b') if user is not None else None
+    since = since.encode() if since else None
+    until = until.encode() if until else None
+    found = [] if mode == 'lines' else Counter()
+    with _open_map(path) as mm:
+        # Only lines containing the most selective literal can match, and
+        # finding those is much cheaper than matching every line. The user
+        # name is matched case-insensitively, so mmap.find cannot look for it.
+        level_anchor = b' - ' + levels + b' - ' if level else None
+        anchor = contains or level_anchor
+        line_pattern = re.compile(RECORD % levels)
+        if listed is not None:
+            matches = (line_pattern.match(mm[line_start:mm.find(b'\n', line_start)]) for line_start in listed)
+        elif anchor is not None:
+            matches = (line_pattern.match(line) for _, line in _anchored_lines(mm, offset, end, anchor))
+        else:
+            matches = re.finditer(RECORD % levels, mm[offset:end], re.M)
+        for match in matches:
+            if match is None:
+                continue
+            stamp = match.group(1)
+            if (since and stamp < since) or (until and stamp >= until):
+                continue
+            line = match.group(0)
+            if contains is not None and contains not in line:
+                continue
+            if user_pattern is not None and not user_pattern.search(line):
+                continue
+            if mode == 'minutes':
+                found[stamp[:16].decode()] += 1
+            elif mode == 'levels':
+                found[match.group(2).decode()] += 1
+            else:
+                found.append(line.decode('utf-8', 'replace').rstrip('\r'))
+    return found
+
+
+def _scan(log_path, blocks, level, since, until, contains, user, mode, workers):
+    contains = contains.encode() if contains is not None else None
+    user = user.encode() if user is not None else None
+    tasks = []
+    listed = []
+    for block in blocks:
+        if level in LISTED_LEVELS and block.get('listed') is not None:
+            # Runs of blocks whose matching lines the index lists make one task
+            listed.extend(block['listed'])
+            continue
+        if listed:
+            tasks.append((log_path, None, None, listed, level, since, until, contains, user, mode))
+            listed = []
+        tasks.append((log_path, block['offset'], block['end'], None, level, since, until, contains, user, mode))
+    if listed:
+        tasks.append((log_path, None, None, listed, level, since, until, contains, user, mode))
+    return _map(_scan_block, tasks, workers or os.cpu_count() or 1)
+
+
+def count_levels(log_path, since=None, until=None, workers=None):
+    """Records per level in [since, until), mostly from the index alone."""
+    index = load_index(log_path, workers=workers)
+    counts = Counter()
+    partial = []
+    for block in select_blocks(index, since, until):
+        if _inside(block, since, until):
+            counts.update(block['levels'])
+        else:
+            partial.append(block)
+    for found in _scan(log_path, partial, None, since, until, None, None, 'levels', workers):
+        counts.update(found)
+    return counts
+
+
+def search(log_path, level=None, since=None, until=None, contains=None, user=None, limit=None, workers=None):
+    """Matching lines, in file order."""
+    index = load_index(log_path, workers=workers)
+    lines = []
+    for found in _scan(log_path, select_blocks(index, since, until, level),
+                       level, since, until, contains, user, 'lines', workers):
+        lines.extend(found)
+        if limit is not None and len(lines) >= limit:
+            return lines[:limit]
+    return lines
+
+
+def per_minute(log_path, level=None, since=None, until=None, contains=None, user=None, workers=None):
+    """Matching records per minute ('YYYY-MM-DD HH:MM' -> count), in time order."""
+    index = load_index(log_path, workers=workers)
+    counts = Counter()
+    for found in _scan(log_path, select_blocks(index, since, until, level),
+                       level, since, until, contains, user, 'minutes', workers):
+        counts.update(found)
+    return dict(sorted(counts.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query Experiment-7 style logs through a sidecar index.")
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    index_cmd = commands.add_parser('index', help="build or update the index of logs")
+    index_cmd.add_argument('logs', nargs='+')
+
+    for name, help_text in (('levels', "records per level"), ('search', "print matching records"),
+                            ('per-minute', "matching records per minute")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('log')
+        command.add_argument('--since', help="first time to include, e.g. '2025-09-07 20:00'")
+        command.add_argument('--until', help="first time to leave out")
+        if name != 'levels':
+            command.add_argument('--level', choices=LEVELS)
+            command.add_argument('--contains', help="text the record must contain")
+            command.add_argument('--user', help="records mentioning 'user <name>'")
+        if name == 'search':
+            command.add_argument('--limit', type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'index':
+        for log in args.logs:
+            index = load_index(log, workers=args.workers)
+            totals = Counter()
+            for block in index['blocks']:
+                totals.update(block['levels'])
+            print(f"{log}: {index['size']:,} bytes, {len(index['blocks'])} blocks, {dict(totals)}")
+    else:
+        since, until = parse_time(args.since), parse_time(args.until)
+        if args.command == 'levels':
+            counts = count_levels(args.log, since, until, args.workers)
+            for level in LEVELS:
+                print(f"{level:<9} {counts.get(level, 0):>12,}")
+        elif args.command == 'search':
+            for line in search(args.log, args.level, since, until, args.contains, args.user,
+                               args.limit, args.workers):
+                print(line)
+        else:
+            for minute, count in per_minute(args.log, args.level, since, until, args.contains,
+                                            args.user, args.workers).items():
+                print(f"{minute}  {count}")
+    print(f"({time.perf_counter() - start:.3f} s)")
@@ -0,0 +1,66 @@
+"""Queries against a log that RotatingBatchFileHandler has just rotated, leaving it empty."""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from async_logging import LOG_FORMAT, RotatingBatchFileHandler
+from log_query import count_levels, load_index, per_minute, search
+
+
+def write_and_rotate(path):
+    handler = RotatingBatchFileHandler(path, backup_count=2)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    records = [logging.LogRecord('root', level, __file__, 0, message, None, None)
+               for level, message in [(logging.INFO, "User alice logged in successfully."),
+                                      (logging.ERROR, "Login failed for user bob.")]]
+    handler.emit_batch(records)
+    handler.rollover()
+    handler.close()
+
+
+def test_queries_on_rotated_empty_log(tmp_path):
+    path = str(tmp_path / 'app.log')
+    write_and_rotate(path)
+    assert os.path.getsize(path) == 0
+    assert os.path.getsize(path + '.1') > 0
+
+    index = load_index(path, workers=1)
+    assert index['size'] == 0 and index['blocks'] == []
+    assert search(path, level='ERROR', workers=1) == []
+    assert search(path, contains='alice', workers=1) == []
+    assert count_levels(path, workers=1) == {}
+    assert per_minute(path, workers=1) == {}
+    # The rotated file is still searchable
+    assert len(search(path + '.1', level='ERROR', workers=1)) == 1
+
+
+def test_index_of_rotated_log_is_replaced(tmp_path):
+    path = str(tmp_path / 'app.log')
+    handler = RotatingBatchFileHandler(path, backup_count=2)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.emit_batch([logging.LogRecord('root', logging.ERROR, __file__, 0, "Login failed for user bob.",
+                                          None, None)])
+    # An index built before the rotation must not be reused for the empty file
+    assert len(search(path, level='ERROR', workers=1)) == 1
+    handler.rollover()
+    handler.close()
+    assert search(path, level='ERROR', workers=1) == []
+
+
+def test_user_search_ignores_case(tmp_path):
+    path = str(tmp_path / 'app.log')
+    handler = RotatingBatchFileHandler(path, backup_count=2)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.emit_batch([logging.LogRecord('root', level, __file__, 0, message, None, None)
+                        for level, message in [(logging.INFO, "User alice logged in successfully."),
+                                               (logging.INFO, "User Alice logged in successfully."),
+                                               (logging.ERROR, "Login failed for user ALICE."),
+                                               (logging.INFO, "User bob logged in successfully.")]])
+    handler.close()
+    # Every code path (plain scan, level anchor, listed offsets, contains) finds all spellings
+    assert len(search(path, user='alice', workers=1)) == 3
+    assert len(search(path, user='alice', level='INFO', workers=1)) == 2
+    assert len(search(path, user='alice', level='ERROR', workers=1)) == 1
+    assert len(search(path, user='Alice', contains='logged in', workers=1)) == 2
+    assert sum(per_minute(path, user='ALICE', workers=1).values()) == 3
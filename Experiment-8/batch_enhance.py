@@ -0,0 +1,143 @@
+"""
+Batch version of the Experiment-8 enhancements.
+
+Takes a directory or glob of images and a declarative list of operations,
+decodes every image once and derives all of its variants from that decoded
+image, spreading the images across a process pool. Runs headless unless
+--show is given.
+
+An operation is a dict such as {"name": "bright", "op": "brightness", "factor": 1.8};
+the output of that operation for sample.jpg is saved as sample_bright.jpg.
+The "enhance" operation fuses brightness, contrast and saturation factors
+into a single pass.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageEnhance, ImageFilter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.instrumentation import timed
+
+from fast_enhance import FastEnhancer
+
+# The filter set applied one by one in Experiment-8.py
+DEFAULT_OPERATIONS = [
+    {'name': 'blur', 'op': 'gaussian_blur', 'radius': 12},
+    {'name': 'bright', 'op': 'brightness', 'factor': 1.8},
+    {'name': 'dark', 'op': 'brightness', 'factor': 0.5},
+    {'name': 'contrast', 'op': 'contrast', 'factor': 2.0},
+    {'name': 'saturated', 'op': 'color', 'factor': 2.5},
+    {'name': 'gray', 'op': 'grayscale'},
+]
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+# Operations FastEnhancer handles, and the enhance() argument each one sets
+FAST_FACTORS = {'brightness': 'brightness', 'contrast': 'contrast', 'color': 'saturation'}
+
+
+def apply_operation(img, operation, fast):
+    """
+    Applies one operation to a decoded image. fast is the image's
+    FastEnhancer, which shares the gray values between variants.
+    """
+    op = operation['op']
+    if op in FAST_FACTORS:
+        return fast.enhance(**{FAST_FACTORS[op]: operation['factor']})
+    if op == 'enhance':
+        return fast.enhance(operation.get('brightness', 1.0), operation.get('contrast', 1.0),
+                            operation.get('saturation', 1.0))
+    if op == 'grayscale':
+        return fast.grayscale()
+    if op == 'sharpness':
+        return ImageEnhance.Sharpness(img).enhance(operation['factor'])
+    if op == 'gaussian_blur':
+        return img.filter(ImageFilter.GaussianBlur(radius=operation.get('radius', 2)))
+    if op == 'resize':
+        return img.resize((operation['width'], operation['height']))
+    raise ValueError(f"Unknown operation: {op}")
+
+
+def output_path(image_path, output_dir, name):
+    stem, ext = os.path.splitext(os.path.basename(image_path))
+    return os.path.join(output_dir, f"{stem}_{name}{ext}")
+
+
+def save_image(img, path):
+    # JPEG has no alpha or palette, convert those the way PIL would on display
+    if path.lower().endswith(('.jpg', '.jpeg')) and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    img.save(path)
+
+
+@timed('enhance')
+def process_image(image_path, operations, output_dir, show=False):
+    """Decodes one image once and writes every variant. Returns the paths written."""
+    written = []
+    with Image.open(image_path) as img:
+        img.load()
+        fast = FastEnhancer(img)
+        for operation in operations:
+            result = apply_operation(img, operation, fast)
+            path = output_path(image_path, output_dir, operation['name'])
+            save_image(result, path)
+            if show:
+                result.show()
+            written.append(path)
+    return written
+
+
+def _process_job(job):
+    return process_image(*job)
+
+
+def find_images(source):
+    """Expands a directory or glob pattern into a sorted list of image paths."""
+    if os.path.isdir(source):
+        source = os.path.join(source, '*')
+    return sorted(path for path in glob.glob(source)
+                  if path.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path))
+
+
+def load_operations(spec):
+    """Reads operations from a JSON file, or returns the Experiment-8 defaults."""
+    if spec is None:
+        return DEFAULT_OPERATIONS
+    with open(spec, 'r') as f:
+        return json.load(f)
+
+
+@timed('batch')
+def run_batch(source, operations=DEFAULT_OPERATIONS, output_dir='enhanced', workers=None, show=False):
+    """Processes every image matched by source across a process pool. Returns the number of images."""
+    images = find_images(source)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    jobs = [(path, operations, output_dir, show) for path in images]
+    if workers == 1 or show:
+        # show() needs the desktop session of this process
+        for job in jobs:
+            _process_job(job)
+    else:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(_process_job, jobs, chunksize=chunksize):
+                pass
+    return len(images)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the Experiment-8 enhancements to many images.")
+    parser.add_argument('source', help="directory or glob pattern of input images")
+    parser.add_argument('-o', '--output', default='enhanced', help="folder for the processed images")
+    parser.add_argument('--ops', help="JSON file with the list of operations (default: Experiment-8 set)")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--show', action='store_true', help="display every result (runs serially)")
+    args = parser.parse_args()
+
+    count = run_batch(args.source, load_operations(args.ops), args.output, args.workers, args.show)
+    print(f"Processed {count} images into {args.output}")
@@ -0,0 +1,113 @@
+"""
+Benchmark of fast_enhance.py against the PIL ImageEnhance chain used in
+Experiment-8, on a large image (24 MP by default). FastEnhancer is timed on
+the PIL image and on its NumPy array.
+
+Before timing, every variant from both paths is checked to match PIL within
++/-1 per channel; the script exits with status 1 if any differs by more.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+import fast_enhance
+
+# (name, PIL version, fast version) of the Experiment-8 variants; the fast
+# versions take a FastEnhancer
+VARIANTS = [
+    ('bright 1.8', lambda img: ImageEnhance.Brightness(img).enhance(1.8),
+     lambda fast: fast.enhance(brightness=1.8)),
+    ('dark 0.5', lambda img: ImageEnhance.Brightness(img).enhance(0.5),
+     lambda fast: fast.enhance(brightness=0.5)),
+    ('contrast 2.0', lambda img: ImageEnhance.Contrast(img).enhance(2.0),
+     lambda fast: fast.enhance(contrast=2.0)),
+    ('saturated 2.5', lambda img: ImageEnhance.Color(img).enhance(2.5),
+     lambda fast: fast.enhance(saturation=2.5)),
+    ('gray', lambda img: img.convert('L'),
+     lambda fast: fast.grayscale()),
+    ('bright+contrast+saturation', lambda img: ImageEnhance.Color(
+        ImageEnhance.Contrast(ImageEnhance.Brightness(img).enhance(1.2)).enhance(1.5)).enhance(1.3),
+     lambda fast: fast.enhance(brightness=1.2, contrast=1.5, saturation=1.3)),
+]
+
+
+def synthetic_image(width, height, seed=0):
+    """A photo-like RGB test image: smooth gradients plus noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    arr = np.empty((height, width, 3), dtype=np.uint8)
+    arr[..., 0] = (x / width * 255).astype(np.uint8)
+    arr[..., 1] = (y / height * 255).astype(np.uint8)
+    arr[..., 2] = ((x + y) / (width + height) * 255).astype(np.uint8)
+    noise = rng.integers(0, 64, size=arr.shape, dtype=np.uint8)
+    np.add(arr, noise, out=arr, casting='unsafe')
+    return Image.fromarray(arr)
+
+
+def max_difference(expected, actual):
+    a = np.asarray(expected, dtype=np.int16)
+    b = np.asarray(actual, dtype=np.int16)
+    return int(np.abs(a - b).max())
+
+
+def check_matches_pil(img, tolerance=1):
+    """Returns the variants whose fast output differs from PIL by more than tolerance."""
+    arr = fast_enhance.to_array(img)
+    failures = []
+    for name, pil_version, fast_version in VARIANTS:
+        expected = pil_version(img)
+        for kind, source in (('image', img), ('array', arr)):
+            diff = max_difference(expected, fast_version(fast_enhance.FastEnhancer(source)))
+            print(f"{name:<28} {kind:<6} max difference {diff}")
+            if diff > tolerance:
+                failures.append(f"{name} ({kind})")
+    return failures
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the NumPy enhancement path with PIL.")
+    parser.add_argument('image', nargs='?', help="image to use (default: synthetic 6000x4000)")
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    img = Image.open(args.image).convert('RGB') if args.image else synthetic_image(6000, 4000)
+    print(f"Image: {img.size[0]}x{img.size[1]} ({img.size[0] * img.size[1] / 1e6:.1f} MP)\n")
+
+    failures = check_matches_pil(img)
+    if failures:
+        print(f"\nMismatch beyond +/-1 in: {', '.join(failures)}")
+        sys.exit(1)
+
+    # Each variant on its own. The array column includes np.asarray and
+    # Image.fromarray, so all three produce a PIL image.
+    def on_array(fast_version):
+        return lambda: Image.fromarray(fast_version(fast_enhance.FastEnhancer(fast_enhance.to_array(img))))
+
+    print(f"\n{'variant':<28} {'PIL (s)':>9} {'fast (s)':>9} {'array (s)':>10} {'speed-up':>9}")
+    for name, pil_version, fast_version in VARIANTS:
+        pil_time = best_time(lambda: pil_version(img), args.repeat)
+        fast_time = best_time(lambda: fast_version(fast_enhance.FastEnhancer(img)), args.repeat)
+        array_time = best_time(on_array(fast_version), args.repeat)
+        print(f"{name:<28} {pil_time:>9.3f} {fast_time:>9.3f} {array_time:>10.3f} {pil_time / fast_time:>8.1f}x")
+
+    # The whole Experiment-8 set from one decoded image, as batch_enhance runs it
+    pil_time = best_time(lambda: [pil_version(img) for _, pil_version, _ in VARIANTS[:5]], args.repeat)
+
+    def fast_set():
+        fast = fast_enhance.FastEnhancer(img)
+        return [fast_version(fast) for _, _, fast_version in VARIANTS[:5]]
+
+    fast_time = best_time(fast_set, args.repeat)
+    print(f"{'Experiment-8 set (shared)':<28} {pil_time:>9.3f} {fast_time:>9.3f} {'':>10} {pil_time / fast_time:>8.1f}x")
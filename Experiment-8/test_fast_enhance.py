@@ -0,0 +1,47 @@
+"""FastEnhancer against the PIL ImageEnhance chain of Experiment-8, on a small synthetic image."""
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import ImageEnhance
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fast_enhance
+from bench_enhance import VARIANTS, max_difference, synthetic_image
+
+# Odd sizes and tall enough for three row bands, the last one partial
+IMG = synthetic_image(173, 1100)
+
+
+def test_spans_several_bands():
+    assert len(list(fast_enhance.bands(fast_enhance.to_array(IMG)))) == 3
+
+
+@pytest.mark.parametrize('kind', ['image', 'array'])
+@pytest.mark.parametrize('name, pil_version, fast_version', VARIANTS, ids=[v[0] for v in VARIANTS])
+def test_matches_pil(name, pil_version, fast_version, kind):
+    source = IMG if kind == 'image' else fast_enhance.to_array(IMG)
+    expected = pil_version(IMG)
+    actual = fast_version(fast_enhance.FastEnhancer(source))
+    assert np.asarray(actual).shape == np.asarray(expected).shape
+    assert max_difference(expected, actual) <= 1
+
+
+@pytest.mark.parametrize('kind', ['image', 'array'])
+def test_reducing_chain_matches_pil(kind):
+    expected = ImageEnhance.Color(ImageEnhance.Contrast(ImageEnhance.Brightness(IMG).enhance(0.7))
+                                  .enhance(0.6)).enhance(0.4)
+    source = IMG if kind == 'image' else fast_enhance.to_array(IMG)
+    actual = fast_enhance.FastEnhancer(source).enhance(brightness=0.7, contrast=0.6, saturation=0.4)
+    assert max_difference(expected, actual) <= 1
+
+
+def test_rgba_keeps_alpha():
+    rgba = IMG.convert('RGBA')
+    rgba.putalpha(IMG.convert('L'))
+    expected = ImageEnhance.Color(ImageEnhance.Brightness(rgba).enhance(1.4)).enhance(2.0)
+    for source in (rgba, fast_enhance.to_array(rgba)):
+        actual = fast_enhance.FastEnhancer(source).enhance(brightness=1.4, saturation=2.0)
+        assert max_difference(expected, actual) <= 1
+        assert np.array_equal(np.asarray(actual)[..., 3], np.asarray(rgba)[..., 3])
@@ -0,0 +1,310 @@
+"""
+Tiled, memory-bounded version of the Experiment-8 enhancements for very
+large images (100+ MP scans).
+
+The image is read, processed and written one tile at a time, so memory use
+depends on the tile size rather than on the image size:
+
+* uncompressed inputs (PPM/PGM and single-strip uncompressed TIFF) are read
+  tile by tile straight from the file. Compressed formats such as JPEG can
+  only be decoded whole, so they are decoded once into an uncompressed
+  '<image>.pixels.ppm' sidecar that later runs reuse;
+* the Gaussian blur reads each tile with a halo of neighbouring pixels wide
+  enough to cover the blur kernel and crops it off afterwards, so tiles join
+  without seams;
+* contrast pivots on the mean gray of the whole image, which a first pass
+  accumulates tile by tile;
+* the result is written into a pre-sized PPM/PGM file as tiles finish.
+
+Tiles can be processed on several threads: PIL and NumPy release the GIL in
+their pixel loops. Every result is pixel-identical to the whole-image
+Experiment-8 call; --check verifies that on images small enough to load.
+"""
+import argparse
+import math
+import os
+import sys
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.instrumentation import timed
+
+import fast_enhance
+from batch_enhance import DEFAULT_OPERATIONS, FAST_FACTORS, load_operations
+
+TILE_SIZE = 1024
+# Operations that work pixel by pixel and need no halo
+POINTWISE = {'brightness', 'contrast', 'color', 'enhance', 'grayscale'}
+
+
+class RawImageFile:
+    """
+    An uncompressed 8-bit image on disk: height rows of width * channels
+    bytes starting at offset. Tiles are read and written with seek + read,
+    so nothing but the tile itself is held in memory.
+    """
+
+    def __init__(self, path, width, height, channels, offset, mode='rb'):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.offset = offset
+        self.file = open(path, mode)
+        self.lock = threading.Lock()
+
+    @property
+    def row_bytes(self):
+        return self.width * self.channels
+
+    def shape(self, rows, cols):
+        return (rows, cols) if self.channels == 1 else (rows, cols, self.channels)
+
+    def read(self, x0, y0, x1, y1):
+        """Pixels of the box (x0, y0, x1, y1) as a uint8 array."""
+        tile = np.empty(self.shape(y1 - y0, x1 - x0), dtype=np.uint8)
+        rows = tile.reshape(y1 - y0, -1)
+        with self.lock:
+            if x0 == 0 and x1 == self.width:
+                # Full-width rows are contiguous on disk
+                self.file.seek(self.offset + y0 * self.row_bytes)
+                self.file.readinto(memoryview(rows).cast('B'))
+            else:
+                for i, y in enumerate(range(y0, y1)):
+                    self.file.seek(self.offset + y * self.row_bytes + x0 * self.channels)
+                    self.file.readinto(memoryview(rows[i]))
+        return tile
+
+    def write(self, x0, y0, tile):
+        """Writes a uint8 tile with its top left corner at (x0, y0)."""
+        rows = np.ascontiguousarray(tile).reshape(tile.shape[0], -1)
+        with self.lock:
+            for i, row in enumerate(rows):
+                self.file.seek(self.offset + (y0 + i) * self.row_bytes + x0 * self.channels)
+                self.file.write(row.data)
+
+    def close(self):
+        self.file.close()
+
+
+def _raw_layout(img):
+    """Returns the pixel data offset if PIL would read img as one uncompressed block, else None."""
+    if img.mode not in ('L', 'RGB') or len(img.tile) != 1:
+        return None
+    codec, extents, offset, args = img.tile[0]
+    if isinstance(args, str):
+        args = (args, 0, 1)
+    rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+    if codec != 'raw' or tuple(extents) != (0, 0) + img.size or rawmode != img.mode:
+        return None
+    if orientation != 1 or stride not in (0, img.size[0] * len(img.getbands())):
+        return None
+    return offset
+
+
+def open_source(path):
+    """
+    Opens path for tiled reading. Compressed images are decoded once (this
+    is the only step that holds the whole image) into '<path>.pixels.ppm',
+    which is reused while it is newer than the image.
+    """
+    with warnings.catch_warnings():
+        # Only the header is parsed here, the pixels are never decoded in one piece
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        img = Image.open(path)
+    with img:
+        offset = _raw_layout(img)
+        if offset is not None:
+            return RawImageFile(path, img.size[0], img.size[1], len(img.getbands()), offset)
+
+    sidecar = path + '.pixels.ppm'
+    if not os.path.exists(sidecar) or os.path.getmtime(sidecar) < os.path.getmtime(path):
+        with Image.open(path) as img:
+            if img.mode not in ('L', 'RGB'):
+                img = img.convert('RGB')
+            tmp_path = sidecar + '.tmp'
+            img.save(tmp_path, format='PPM')
+        os.replace(tmp_path, sidecar)
+    return open_source(sidecar)
+
+
+def create_output(path, width, height, channels):
+    """Creates a PPM (3 channels) or PGM (1 channel) of the full size to be filled in tile by tile."""
+    header = f"{'P6' if channels == 3 else 'P5'}\n{width} {height}\n255\n".encode('ascii')
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.truncate(len(header) + width * height * channels)
+    return RawImageFile(path, width, height, channels, len(header), mode='r+b')
+
+
+def output_path(image_path, output_dir, name, channels):
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(output_dir, f"{stem}_{name}.{'ppm' if channels == 3 else 'pgm'}")
+
+
+def blur_halo(radius):
+    """
+    Pixels a tile must extend past its edges for a seamless GaussianBlur.
+    PIL blurs with three box blurs whose radius is at most radius, each of
+    which reads up to ceil(radius) + 1 pixels on either side.
+    """
+    return 3 * (math.ceil(radius) + 1)
+
+
+def tiles(width, height, tile_size):
+    """Yields the (x0, y0, x1, y1) boxes covering the image, row by row."""
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            yield x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height)
+
+
+def _map(func, items, threads):
+    if threads <= 1:
+        return map(func, items)
+    executor = ThreadPoolExecutor(max_workers=threads)
+    try:
+        return list(executor.map(func, items))
+    finally:
+        executor.shutdown()
+
+
+def mean_gray(source, brightness=1.0, tile_size=TILE_SIZE, threads=1):
+    """Mean gray of the whole (brightened) image, accumulated tile by tile."""
+    lut = fast_enhance.blend_lut(brightness) if brightness != 1.0 else None
+
+    def tile_total(box):
+        tile = source.read(*box)
+        if lut is not None:
+            tile = np.take(lut, tile)
+        if tile.ndim == 3:
+            tile = fast_enhance.gray(tile)
+        return int(tile.sum(dtype=np.uint64))
+
+    total = sum(_map(tile_total, list(tiles(source.width, source.height, tile_size)), threads))
+    return total / (source.width * source.height)
+
+
+def process_tile(source, output, box, operation, mean=None):
+    """Applies one operation to one tile of source and writes it to output."""
+    x0, y0, x1, y1 = box
+    op = operation['op']
+    if op == 'gaussian_blur':
+        radius = operation.get('radius', 2)
+        halo = blur_halo(radius)
+        # At the image border the halo is clipped, which is where PIL's blur
+        # clamps to the edge pixels as well
+        hx0, hy0 = max(0, x0 - halo), max(0, y0 - halo)
+        hx1, hy1 = min(source.width, x1 + halo), min(source.height, y1 + halo)
+        patch = Image.fromarray(source.read(hx0, hy0, hx1, hy1))
+        blurred = np.asarray(patch.filter(ImageFilter.GaussianBlur(radius=radius)))
+        result = blurred[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+    elif op in POINTWISE:
+        tile = source.read(x0, y0, x1, y1)
+        if op == 'grayscale':
+            result = fast_enhance.gray(tile) if tile.ndim == 3 else tile
+        elif op == 'enhance':
+            result = fast_enhance.FastEnhancer(tile).enhance(
+                operation.get('brightness', 1.0), operation.get('contrast', 1.0),
+                operation.get('saturation', 1.0), mean=mean)
+        else:
+            result = fast_enhance.FastEnhancer(tile).enhance(mean=mean, **{FAST_FACTORS[op]: operation['factor']})
+    else:
+        raise ValueError(f"Operation {op} has no tiled version")
+    output.write(x0, y0, result)
+
+
+def _contrast_mean(source, operation, tile_size, threads):
+    """The whole-image mean gray the operation's contrast needs, or None."""
+    op = operation['op']
+    if op == 'contrast' and operation['factor'] != 1.0:
+        return mean_gray(source, 1.0, tile_size, threads)
+    if op == 'enhance' and operation.get('contrast', 1.0) != 1.0:
+        return mean_gray(source, operation.get('brightness', 1.0), tile_size, threads)
+    return None
+
+
+@timed('enhance_tiled')
+def enhance_tiled(image_path, operations=DEFAULT_OPERATIONS, output_dir='enhanced',
+                  tile_size=TILE_SIZE, threads=1):
+    """Writes every operation's result for image_path, one tile at a time. Returns the paths written."""
+    os.makedirs(output_dir, exist_ok=True)
+    source = open_source(image_path)
+    written = []
+    try:
+        for operation in operations:
+            mean = _contrast_mean(source, operation, tile_size, threads)
+            channels = 1 if operation['op'] == 'grayscale' else source.channels
+            path = output_path(image_path, output_dir, operation['name'], channels)
+            tmp_path = path + '.tmp'
+            output = create_output(tmp_path, source.width, source.height, channels)
+            try:
+                boxes = list(tiles(source.width, source.height, tile_size))
+                for _ in _map(lambda box: process_tile(source, output, box, operation, mean), boxes, threads):
+                    pass
+            finally:
+                output.close()
+            os.replace(tmp_path, path)
+            written.append(path)
+    finally:
+        source.close()
+    return written
+
+
+def whole_image(img, operation):
+    """The non-tiled Experiment-8 call for an operation."""
+    op = operation['op']
+    if op == 'gaussian_blur':
+        return img.filter(ImageFilter.GaussianBlur(radius=operation.get('radius', 2)))
+    if op == 'brightness':
+        return ImageEnhance.Brightness(img).enhance(operation['factor'])
+    if op == 'contrast':
+        return ImageEnhance.Contrast(img).enhance(operation['factor'])
+    if op == 'color':
+        return ImageEnhance.Color(img).enhance(operation['factor'])
+    if op == 'enhance':
+        img = ImageEnhance.Brightness(img).enhance(operation.get('brightness', 1.0))
+        img = ImageEnhance.Contrast(img).enhance(operation.get('contrast', 1.0))
+        return ImageEnhance.Color(img).enhance(operation.get('saturation', 1.0))
+    if op == 'grayscale':
+        return img.convert('L')
+    raise ValueError(f"Operation {op} has no tiled version")
+
+
+def check_identical(image_path, written, operations):
+    """Compares tiled outputs with the whole-image results. Returns the names that differ."""
+    different = []
+    with Image.open(image_path) as img:
+        if img.mode not in ('L', 'RGB'):
+            img = img.convert('RGB')
+        for operation, path in zip(operations, written):
+            with Image.open(path) as tiled:
+                if not np.array_equal(np.asarray(tiled), np.asarray(whole_image(img, operation))):
+                    different.append(operation['name'])
+    return different
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the Experiment-8 enhancements to a very large image tile by tile.")
+    parser.add_argument('image')
+    parser.add_argument('-o', '--output', default='enhanced', help="folder for the PPM/PGM results")
+    parser.add_argument('--ops', help="JSON file with the list of operations (default: Experiment-8 set)")
+    parser.add_argument('-t', '--tile', type=int, default=TILE_SIZE, help="tile edge in pixels")
+    parser.add_argument('--threads', type=int, default=1, help="tiles processed at once")
+    parser.add_argument('--check', action='store_true',
+                        help="compare the results with the whole-image path (loads the full image)")
+    args = parser.parse_args()
+
+    operations = load_operations(args.ops)
+    written = enhance_tiled(args.image, operations, args.output, args.tile, args.threads)
+    for path in written:
+        print(f"Wrote {path}")
+    if args.check:
+        different = check_identical(args.image, written, operations)
+        if different:
+            parser.exit(1, f"Tiled output differs from the whole-image path for: {', '.join(different)}\n")
+        print("All results are pixel-identical to the whole-image path.")
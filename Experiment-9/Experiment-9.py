@@ -6,112 +6,130 @@
 # customer insights-insights of each customer segement
 # customere engagement recommendation
 
+import os
+import sys
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.instrumentation import stage
+from retail_data import load_clean
+
 
 #Data Loading
-df=pd.read_csv("Online Retail.csv")
+# The CSV is parsed and cleaned once (retail_data.py); later runs load the
+# cleaned frame from a cache keyed by the file's hash
+with stage('load'):
+    df, cleaning = load_clean("Online Retail.csv")
 
-print(df.head())
-print(df.shape)
+    print(df.head())
+    print(df.shape)
 
 #Data Cleaning
-print("------------------------------------------------Data Cleaning----------------------------------------------")
-print(df.isnull().sum())
+with stage('clean'):
+    print("------------------------------------------------Data Cleaning----------------------------------------------")
+    # Missing values as found in the CSV, before CustomerID was forward-filled
+    # and Description back-filled
+    print(pd.Series(cleaning['missing']))
 
-print(df['Description'].values)
-df['CustomerID']=df['CustomerID'].ffill()
-df['Description']=df['Description'].bfill()
-print(df.duplicated().sum())
-df.duplicated()
-df.drop_duplicates()
-print(df.isnull().sum())
+    print(f"{df['Description'].cat.categories.size} distinct descriptions")
+    print(f"{cleaning['duplicates']} duplicate rows dropped")
+    print(df.isnull().sum())
 
 
 #Statistics Analysis
-print("------------------------------------------------Statistics Analysis----------------------------------------------")
-print(df.describe())
+with stage('stats'):
+    print("------------------------------------------------Statistics Analysis----------------------------------------------")
+    print(df.describe())
 
 
 
 # customer segmentation-k means clustering
-print("------------------------------------------------customer segmentation-k means clustering----------------------------------------------")
-
-# Selecting features for clustering
-features = df[['Quantity', 'UnitPrice']].dropna()
-# Standardizing the features
-scaler = StandardScaler()
-features_scaled = scaler.fit_transform(features)
-# Applying KMeans clustering
-kmeans = KMeans(n_clusters=3, random_state=42)
-kmeans.fit(features_scaled)
-df['Cluster'] = kmeans.labels_
-
-df_clustered = df.loc[features.index].copy()
-df_clustered['Cluster'] = kmeans.labels_
-print(df[['Quantity', 'UnitPrice', 'Cluster']].head())
-# Visualizing the clusters
-plt.figure(figsize=(10,6))
-sns.scatterplot(data=df, x='Quantity', y='UnitPrice', hue='Cluster', palette='Set1')
-plt.title('KMeans Clustering of Customers')
-plt.show()
-
-# Insights from clusters
-cluster_insights = df.groupby('Cluster').agg({'Quantity':'mean', 'UnitPrice':'mean', 'CustomerID':'nunique'}).reset_index()
-print("Cluster Insights:")
-print(cluster_insights)
-
-
-# Create a figure with two subplots (1 row, 2 columns)
-fig, axes = plt.subplots(1, 2, figsize=(18, 8))
-fig.suptitle('Customer Data Visualization: Before and After Clustering', fontsize=16)
-
-# Plot 1: Before Clustering
-sns.scatterplot(ax=axes[0], data=df, x='Quantity', y='UnitPrice', alpha=0.6)
-axes[0].set_title('Before Clustering')
-axes[0].set_xlabel('Quantity')
-axes[0].set_ylabel('UnitPrice')
+# (segmentation.py clusters customers by RFM features in bounded memory,
+# for transaction logs too large for this row-by-row version)
+with stage('cluster'):
+    print("------------------------------------------------customer segmentation-k means clustering----------------------------------------------")
+
+    # Selecting features for clustering
+    features = df[['Quantity', 'UnitPrice']].dropna()
+    # Standardizing the features
+    scaler = StandardScaler()
+    features_scaled = scaler.fit_transform(features)
+    # Applying KMeans clustering
+    kmeans = KMeans(n_clusters=3, random_state=42)
+    kmeans.fit(features_scaled)
+    df['Cluster'] = kmeans.labels_
+
+    df_clustered = df.loc[features.index].copy()
+    df_clustered['Cluster'] = kmeans.labels_
+    print(df[['Quantity', 'UnitPrice', 'Cluster']].head())
 
-# Plot 2: After Clustering
-sns.scatterplot(ax=axes[1], data=df_clustered, x='Quantity', y='UnitPrice', hue='Cluster', palette='Set1', alpha=0.8)
-axes[1].set_title('After K-Means Clustering')
-axes[1].set_xlabel('Quantity')
-axes[1].set_ylabel('UnitPrice')
-
-plt.show()
-
-# visualization-scatter plot,bar chart
-print("------------------------------------------------visualization-scatter plot,bar chart----------------------------------------------")
-plt.figure(figsize=(10,6))
-sns.scatterplot(data=df, x='Quantity', y='UnitPrice', hue='Country')
-plt.title('Scatter plot of Quantity vs UnitPrice')
-plt.show()
-plt.figure(figsize=(12,6))
-sns.barplot(data=df, x='Country', y='Quantity', ci=None)
-plt.title('Bar chart of Quantity by Country')
-plt.xticks(rotation=90)
-plt.show()
+# Visualizing the clusters
+with stage('plot'):
+    plt.figure(figsize=(10,6))
+    sns.scatterplot(data=df, x='Quantity', y='UnitPrice', hue='Cluster', palette='Set1')
+    plt.title('KMeans Clustering of Customers')
+    plt.show()
+
+    # Insights from clusters
+    cluster_insights = df.groupby('Cluster').agg({'Quantity':'mean', 'UnitPrice':'mean', 'CustomerID':'nunique'}).reset_index()
+    print("Cluster Insights:")
+    print(cluster_insights)
+
+
+    # Create a figure with two subplots (1 row, 2 columns)
+    fig, axes = plt.subplots(1, 2, figsize=(18, 8))
+    fig.suptitle('Customer Data Visualization: Before and After Clustering', fontsize=16)
+
+    # Plot 1: Before Clustering
+    sns.scatterplot(ax=axes[0], data=df, x='Quantity', y='UnitPrice', alpha=0.6)
+    axes[0].set_title('Before Clustering')
+    axes[0].set_xlabel('Quantity')
+    axes[0].set_ylabel('UnitPrice')
+
+    # Plot 2: After Clustering
+    sns.scatterplot(ax=axes[1], data=df_clustered, x='Quantity', y='UnitPrice', hue='Cluster', palette='Set1', alpha=0.8)
+    axes[1].set_title('After K-Means Clustering')
+    axes[1].set_xlabel('Quantity')
+    axes[1].set_ylabel('UnitPrice')
+
+    plt.show()
+
+    # visualization-scatter plot,bar chart
+    print("------------------------------------------------visualization-scatter plot,bar chart----------------------------------------------")
+    plt.figure(figsize=(10,6))
+    sns.scatterplot(data=df, x='Quantity', y='UnitPrice', hue='Country')
+    plt.title('Scatter plot of Quantity vs UnitPrice')
+    plt.show()
+    plt.figure(figsize=(12,6))
+    sns.barplot(data=df, x='Country', y='Quantity', ci=None)
+    plt.title('Bar chart of Quantity by Country')
+    plt.xticks(rotation=90)
+    plt.show()
 
 
 # customer insights-insights of each customer segement
-print("------------------------------------------------customer insights-insights of each customer segement----------------------------------------------")
-country_insights=df.groupby('Country').agg({'Quantity':'sum','UnitPrice':'mean'}).reset_index()
-print(country_insights)
-
-
-# customere engagement recommendation
-print("------------------------------------------------customere engagement recommendation----------------------------------------------")
-top_countries=country_insights.sort_values(by='Quantity', ascending=False).head(5)
-print("Top 5 countries by Quantity:")
-print(top_countries)
-print("Recommendations:")
-for index, row in top_countries.iterrows():
-    print(f"Increase marketing efforts in {row['Country']} to boost sales further.")
-    if row['UnitPrice'] < df['UnitPrice'].mean():
-        print(f"Consider promotional pricing strategies in {row['Country']} to attract more customers.")
-    else:
-        print(f"Maintain premium pricing in {row['Country']} to sustain profitability.")
+with stage('insights'):
+    print("------------------------------------------------customer insights-insights of each customer segement----------------------------------------------")
+    country_insights=df.groupby('Country', observed=True).agg({'Quantity':'sum','UnitPrice':'mean'}).reset_index()
+    print(country_insights)
+
+
+    # customere engagement recommendation
+    print("------------------------------------------------customere engagement recommendation----------------------------------------------")
+    top_countries=country_insights.sort_values(by='Quantity', ascending=False).head(5)
+    print("Top 5 countries by Quantity:")
+    print(top_countries)
+    print("Recommendations:")
+    # The overall mean price is computed once and compared for all countries at once
+    countries = top_countries['Country'].astype(str)
+    pricing = np.where(top_countries['UnitPrice'] < df['UnitPrice'].mean(),
+                       "Consider promotional pricing strategies in " + countries + " to attract more customers.",
+                       "Maintain premium pricing in " + countries + " to sustain profitability.")
+    marketing = "Increase marketing efforts in " + countries + " to boost sales further."
+    print('\n'.join(line for pair in zip(marketing, pricing) for line in pair))
@@ -0,0 +1,209 @@
+"""
+Scalable customer segmentation for Experiment-9.
+
+Experiment-9.py clusters every transaction row on Quantity/UnitPrice and
+scatter-plots every row. This clusters customers instead, in bounded memory:
+
+1. The transaction CSV is read in chunks of only the needed columns and
+   folded into one row per customer with RFM features: days since the last
+   purchase (recency), number of invoices (frequency) and total spend
+   (monetary). Memory grows with the number of customers and invoices, not
+   with the number of rows.
+2. The features (log-scaled frequency and spend) are standardized and
+   clustered with MiniBatchKMeans, fed through partial_fit in shuffled
+   batches.
+3. Plots are drawn from a sample stratified by cluster and from hexbin
+   densities of all customers, so their cost does not grow with the data.
+
+Run headless by default; figures are saved to the output folder.
+"""
+import argparse
+import os
+import sys
+
+import matplotlib
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.instrumentation import stage
+
+COLUMNS = ['InvoiceNo', 'Quantity', 'InvoiceDate', 'UnitPrice', 'CustomerID', 'Country']
+CHUNK_SIZE = 250_000
+BATCH_SIZE = 4096
+SAMPLE_PER_CLUSTER = 2000
+
+
+def customer_features(csv_file, chunksize=CHUNK_SIZE, date_format=None):
+    """
+    One row per customer (indexed by CustomerID) with Country, Recency,
+    Frequency and Monetary, built chunk by chunk. Rows without a CustomerID
+    are skipped. Also returns per-country totals of Quantity and spend.
+    """
+    last_purchase = []
+    spend = []
+    invoices = []
+    countries = []
+    country_totals = []
+    dtypes = {'InvoiceNo': str, 'Quantity': 'int32', 'UnitPrice': 'float32', 'Country': str}
+    for chunk in pd.read_csv(csv_file, usecols=COLUMNS, dtype=dtypes, chunksize=chunksize):
+        chunk['Amount'] = chunk['Quantity'] * chunk['UnitPrice']
+        country_totals.append(chunk.groupby('Country')[['Quantity', 'Amount']].sum())
+        chunk = chunk.dropna(subset=['CustomerID'])
+        chunk['InvoiceDate'] = pd.to_datetime(chunk['InvoiceDate'], format=date_format)
+        by_customer = chunk.groupby('CustomerID')
+        last_purchase.append(by_customer['InvoiceDate'].max())
+        spend.append(by_customer['Amount'].sum())
+        countries.append(by_customer['Country'].first())
+        # An invoice may straddle two chunks, so distinct pairs are kept and
+        # counted at the end; there are far fewer of them than rows
+        invoices.append(chunk[['CustomerID', 'InvoiceNo']].drop_duplicates())
+        # Fold the partial results together to keep memory flat
+        if len(last_purchase) > 8:
+            last_purchase = [pd.concat(last_purchase).groupby(level=0).max()]
+            spend = [pd.concat(spend).groupby(level=0).sum()]
+            countries = [pd.concat(countries).groupby(level=0).first()]
+            invoices = [pd.concat(invoices).drop_duplicates()]
+            country_totals = [pd.concat(country_totals).groupby(level=0).sum()]
+
+    last_purchase = pd.concat(last_purchase).groupby(level=0).max()
+    reference = last_purchase.max() + pd.Timedelta(days=1)
+    customers = pd.DataFrame({
+        'Country': pd.concat(countries).groupby(level=0).first(),
+        'Recency': (reference - last_purchase).dt.days.astype('int32'),
+        'Frequency': pd.concat(invoices).drop_duplicates().groupby('CustomerID').size().astype('int32'),
+        'Monetary': pd.concat(spend).groupby(level=0).sum().astype('float64'),
+    })
+    customers.index = customers.index.astype('int64')
+    customers.index.name = 'CustomerID'
+    return customers, pd.concat(country_totals).groupby(level=0).sum()
+
+
+def feature_matrix(customers):
+    """Recency, log frequency and log spend (returns can make spend negative; those count as 0)."""
+    return np.column_stack([
+        customers['Recency'].to_numpy(dtype='float64'),
+        np.log1p(customers['Frequency'].to_numpy(dtype='float64')),
+        np.log1p(customers['Monetary'].clip(lower=0).to_numpy(dtype='float64')),
+    ])
+
+
+def _batches(n, batch_size, rng):
+    order = rng.permutation(n)
+    for start in range(0, n, batch_size):
+        yield order[start:start + batch_size]
+
+
+def segment(customers, n_clusters=3, batch_size=BATCH_SIZE, epochs=3, random_state=42):
+    """Cluster label per customer, from MiniBatchKMeans trained with partial_fit over shuffled batches."""
+    X = feature_matrix(customers)
+    rng = np.random.default_rng(random_state)
+    scaler = StandardScaler()
+    for rows in _batches(len(X), batch_size, rng):
+        scaler.partial_fit(X[rows])
+    X = scaler.transform(X)
+
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, random_state=random_state, n_init=3)
+    # partial_fit needs at least n_clusters rows in its first batch
+    batch_size = max(batch_size, n_clusters)
+    for _ in range(epochs):
+        for rows in _batches(len(X), batch_size, rng):
+            kmeans.partial_fit(X[rows])
+    labels = np.concatenate([kmeans.predict(X[start:start + batch_size])
+                             for start in range(0, len(X), batch_size)])
+    return labels.astype('int16'), kmeans, scaler
+
+
+def stratified_sample(customers, column, per_group=SAMPLE_PER_CLUSTER, random_state=42):
+    """At most per_group random rows of each value of column."""
+    return customers.sample(frac=1, random_state=random_state).groupby(column).head(per_group)
+
+
+def cluster_summary(customers):
+    summary = customers.groupby('Cluster').agg(
+        Customers=('Recency', 'size'), Recency=('Recency', 'mean'),
+        Frequency=('Frequency', 'mean'), Monetary=('Monetary', 'mean'))
+    return summary.round(1)
+
+
+def plot_segments(customers, country_totals, output_dir, show=False, per_cluster=SAMPLE_PER_CLUSTER):
+    """Saves the segment plots to output_dir; they only ever draw a sample or a density."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    os.makedirs(output_dir, exist_ok=True)
+    sample = stratified_sample(customers, 'Cluster', per_cluster)
+    spend = np.log1p(customers['Monetary'].clip(lower=0))
+    figures = []
+
+    fig, axes = plt.subplots(1, 2, figsize=(18, 8))
+    fig.suptitle('Customer Segments: Density of All Customers and a Sample per Cluster', fontsize=16)
+    density = axes[0].hexbin(customers['Recency'], spend, gridsize=60, bins='log', cmap='viridis', mincnt=1)
+    fig.colorbar(density, ax=axes[0], label='customers (log)')
+    axes[0].set_title('All customers')
+    axes[0].set_xlabel('Recency (days)')
+    axes[0].set_ylabel('log(1 + Monetary)')
+    sns.scatterplot(ax=axes[1], x=sample['Recency'], y=np.log1p(sample['Monetary'].clip(lower=0)),
+                    hue=sample['Cluster'], palette='Set1', alpha=0.6, s=12)
+    axes[1].set_title(f'K-Means clusters (up to {per_cluster} customers each)')
+    axes[1].set_xlabel('Recency (days)')
+    axes[1].set_ylabel('log(1 + Monetary)')
+    figures.append((fig, 'segments.png'))
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    density = ax.hexbin(np.log1p(customers['Frequency']), spend, gridsize=50, bins='log', cmap='viridis', mincnt=1)
+    fig.colorbar(density, ax=ax, label='customers (log)')
+    ax.set_title('Frequency vs Monetary')
+    ax.set_xlabel('log(1 + Frequency)')
+    ax.set_ylabel('log(1 + Monetary)')
+    figures.append((fig, 'frequency_monetary.png'))
+
+    # Bar chart from the per-country totals, not from every row
+    fig, ax = plt.subplots(figsize=(12, 6))
+    country_totals['Quantity'].sort_values(ascending=False).plot(kind='bar', ax=ax)
+    ax.set_title('Quantity by Country')
+    ax.set_xlabel('Country')
+    ax.set_ylabel('Quantity')
+    fig.tight_layout()
+    figures.append((fig, 'quantity_by_country.png'))
+
+    for fig, name in figures:
+        fig.savefig(os.path.join(output_dir, name), dpi=100)
+    if show:
+        plt.show()
+    plt.close('all')
+    return [os.path.join(output_dir, name) for _, name in figures]
+
+
+def run(csv_file, n_clusters=3, output_dir='segments', chunksize=CHUNK_SIZE, show=False):
+    """Segments the customers of csv_file; writes customers.csv and the plots to output_dir."""
+    if not show:
+        matplotlib.use('Agg')
+    with stage('load') as load:
+        customers, country_totals = customer_features(csv_file, chunksize)
+        load.set(customers=len(customers))
+    with stage('cluster'):
+        customers['Cluster'], _, _ = segment(customers, n_clusters)
+    os.makedirs(output_dir, exist_ok=True)
+    with stage('save'):
+        customers.to_csv(os.path.join(output_dir, 'customers.csv'))
+    with stage('plot'):
+        plot_segments(customers, country_totals, output_dir, show)
+    return customers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Segment Online Retail customers by RFM features in bounded memory.")
+    parser.add_argument('csv', nargs='?', default='Online Retail.csv')
+    parser.add_argument('-k', '--clusters', type=int, default=3)
+    parser.add_argument('-o', '--output', default='segments')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help="transaction rows read at a time")
+    parser.add_argument('--show', action='store_true', help="also open the plots")
+    args = parser.parse_args()
+
+    customers = run(args.csv, args.clusters, args.output, args.chunksize, args.show)
+    print(f"{len(customers)} customers in {args.clusters} segments:")
+    print(cluster_summary(customers))
+    print(f"Segments written to {os.path.join(args.output, 'customers.csv')}")
@@ -0,0 +1 @@
+"""Helpers shared by the experiment scripts and notebooks."""
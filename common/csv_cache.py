@@ -0,0 +1,171 @@
+"""
+Transparent columnar cache for CSV files that are read over and over.
+
+The first read of a CSV parses it with pandas and writes a typed Feather
+(Arrow IPC) sidecar next to it, e.g. expenses.csv -> expenses.csv.feather.
+Later reads memory-map the sidecar as long as the CSV's size and mtime and
+the read options are unchanged. Appending to the CSV changes its size and
+mtime, so the next read re-parses it and refreshes the sidecar.
+
+read_derived_cached() caches a frame computed from a file (e.g. a cleaned
+dataset) the same way, keyed by the SHA-256 of the file's contents, so a
+copied or touched but unchanged file still hits the cache.
+
+pyarrow is optional: without it every call falls back to pd.read_csv (or
+to computing the derived frame).
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+CACHE_SUFFIX = '.feather'
+META_KEY = b'csv_cache'
+
+
+def cache_path(path):
+    return path + CACHE_SUFFIX
+
+
+def _source_signature(path, parse_dates, date_format, read_csv_kwargs):
+    """Describes the CSV and the way it is parsed; any change invalidates the sidecar."""
+    st = os.stat(path)
+    return {
+        'size': st.st_size,
+        'mtime': st.st_mtime_ns,
+        'parse_dates': list(parse_dates),
+        'date_format': date_format,
+        'options': json.dumps(read_csv_kwargs, sort_keys=True, default=str),
+    }
+
+
+def _parse_csv(path, parse_dates, date_format, read_csv_kwargs):
+    df = pd.read_csv(path, **read_csv_kwargs)
+    for column in parse_dates:
+        df[column] = pd.to_datetime(df[column], format=date_format)
+    return df
+
+
+def _open_sidecar(sidecar):
+    """An IPC reader over the memory-mapped sidecar and its stored signature, or (None, None)."""
+    try:
+        source = pa.memory_map(sidecar, 'r')
+    except OSError:
+        return None, None
+    # The map is left open: the returned columns may point straight into it
+    try:
+        reader = pa.ipc.open_file(source)
+    except pa.ArrowInvalid:
+        return None, None
+    metadata = reader.schema.metadata or {}
+    return reader, json.loads(metadata.get(META_KEY, b'null'))
+
+
+def _load_sidecar(sidecar, signature):
+    """Returns the cached frame if the sidecar matches the signature, else None."""
+    reader, stored = _open_sidecar(sidecar)
+    if reader is None or stored != signature:
+        return None
+    return reader.read_all().to_pandas()
+
+
+def _write_sidecar(sidecar, df, signature):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[META_KEY] = json.dumps(signature).encode()
+    table = table.replace_schema_metadata(metadata)
+    # Uncompressed so later reads can map the columns instead of decoding them.
+    # Written to a temp file first so readers never see a half-written sidecar.
+    tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, sidecar)
+
+
+def read_csv_cached(path, parse_dates=(), date_format=None, **read_csv_kwargs):
+    """
+    Drop-in replacement for pd.read_csv(path, **read_csv_kwargs) followed by
+    pd.to_datetime on the parse_dates columns. Raises FileNotFoundError like
+    pd.read_csv when the CSV itself is missing.
+    """
+    parse_dates = list(parse_dates)
+    if pa is None:
+        return _parse_csv(path, parse_dates, date_format, read_csv_kwargs)
+
+    signature = _source_signature(path, parse_dates, date_format, read_csv_kwargs)
+    sidecar = cache_path(path)
+    df = _load_sidecar(sidecar, signature)
+    if df is not None:
+        return df
+
+    df = _parse_csv(path, parse_dates, date_format, read_csv_kwargs)
+    try:
+        _write_sidecar(sidecar, df, signature)
+    except (OSError, pa.ArrowException):
+        # A read-only folder or an unsupported column type only costs the speed-up
+        pass
+    return df
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def derived_cache_path(path, tag):
+    return f"{path}.{tag}{CACHE_SUFFIX}"
+
+
+def read_derived_cached(path, tag, build, version=1):
+    """
+    Returns build(path), a (DataFrame, info) pair with info a JSON-friendly
+    dict, from the <path>.<tag>.feather sidecar when it was built from a file
+    with the same contents (and the same version of build). The hash is only
+    recomputed when the file's size or mtime changed. Raises
+    FileNotFoundError when the file is missing.
+    """
+    st = os.stat(path)
+    if pa is None:
+        return build(path)
+
+    sidecar = derived_cache_path(path, tag)
+    reader, stored = _open_sidecar(sidecar)
+    stored = stored or {}
+    sha256 = None
+    if reader is not None and stored.get('version') == version:
+        if stored.get('size') == st.st_size and stored.get('mtime') == st.st_mtime_ns:
+            return reader.read_all().to_pandas(), stored['info']
+        sha256 = file_sha256(path)
+        if stored.get('sha256') == sha256:
+            return reader.read_all().to_pandas(), stored['info']
+
+    df, info = build(path)
+    signature = {
+        'sha256': sha256 or file_sha256(path),
+        'size': st.st_size,
+        'mtime': st.st_mtime_ns,
+        'version': version,
+        'info': info,
+    }
+    try:
+        _write_sidecar(sidecar, df, signature)
+    except (OSError, pa.ArrowException):
+        pass
+    return df, info
+
+
+def clear_cache(path):
+    """Removes the sidecar of a CSV, if there is one."""
+    try:
+        os.remove(cache_path(path))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,288 @@
+"""
+Per-stage timing for the experiment scripts, cheap enough to leave in.
+
+Stages are marked with a context manager or a decorator:
+
+    with stage('load') as load:
+        df = pd.read_csv(...)
+        load.set(rows=len(df))
+
+    @timed('render')
+    def render_invoices(...): ...
+
+Nothing is recorded unless EXPERIMENT_METRICS names a JSON-lines file; a
+stage is then a single flag check. When it is set, every stage appends one
+line with its wall time, CPU time, the process's peak RSS so far and how
+much the stage raised that peak:
+
+    {"run": "...", "script": "Experiment-9.py", "pid": 4242, "stage": "cluster", "path": "main/cluster",
+     "start": "2025-10-01T12:00:00", "wall_s": 1.93, "cpu_s": 1.88,
+     "process_max_rss_mb": 412.5, "max_rss_growth_mb": 120.3}
+
+The peak RSS belongs to the whole process: a stage that stays below an
+earlier one's peak shows no growth. The tracemalloc profile below gives
+each stage's own peak.
+
+EXPERIMENT_PROFILE=cprofile,tracemalloc (either or both) adds deep capture,
+which does slow the run down:
+
+* cprofile profiles each outermost stage into profiles/<script>-<stage>-<run>.prof
+  next to the metrics file (view it with python -m pstats or snakeviz);
+* tracemalloc adds the peak traced Python memory of every stage, nested
+  stages included, and where each outermost stage allocated the memory it
+  still holds when it ends.
+
+Without EXPERIMENT_METRICS, EXPERIMENT_PROFILE writes to metrics.jsonl.
+Running this module summarizes a metrics file, comparing each stage's last
+run with the median of the earlier ones:
+
+    python -m common.instrumentation metrics.jsonl
+"""
+import argparse
+import cProfile
+import functools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is left out there
+    resource = None
+
+METRICS_ENV = 'EXPERIMENT_METRICS'
+PROFILE_ENV = 'EXPERIMENT_PROFILE'
+DEFAULT_METRICS_FILE = 'metrics.jsonl'
+TOP_ALLOCATIONS = 5
+
+
+class _Config:
+    def __init__(self):
+        self.enabled = False
+        self.metrics_path = None
+        self.cprofile = False
+        self.tracemalloc = False
+        self.run_id = uuid.uuid4().hex[:12]
+        self.script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else 'python'
+        self.lock = threading.Lock()
+        self.stream = None
+
+
+_config = _Config()
+_local = threading.local()
+
+
+def configure(metrics_path=None, profile=()):
+    """
+    Turns recording on (metrics_path) or off (None). profile may hold
+    'cprofile' and/or 'tracemalloc'. Called at import from the environment.
+    """
+    with _config.lock:
+        if _config.stream is not None:
+            _config.stream.close()
+            _config.stream = None
+        if profile and not metrics_path:
+            metrics_path = DEFAULT_METRICS_FILE
+        _config.metrics_path = metrics_path
+        _config.enabled = metrics_path is not None
+        _config.cprofile = 'cprofile' in profile
+        _config.tracemalloc = 'tracemalloc' in profile
+    if _config.tracemalloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def _configure_from_environment():
+    profile = [name.strip().lower() for name in os.environ.get(PROFILE_ENV, '').split(',') if name.strip()]
+    configure(os.environ.get(METRICS_ENV) or None, profile)
+
+
+def enabled():
+    return _config.enabled
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _write(record):
+    line = json.dumps(record) + '\n'
+    with _config.lock:
+        if _config.stream is None:
+            _config.stream = open(_config.metrics_path, 'a', encoding='utf-8')
+        _config.stream.write(line)
+        _config.stream.flush()
+
+
+class _Stage:
+    """Measures one stage; used through stage() and timed()."""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.outermost = not stack
+        stack.append(self)
+        self.child_peak = 0
+        self.profiler = None
+        if _config.tracemalloc:
+            # tracemalloc has one peak for the whole process, so a stage
+            # resets it and hands the peak it saw on to the enclosing stage
+            if len(stack) > 1:
+                parent = stack[-2]
+                parent.child_peak = max(parent.child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.snapshot = tracemalloc.take_snapshot() if self.outermost else None
+        if _config.cprofile and self.outermost:
+            self.profiler = cProfile.Profile()
+        self.rss_start = _max_rss_mb()
+        self.started = datetime.now()
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler is not None:
+            self.profiler.disable()
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        stack = _local.stack
+        max_rss = _max_rss_mb()
+        record = {
+            'run': _config.run_id,
+            'script': _config.script,
+            'pid': os.getpid(),
+            'stage': self.name,
+            'path': '/'.join(item.name for item in stack),
+            'start': self.started.isoformat(timespec='seconds'),
+            'wall_s': round(wall, 6),
+            'cpu_s': round(cpu, 6),
+            'process_max_rss_mb': max_rss,
+            'max_rss_growth_mb': round(max_rss - self.rss_start, 1) if max_rss is not None else None,
+        }
+        stack.pop()
+        if _config.tracemalloc and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            record['peak_traced_mb'] = round(peak / (1024 * 1024), 2)
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            if self.snapshot is not None:
+                # Where the memory the stage still holds at its end was allocated
+                top = tracemalloc.take_snapshot().compare_to(self.snapshot, 'lineno')[:TOP_ALLOCATIONS]
+                record['top_allocations'] = [
+                    f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} {stat.size_diff / 1024:+.0f} KiB"
+                    for stat in top]
+        if self.profiler is not None:
+            record['profile'] = self._dump_profile()
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        record.update(self.fields)
+        _write(record)
+        return False
+
+    def _dump_profile(self):
+        directory = os.path.join(os.path.dirname(os.path.abspath(_config.metrics_path)), 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.path.splitext(_config.script)[0]}-{self.name}-{_config.run_id}.prof")
+        self.profiler.dump_stats(path)
+        return path
+
+    def set(self, **fields):
+        """Adds fields (e.g. row counts) to the stage's record."""
+        self.fields.update(fields)
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, **fields):
+    """Context manager that records the enclosed block as stage name; fields are added to its record."""
+    if not _config.enabled:
+        return _NULL_STAGE
+    return _Stage(name, fields)
+
+
+def timed(name=None, **fields):
+    """Decorator that records each call of the function as a stage (named after the function by default)."""
+    def decorate(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _config.enabled:
+                return func(*args, **kwargs)
+            with _Stage(stage_name, fields):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def read_metrics(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def summarize(path):
+    """
+    Per (script, stage path): number of runs, median wall time of the earlier
+    runs, wall time of the last run and its change against that median.
+    """
+    runs = defaultdict(lambda: defaultdict(float))
+    for record in read_metrics(path):
+        key = (record['script'], record['path'])
+        # A stage entered several times in one run counts with its total
+        runs[key][record['run']] += record['wall_s']
+    summary = []
+    for key, per_run in runs.items():
+        walls = list(per_run.values())
+        last = walls[-1]
+        baseline = statistics.median(walls[:-1]) if len(walls) > 1 else None
+        change = (last - baseline) / baseline * 100 if baseline else None
+        summary.append((key[0], key[1], len(walls), baseline, last, change))
+    return summary
+
+
+_configure_from_environment()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a stage metrics file, last run against earlier runs.")
+    parser.add_argument('metrics', nargs='?', default=os.environ.get(METRICS_ENV) or DEFAULT_METRICS_FILE)
+    args = parser.parse_args()
+
+    print(f"{'script':<28} {'stage':<32} {'runs':>5} {'median (s)':>11} {'last (s)':>10} {'change':>8}")
+    for script, path, count, baseline, last, change in summarize(args.metrics):
+        baseline_text = f"{baseline:.3f}" if baseline is not None else '-'
+        change_text = f"{change:+.0f}%" if change is not None else '-'
+        print(f"{script:<28} {path:<32} {count:>5} {baseline_text:>11} {last:>10.3f} {change_text:>8}")
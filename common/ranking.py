@@ -0,0 +1,93 @@
+"""
+Streaming top-K / bottom-K ranking shared by the experiment pipelines.
+
+Items are pushed through a heap of size k, so ranking N items costs
+O(N log k) time and O(k) extra memory instead of materialising and
+sorting the whole list. Ties keep the order the items were seen in,
+the same as a stable sort.
+"""
+import heapq
+from itertools import count
+
+
+class TopK:
+    """Keeps the k largest (or smallest, with largest=False) items seen so far."""
+
+    def __init__(self, k, key=None, largest=True):
+        self.k = k
+        self.key = key or (lambda item: item)
+        self.largest = largest
+        self._heap = []
+        self._seq = count()
+
+    def push(self, item, score=None):
+        """Offers one item; score defaults to key(item) and is computed only once."""
+        if self.k <= 0:
+            return
+        if score is None:
+            score = self.key(item)
+        # The heap root is always the entry that would be evicted first:
+        # the worst score and, among equal scores, the one seen last.
+        rank = score if self.largest else -score
+        entry = (rank, -next(self._seq), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def extend(self, items):
+        for item in items:
+            self.push(item)
+        return self
+
+    def __len__(self):
+        return len(self._heap)
+
+    def result(self):
+        """Returns the kept items, best first."""
+        return [item for _, _, item in sorted(self._heap, reverse=True)]
+
+
+def top_k(items, k, key=None, largest=True):
+    """Returns the k best items of an iterable, best first."""
+    return TopK(k, key, largest).extend(items).result()
+
+
+class AverageTracker:
+    """
+    Running total/count per key, e.g. product -> ratings.
+    The averages are ranked with a bounded heap, each computed once per key.
+    """
+
+    def __init__(self, totals=None):
+        # key -> [total, count], the same layout the review pipeline checkpoints
+        self.totals = totals if totals is not None else {}
+
+    def add(self, key, value, n=1):
+        entry = self.totals.get(key)
+        if entry is None:
+            self.totals[key] = [value, n]
+        else:
+            entry[0] += value
+            entry[1] += n
+
+    def average(self, key):
+        total, n = self.totals[key]
+        return total / n
+
+    def top(self, k, largest=True, min_count=1):
+        return rank_averages(self.totals, k, largest, min_count)
+
+
+def rank_averages(totals, k, largest=True, min_count=1):
+    """
+    Ranks a key -> [total, count] map by average and returns the best k as
+    (key, average, count) tuples. Keys with fewer than min_count values are
+    left out so a single review cannot top the chart.
+    """
+    ranking = TopK(k, largest=largest)
+    for key, (total, n) in totals.items():
+        if n >= min_count:
+            avg = total / n
+            ranking.push((key, avg, n), avg)
+    return ranking.result()